@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.core.files.storage import default_storage
 from django.utils.html import format_html
+from . import images
 from .models import (
     Customer, CustomerProfile, Address,
     Supplier, Category, Product, ProductSupplier,
@@ -44,6 +46,11 @@ class CategoryAdmin(admin.ModelAdmin):
 # ---------------------------
 # Product
 # ---------------------------
+def rendition_url(product, name):
+    """Уменьшенная копия (images.py), пока её нет — исходный файл"""
+    entry = images.rendition(product, name)
+    return default_storage.url(entry[images.fallback_ext(entry)]) if entry else product.image.url
+
 class ProductSupplierInline(admin.TabularInline):
     model = ProductSupplier
     extra = 1
@@ -69,13 +76,13 @@ class ProductAdmin(admin.ModelAdmin):
 
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="max-height: 150px;"/>', obj.image.url)
+            return format_html('<img src="{}" style="max-height: 150px;"/>', rendition_url(obj, "card"))
         return "-"
     image_preview.short_description = "Превью изображения"
 
     def image_tag(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:50px;"/>', obj.image.url)
+            return format_html('<img src="{}" style="height:50px;" loading="lazy"/>', rendition_url(obj, "thumb"))
         return "-"
     image_tag.short_description = "Изображение"
 
@@ -119,4 +126,9 @@ class PaymentAdmin(admin.ModelAdmin):
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ("table_name", "operation", "changed_at", "changed_by")
     list_filter = ("table_name", "operation", "changed_at")
-    search_fields = ("table_name", "changed_by")
\ No newline at end of file
+    search_fields = ("table_name", "changed_by")
+    # журнал партиционирован по changed_at: навигация по датам отсекает лишние партиции,
+    # а полный COUNT(*) по всем партициям на каждой странице не нужен
+    date_hierarchy = "changed_at"
+    show_full_result_count = False
+    ordering = ("-changed_at",)
@@ -0,0 +1,198 @@
+"""
+Асинхронные view для чтения: каталог, карточка товара, список и карточка
+товаров и заказов в API. Подключаются в kursach/urls.py настройкой
+ELSHOP_ASYNC_VIEWS (при запуске через ASGI) поверх тех же адресов.
+
+Чтение идёт через async ORM (acount, aget, async for), кэш каталога — через
+асинхронный API кэша. Всё, что меняет данные, остаётся синхронным: в API
+запросы кроме GET, а также GET браузерного API (HTML) передаются в обычные
+DRF viewset'ы. Пагинаторы DRF синхронные, поэтому страница API выбирается
+одним переходом в поток (sync_to_async), как это делает и сам async ORM.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.urls import path, re_path
+from django.utils.translation import gettext as _
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import catalog_cache, conditional
+from .facets import compute_facets
+from .models import Category
+from .views import ProductListView, ProductDetailView, ProductViewSet, OrderViewSet
+
+
+# --------- Каталог ---------
+class AsyncProductListView(ProductListView):
+    async def get(self, request, *args, **kwargs):
+        filters = self.get_filters()
+        self.object_list = self.get_queryset()
+        page_size = self.get_paginate_by(self.object_list)
+
+        cached = await catalog_cache.aget_or_compute(
+            "page", self.get_page_params(), lambda: self.acompute_page(self.object_list, page_size),
+            self.get_cache_timeout(),
+        )
+        paginator, page, products, is_paginated = self.build_page(self.object_list, page_size, cached)
+        self.set_availability(products, {pk: available async for pk, available in self.get_stock_queryset(products)})
+        categories = await catalog_cache.aget_or_compute(
+            "categories", None, lambda: _alist(Category.objects.all())
+        )
+        facets = await catalog_cache.aget_or_compute(
+            "facets", filters, lambda: sync_to_async(compute_facets)(filters), self.get_cache_timeout()
+        )
+
+        context = {
+            "view": self,
+            "paginator": paginator,
+            "page_obj": page,
+            "is_paginated": is_paginated,
+            "object_list": products,
+            self.context_object_name: products,
+        }
+        context.update(self.get_catalog_context(filters, categories, facets))
+        return self.render_to_response(context)
+
+    async def acompute_page(self, queryset, page_size):
+        """Страница для кэша, как в ProductListView.paginate_queryset"""
+        paginator = self.get_paginator(
+            queryset, page_size,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        paginator.count = await queryset.acount()
+
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        try:
+            page_number = int(page)
+        except ValueError:
+            if page != "last":
+                raise Http404(_("Page is not “last”, nor can it be converted to an int."))
+            page_number = paginator.num_pages
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(_("Invalid page (%(page_number)s): %(message)s") % {
+                "page_number": page_number, "message": str(e),
+            })
+        return {"count": paginator.count, "number": page.number, "products": await _alist(page.object_list)}
+
+
+# --------- Товар ---------
+class AsyncProductDetailView(ProductDetailView):
+    async def get(self, request, *args, **kwargs):
+        # Пользователь и тема в ETag читаются синхронно — одним переходом в поток
+        validator = await sync_to_async(self.get_validator)(request)
+        response = conditional.not_modified(request, validator)
+        if response is None:
+            queryset = self.get_queryset()
+            try:
+                self.object = await queryset.aget(pk=self.kwargs[self.pk_url_kwarg])
+            except queryset.model.DoesNotExist:
+                raise Http404(_("No %(verbose_name)s found matching the query")
+                              % {"verbose_name": queryset.model._meta.verbose_name})
+            response = self.render_to_response(self.get_context_data(object=self.object))
+        return conditional.add_validators(response, validator, private=True)
+
+
+# --------- API: list / retrieve ---------
+class AsyncReadEndpoint:
+    """
+    GET list/retrieve DRF viewset'а через async ORM. Остальные методы, HTML
+    браузерного API и viewset'ы с ограничивающими permission_classes
+    обслуживает синхронный viewset — ответы и поведение записи те же.
+    """
+    LIST_ACTIONS = {"get": "list", "post": "create"}
+    DETAIL_ACTIONS = {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}
+
+    def __init__(self, viewset, basename, detail):
+        self.viewset = viewset
+        self.detail = detail
+        self.initkwargs = {"basename": basename, "detail": detail}
+        self.sync_view = viewset.as_view(self.DETAIL_ACTIONS if detail else self.LIST_ACTIONS, **self.initkwargs)
+        self.read_only = all(issubclass(p, AllowAny) for p in viewset.permission_classes)
+
+    def as_view(self):
+        async def view(request, *args, **kwargs):
+            if request.method != "GET" or not self.read_only:
+                return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+            viewset = self.viewset(**self.initkwargs)
+            viewset.action_map = {"get": "retrieve" if self.detail else "list"}
+            viewset.action = viewset.action_map["get"]
+            viewset.args, viewset.kwargs = args, kwargs
+            viewset.request = drf_request = viewset.initialize_request(request, *args, **kwargs)
+            viewset.headers = viewset.default_response_headers
+            viewset.format_kwarg = viewset.get_format_suffix(**kwargs)
+
+            renderer, media_type = viewset.perform_content_negotiation(drf_request)
+            if not isinstance(renderer, JSONRenderer):
+                return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+            drf_request.accepted_renderer, drf_request.accepted_media_type = renderer, media_type
+
+            try:
+                validator = await self.get_validator(viewset, drf_request)
+                response = conditional.not_modified(drf_request, validator)
+                if response is None:
+                    response = await (self.retrieve(viewset) if self.detail else self.list(viewset))
+                conditional.add_validators(response, validator)
+            except Exception as exc:
+                response = viewset.handle_exception(exc)
+            return viewset.finalize_response(drf_request, response, *args, **kwargs)
+
+        view.csrf_exempt = True
+        view.cls = self.viewset
+        view.actions = self.DETAIL_ACTIONS if self.detail else self.LIST_ACTIONS
+        return view
+
+    async def get_validator(self, viewset, request):
+        """ETag/Last-Modified viewset'а (ConditionalGetViewSetMixin) или None"""
+        name = "get_retrieve_validator" if self.detail else "get_list_validator"
+        if not hasattr(viewset, name):
+            return None
+        return await sync_to_async(getattr(viewset, name))(request)
+
+    async def list(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        plan = viewset.get_list_plan() if hasattr(viewset, "get_list_plan") else None
+        if plan is not None:
+            queryset = plan.queryset(queryset)
+        paginator = viewset.paginator
+        if paginator is None:
+            rows = await _alist(queryset)
+        else:
+            rows = await sync_to_async(paginator.paginate_queryset)(queryset, viewset.request, view=viewset)
+        if plan is None:
+            data = viewset.get_serializer(rows, many=True).data
+        else:
+            data = await sync_to_async(plan.serialize)(rows)  # связи страницы — отдельными запросами
+        return Response(data) if paginator is None else paginator.get_paginated_response(data)
+
+    async def retrieve(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup = viewset.lookup_url_kwarg or viewset.lookup_field
+        try:
+            instance = await queryset.aget(**{viewset.lookup_field: viewset.kwargs[lookup]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        return Response(viewset.get_serializer(instance).data)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+# Те же адреса и имена, что у роутера DRF ([^/.]+ — чтобы не перехватывать .json)
+urlpatterns = [
+    path("api/products/", AsyncReadEndpoint(ProductViewSet, "product", detail=False).as_view(), name="product-list"),
+    # batch/ — действие viewset'а (пакетная запись), а не карточка товара
+    re_path(r"^api/products/(?!batch/)(?P<pk>[^/.]+)/$",
+            AsyncReadEndpoint(ProductViewSet, "product", detail=True).as_view(), name="product-detail"),
+    path("api/orders/", AsyncReadEndpoint(OrderViewSet, "order", detail=False).as_view(), name="order-list"),
+    re_path(r"^api/orders/(?P<pk>[^/.]+)/$", AsyncReadEndpoint(OrderViewSet, "order", detail=True).as_view(),
+            name="order-detail"),
+    path("", AsyncProductListView.as_view(), name="catalog"),
+    path("product/<int:pk>/", AsyncProductDetailView.as_view(), name="product_detail"),
+]
@@ -0,0 +1,62 @@
+"""
+Пользователь для журнала аудита: триггеры читают current_setting('app.current_user').
+
+Значение не ставится на сессию (SET): за PgBouncer в режиме transaction
+соединение после каждой транзакции уходит другому клиенту, и «чужой»
+пользователь попал бы в чужой аудит. Вместо этого AuditUserMiddleware на
+время запроса добавляет к каждому изменяющему SQL-запросу
+    SELECT set_config('app.current_user', '<user>', true);
+в той же строке. is_local = true живёт до конца транзакции, а запрос вне
+atomic() и так выполняется одной неявной транзакцией — лишних обращений к
+БД нет, и после запроса на соединении ничего не остаётся.
+"""
+import re
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+current_request = ContextVar("audit_current_request", default=None)
+
+WRITE_SQL = re.compile(r"^\s*(?:INSERT|UPDATE|DELETE|MERGE)\b|\bElShop_sp_\w+\s*\(", re.IGNORECASE)
+
+
+def _literal(value):
+    return "'" + value.replace("\x00", "").replace("'", "''") + "'"
+
+
+def audit_user_wrapper(execute, sql, params, many, context):
+    if many or not WRITE_SQL.search(sql):
+        return execute(sql, params, many, context)
+    # request.user ленивый: пользователь загружается только если запрос что-то меняет
+    user = getattr(current_request.get(), "user", None)
+    if user is None or not user.is_authenticated:
+        return execute(sql, params, many, context)
+
+    prefix = f"SELECT set_config('app.current_user', {_literal(user.get_username())}, true); "
+    if params is not None:
+        # С параметрами % в тексте — это плейсхолдеры, литерал экранируем
+        prefix = prefix.replace("%", "%%")
+    result = execute(prefix + sql, params, many, context)
+    if is_psycopg3:
+        # psycopg 3 встаёт на результат первого запроса (set_config), нам нужен второй
+        context["cursor"].nextset()
+    return result
+
+
+class AuditUserMiddleware:
+    """Подписывает изменения аутентифицированного пользователя в журнале аудита"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set(request)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(audit_user_wrapper))
+                return self.get_response(request)
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,239 @@
+"""
+Пакетная запись товаров по артикулу (sku) для интеграций (ERP): создание,
+изменение полей и цен тысячами строк за один HTTP-запрос.
+
+Строки проверяются полями ProductSerializer без запросов к БД на строку,
+категории — одним запросом на пачку. Каждая пачка (BATCH_CHUNK_SIZE строк)
+пишется в своей транзакции: новые товары — одним INSERT, изменения — одним
+UPDATE ... FROM unnest(...) только по реально изменившимся строкам, связи с
+категориями — одним DELETE и одним INSERT. Ошибка БД откатывает только свою
+пачку. Для каждой строки возвращается результат: created, updated,
+unchanged или error.
+"""
+import codecs
+import json
+import time
+from dataclasses import dataclass, field
+
+from django.db import DatabaseError, connection, transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import catalog_cache
+from .models import Category, Product
+from .serializers import ProductSerializer
+
+BATCH_CHUNK_SIZE = 1000
+
+# Поле -> тип PostgreSQL для unnest; categories — отдельно, списком id
+BATCH_COLUMNS = {"name": "text", "description": "text", "base_price": "numeric", "active": "boolean"}
+BATCH_FIELDS = {"sku", *BATCH_COLUMNS, "categories"}
+REQUIRED_ON_CREATE = ("name", "base_price")
+
+
+class NDJSONParser(BaseParser):
+    """application/x-ndjson: по объекту JSON в строке, читается потоком без загрузки тела целиком"""
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        return _ndjson_rows(codecs.iterdecode(stream, encoding))
+
+
+def _ndjson_rows(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ParseError(f"Неверный JSON: {e}")  # ошибка этой строки, остальные пишутся
+
+
+@dataclass
+class BatchResult:
+    """Итог пакета: результат по каждой строке в порядке запроса и счётчики."""
+    results: list = field(default_factory=list)
+    counts: dict = field(default_factory=lambda: {"created": 0, "updated": 0, "unchanged": 0, "error": 0})
+    elapsed: float = 0.0
+
+    def add(self, index, status, sku=None, product_id=None, errors=None):
+        item = {"index": index, "sku": sku, "status": status}
+        if product_id is not None:
+            item["id"] = product_id
+        if errors is not None:
+            item["errors"] = errors
+        self.results.append(item)
+        self.counts[status] += 1
+
+    def as_data(self):
+        return {**self.counts, "elapsed": round(self.elapsed, 3), "results": self.results}
+
+
+class ProductBatch:
+    """
+    Применяет строки {"sku": ..., поля...} к товарам. create=False — только
+    изменение существующих (PATCH): неизвестный sku — ошибка строки.
+    Переданные поля заменяют значения целиком, categories — весь набор.
+    """
+
+    def __init__(self, create=True, chunk_size=BATCH_CHUNK_SIZE):
+        self.create = create
+        self.chunk_size = chunk_size
+        self.fields = dict(ProductSerializer().fields)
+        # sku без UniqueValidator сериализатора: существующий артикул — это изменение товара
+        self.fields["sku"] = serializers.CharField(max_length=Product._meta.get_field("sku").max_length)
+
+    def run(self, rows):
+        result = BatchResult()
+        started = time.monotonic()
+        seen, chunk = set(), []
+        for index, row in enumerate(rows):
+            cleaned, errors = self.validate(row)
+            if errors:
+                result.add(index, "error", _sku(row), errors=errors)
+                continue
+            if cleaned["sku"] in seen:
+                result.add(index, "error", cleaned["sku"], errors={"sku": ["Артикул повторяется в пакете"]})
+                continue
+            seen.add(cleaned["sku"])
+            chunk.append((index, cleaned))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk, result)
+                chunk = []
+        if chunk:
+            self._flush(chunk, result)
+        if result.counts["created"] or result.counts["updated"]:
+            catalog_cache.bump_version()
+        result.results.sort(key=lambda item: item["index"])
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def validate(self, row):
+        """(данные, None) или (None, ошибки по полям) — без запросов к БД"""
+        if isinstance(row, ParseError):
+            return None, {"non_field_errors": [str(row.detail)]}
+        if not isinstance(row, dict):
+            return None, {"non_field_errors": ["Ожидался объект JSON"]}
+        errors = {name: ["Поле нельзя менять пакетно"] for name in set(row) - BATCH_FIELDS}
+        cleaned = {}
+        for name, value in row.items():
+            if name not in BATCH_FIELDS:
+                continue
+            if name == "categories":
+                if not isinstance(value, list) or not all(type(pk) is int for pk in value):
+                    errors[name] = ["Ожидался список id категорий"]
+                else:
+                    cleaned[name] = list(dict.fromkeys(value))
+                continue
+            try:
+                cleaned[name] = self.fields[name].run_validation(value)
+            except serializers.ValidationError as e:
+                errors[name] = e.detail
+        if "sku" not in row:
+            errors["sku"] = ["Обязательное поле."]
+        if cleaned.get("base_price") is not None and cleaned["base_price"] < 0:
+            errors["base_price"] = ["Цена не может быть отрицательной"]
+        return (None, errors) if errors else (cleaned, None)
+
+    def _flush(self, chunk, result):
+        try:
+            with transaction.atomic():
+                statuses = self._apply(chunk)
+        except DatabaseError as e:
+            errors = {"non_field_errors": [f"Ошибка БД, пачка отменена: {e}"]}
+            for index, row in chunk:
+                result.add(index, "error", row["sku"], errors=errors)
+            return
+        for index, row in chunk:
+            status, product_id, errors = statuses[row["sku"]]
+            result.add(index, status, row["sku"], product_id, errors)
+
+    def _apply(self, chunk):
+        """{sku: (статус, id, ошибки)} для строк пачки"""
+        rows = {row["sku"]: row for _, row in chunk}
+        statuses = {}
+        ids = dict(Product.objects.filter(sku__in=rows).values_list("sku", "id"))
+
+        known = set(Category.objects.filter(
+            pk__in={pk for row in rows.values() for pk in row.get("categories", ())}
+        ).values_list("pk", flat=True))
+        for sku, row in list(rows.items()):
+            missing = [pk for pk in row.get("categories", ()) if pk not in known]
+            incomplete = [name for name in REQUIRED_ON_CREATE if name not in row]
+            if missing:
+                statuses[sku] = ("error", ids.get(sku), {"categories": [f"Нет категорий с id {missing}"]})
+            elif sku not in ids and not self.create:
+                statuses[sku] = ("error", None, {"sku": ["Товар с таким артикулом не найден"]})
+            elif sku not in ids and incomplete:
+                statuses[sku] = ("error", None, {name: ["Обязательное поле."] for name in incomplete})
+            else:
+                continue
+            del rows[sku]
+
+        created = Product.objects.bulk_create([
+            Product(**{name: value for name, value in row.items() if name != "categories"})
+            for sku, row in rows.items() if sku not in ids
+        ])
+        for product in created:
+            ids[product.sku] = product.pk
+            statuses[product.sku] = ("created", product.pk, None)
+
+        changed = self._update_columns({ids[sku]: row for sku, row in rows.items() if sku not in statuses})
+        changed |= self._replace_categories({ids[sku]: row["categories"] for sku, row in rows.items()
+                                             if "categories" in row})
+        for sku in rows:
+            if sku not in statuses:
+                statuses[sku] = ("updated" if ids[sku] in changed else "unchanged", ids[sku], None)
+        return statuses
+
+    def _update_columns(self, rows):
+        """Одно UPDATE по изменившимся столбцам; id реально изменённых товаров"""
+        columns = [name for name in BATCH_COLUMNS if any(name in row for row in rows.values())]
+        if not columns:
+            return set()
+        table = Product._meta.db_table
+        assignments, differs, arrays, params = [], [], ["%s::int[]"], [list(rows)]
+        for name in columns:
+            column = Product._meta.get_field(name).column
+            assignments.append(f"{column} = CASE WHEN v.set_{name} THEN v.{name} ELSE p.{column} END")
+            differs.append(f"(v.set_{name} AND p.{column} IS DISTINCT FROM v.{name})")
+            arrays += [f"%s::{BATCH_COLUMNS[name]}[]", "%s::boolean[]"]
+            params += [[row.get(name) for row in rows.values()], [name in row for row in rows.values()]]
+        aliases = ", ".join(f"{name}, set_{name}" for name in columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} AS p SET {', '.join(assignments)} "
+                f"FROM unnest({', '.join(arrays)}) AS v(id, {aliases}) "
+                f"WHERE p.id = v.id AND ({' OR '.join(differs)}) RETURNING p.id",
+                params,
+            )
+            return {pk for pk, in cursor.fetchall()}
+
+    def _replace_categories(self, categories):
+        """Наборы категорий товаров: удаляются лишние связи и добавляются новые; id изменённых товаров"""
+        if not categories:
+            return set()
+        table = Product.categories.through._meta.db_table
+        pairs = [(pk, category) for pk, ids in categories.items() for category in ids]
+        params = [list(categories), [p for p, _ in pairs], [c for _, c in pairs]]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} AS l WHERE l.product_id = ANY(%s) AND (l.product_id, l.category_id) "
+                f"NOT IN (SELECT * FROM unnest(%s::int[], %s::int[])) RETURNING l.product_id",
+                params,
+            )
+            changed = {pk for pk, in cursor.fetchall()}
+            cursor.execute(
+                f"INSERT INTO {table} (product_id, category_id) SELECT * FROM unnest(%s::int[], %s::int[]) "
+                f"ON CONFLICT DO NOTHING RETURNING product_id",
+                params[1:],
+            )
+            return changed | {pk for pk, in cursor.fetchall()}
+
+
+def _sku(row):
+    sku = row.get("sku") if isinstance(row, dict) else None
+    return sku if isinstance(sku, str) else None
@@ -0,0 +1,279 @@
+"""
+Хранилища корзины.
+
+Корзина больше не лежит целиком в request.session: каждая операция меняет
+одну строку корзины атомарно на стороне хранилища, поэтому параллельные клики
+не затирают друг друга, а django_session не перезаписывается на каждый клик.
+
+- DbCartStore ("db", по умолчанию) — таблица elshop_cart_line, добавление —
+  INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + n;
+- CacheCartStore ("cache") — отдельные ключи кэша на строку, количество
+  меняется через cache.incr; нужен общий для воркеров кэш (Redis, Memcached);
+- SessionCartStore ("session") — прежнее хранение в сессии, оставлено для
+  сравнения (команда bench_cart).
+
+Хранилище выбирается настройкой ELSHOP_CART_STORE. Все хранилища отдают
+корзину в одном виде — {product_id (str): {"name", "price", "quantity", "line_total"}},
+деньги — Decimal.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import CartLine, Product
+
+
+def cart_total(lines):
+    return sum((item["line_total"] for item in lines.values()), Decimal("0"))
+
+
+def _line(name, price, quantity):
+    price = Decimal(price)
+    return {"name": name, "price": price, "quantity": quantity, "line_total": price * quantity}
+
+
+class BaseCartStore:
+    def __init__(self, request):
+        self.request = request
+
+    def lines(self):
+        """Содержимое корзины в порядке добавления"""
+        raise NotImplementedError
+
+    def add(self, product, quantity=1):
+        """Добавляет товар по текущей цене или увеличивает количество"""
+        raise NotImplementedError
+
+    def set_quantity(self, product_id, quantity):
+        """Устанавливает количество; 0 и меньше — удаление строки"""
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def reprice(self):
+        """
+        Переводит строки на текущие цены товаров, строки удалённых товаров убирает.
+        Возвращает названия изменённых строк — после отказа оформления из-за цен (EL001).
+        """
+        lines = self.lines()
+        current = dict(Product.objects.filter(pk__in=lines).values_list("pk", "base_price"))
+        changed = []
+        for pid, item in lines.items():
+            price = current.get(int(pid))
+            if price is None:
+                self.remove(pid)
+            elif price != item["price"]:
+                self._set_price(pid, price)
+            else:
+                continue
+            changed.append(item["name"])
+        return changed
+
+    def _set_price(self, product_id, price):
+        raise NotImplementedError
+
+
+class SessionCartStore(BaseCartStore):
+    """Прежний вариант: вся корзина — один JSON в сессии"""
+
+    def _load(self):
+        return self.request.session.get("cart", {})
+
+    def _save(self, cart):
+        self.request.session["cart"] = cart
+        self.request.session.modified = True
+
+    def lines(self):
+        return {pid: _line(item["name"], item["price"], item["quantity"]) for pid, item in self._load().items()}
+
+    def add(self, product, quantity=1):
+        cart = self._load()
+        pid = str(product.pk)
+        if pid in cart:
+            cart[pid]["quantity"] += quantity
+        else:
+            cart[pid] = {"name": product.name, "price": str(product.base_price), "quantity": quantity}
+        self._save(cart)
+
+    def set_quantity(self, product_id, quantity):
+        cart = self._load()
+        pid = str(product_id)
+        if pid in cart:
+            if quantity > 0:
+                cart[pid]["quantity"] = quantity
+            else:
+                del cart[pid]
+            self._save(cart)
+
+    def remove(self, product_id):
+        self.set_quantity(product_id, 0)
+
+    def clear(self):
+        self._save({})
+
+    def _set_price(self, product_id, price):
+        cart = self._load()
+        cart[str(product_id)]["price"] = str(price)
+        self._save(cart)
+
+
+_UPSERT_LINE = f"""
+    INSERT INTO {CartLine._meta.db_table} (user_id, product_id, unit_price, quantity, added_at)
+    VALUES (%s, %s, %s, %s, now())
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        quantity = {CartLine._meta.db_table}.quantity + EXCLUDED.quantity
+"""
+
+
+_REPRICE_LINES = f"""
+    UPDATE {CartLine._meta.db_table} AS c SET unit_price = p.base_price
+    FROM {Product._meta.db_table} AS p
+    WHERE c.user_id = %s AND p.id = c.product_id AND c.unit_price <> p.base_price
+    RETURNING p.name
+"""
+
+
+class DbCartStore(BaseCartStore):
+    """Строка корзины — строка таблицы; каждая операция — один запрос"""
+
+    def _lines_qs(self):
+        return CartLine.objects.filter(user_id=self.request.user.pk)
+
+    def lines(self):
+        rows = (
+            self._lines_qs()
+            .order_by("added_at", "id")
+            .values_list("product_id", "product__name", "unit_price", "quantity")
+        )
+        return {str(pid): _line(name, price, quantity) for pid, name, price, quantity in rows}
+
+    def add(self, product, quantity=1):
+        with connection.cursor() as cursor:
+            cursor.execute(_UPSERT_LINE, [self.request.user.pk, product.pk, product.base_price, quantity])
+
+    def set_quantity(self, product_id, quantity):
+        if quantity > 0:
+            self._lines_qs().filter(product_id=product_id).update(quantity=quantity)
+        else:
+            self.remove(product_id)
+
+    def remove(self, product_id):
+        self._lines_qs().filter(product_id=product_id).delete()
+
+    def clear(self):
+        self._lines_qs().delete()
+
+    def reprice(self):
+        # Одним UPDATE; строки удалённых товаров уже сняты каскадом
+        with connection.cursor() as cursor:
+            cursor.execute(_REPRICE_LINES, [self.request.user.pk])
+            return [name for name, in cursor.fetchall()]
+
+
+class CacheCartStore(BaseCartStore):
+    """
+    Ключи на пользователя: line:<id> — название и цена, qty:<id> — количество
+    (cache.incr), pos:<id> — номер слота строки, slot:<n> — id товара в порядке
+    добавления, slots — счётчик слотов, head — первый слот, который может быть живым.
+    Новую строку «занимает» тот, чей cache.add удался, — без чтения-изменения-записи.
+    Удаление стирает только ключи строки: слот, на который не указывает pos товара,
+    мёртв, а снова добавленный товар получает новый слот в конце. lines() и clear()
+    сдвигают head за мёртвые слоты в начале — потерянная запись head безвредна,
+    слоты ниже него уже не оживут.
+    """
+    TIMEOUT = 60 * 60 * 24 * 30
+
+    def _key(self, *parts):
+        return ":".join(["cart", str(self.request.user.pk), *map(str, parts)])
+
+    def _slots(self):
+        """[(номер, id товара), ...] от head до счётчика и (head, первый слот после прочитанных)"""
+        bounds = cache.get_many([self._key("slots"), self._key("head")])
+        slots, head = bounds.get(self._key("slots"), 0), bounds.get(self._key("head"), 1)
+        slot_keys = [self._key("slot", n) for n in range(head, slots + 1)]
+        values = cache.get_many(slot_keys)
+        return [(n, values.get(key)) for n, key in enumerate(slot_keys, head)], head
+
+    def _advance(self, head, taken, dead):
+        # Пустой слот мог занять ещё не дописавший add — за него head не сдвигается
+        new_head = head
+        for n, pid in taken:
+            if pid is None or not dead(n, pid):
+                break
+            new_head = n + 1
+        if new_head != head:
+            cache.set(self._key("head"), new_head, self.TIMEOUT)
+
+    def lines(self):
+        taken, head = self._slots()
+        pids = list(dict.fromkeys(pid for _, pid in taken if pid is not None))
+        keys = [self._key(kind, pid) for pid in pids for kind in ("pos", "line", "qty")]
+        values = cache.get_many(keys)
+
+        def dead(n, pid):
+            return values.get(self._key("pos", pid)) != n
+
+        result = {}
+        for n, pid in taken:
+            if pid is None or dead(n, pid):
+                continue
+            meta, quantity = values.get(self._key("line", pid)), values.get(self._key("qty", pid))
+            if meta and quantity:
+                result[pid] = _line(meta["name"], meta["price"], quantity)
+        self._advance(head, taken, dead)
+        return result
+
+    def _incr(self, key, delta):
+        if not cache.add(key, delta, self.TIMEOUT):
+            try:
+                return cache.incr(key, delta)
+            except ValueError:
+                cache.set(key, delta, self.TIMEOUT)
+        return delta
+
+    def add(self, product, quantity=1):
+        pid = str(product.pk)
+        meta = {"name": product.name, "price": str(product.base_price)}
+        if cache.add(self._key("line", pid), meta, self.TIMEOUT):
+            slot = self._incr(self._key("slots"), 1)
+            # pos раньше slot: записанный слот, на который не указывает pos, — мёртвый
+            cache.set(self._key("pos", pid), slot, self.TIMEOUT)
+            cache.set(self._key("slot", slot), pid, self.TIMEOUT)
+        self._incr(self._key("qty", pid), quantity)
+
+    def set_quantity(self, product_id, quantity):
+        if quantity <= 0:
+            self.remove(product_id)
+        elif cache.get(self._key("line", product_id)) is not None:
+            cache.set(self._key("qty", product_id), quantity, self.TIMEOUT)
+
+    def remove(self, product_id):
+        cache.delete_many([self._key(kind, product_id) for kind in ("line", "qty", "pos")])
+
+    def _set_price(self, product_id, price):
+        meta = cache.get(self._key("line", product_id))
+        if meta is not None:
+            cache.set(self._key("line", product_id), dict(meta, price=str(price)), self.TIMEOUT)
+
+    def clear(self):
+        taken, head = self._slots()
+        pids = {pid for _, pid in taken if pid is not None}
+        cache.delete_many([self._key(kind, pid) for pid in pids for kind in ("line", "qty", "pos")])
+        self._advance(head, taken, lambda n, pid: True)
+
+
+CART_STORES = {
+    "db": DbCartStore,
+    "cache": CacheCartStore,
+    "session": SessionCartStore,
+}
+
+
+def get_cart_store(request):
+    return CART_STORES[getattr(settings, "ELSHOP_CART_STORE", "db")](request)
@@ -0,0 +1,129 @@
+"""
+Кэш страниц каталога с версионированием.
+
+Ключ включает номер версии каталога и нормализованные параметры фильтра.
+При любом изменении товаров/категорий версия увеличивается (bump_version),
+и все старые ключи просто перестают читаться — удалять их не нужно, они
+вытесняются по TIMEOUT.
+
+Значения для кэша вычисляются с основной базы (db_router.primary_reads), а не
+с реплики: отставшие данные иначе жили бы в кэше весь TIMEOUT.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .db_router import primary_reads
+
+VERSION_KEY = "catalog:version"
+STATS_KEYS = {"hit": "catalog:stats:hit", "miss": "catalog:stats:miss"}
+TIMEOUT = 60 * 60
+# Выборки, зависящие от остатков (?in_stock=1): остатки меняют триггеры БД без
+# bump_version, поэтому такие страницы и фасеты живут в кэше недолго
+STOCK_TIMEOUT = 60
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+def bump_version():
+    """
+    Сбрасывает кэш каталога. Версия увеличивается сразу и ещё раз после фиксации
+    транзакции — чтобы не осталась закэшированной выборка, прочитанная до COMMIT.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def make_key(kind, params=None):
+    raw = json.dumps(params or {}, sort_keys=True, default=str)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalog:v{get_version()}:{kind}:{digest}"
+
+
+def _count(outcome):
+    key = STATS_KEYS[outcome]
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_or_compute(kind, params, compute, timeout=TIMEOUT):
+    """Возвращает значение из кэша или вычисляет и сохраняет его на timeout секунд."""
+    key = make_key(kind, params)
+    value = cache.get(key)
+    if value is not None:
+        _count("hit")
+        return value
+    _count("miss")
+    with primary_reads():
+        value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+# --------- Асинхронные варианты (для ElShop/async_views.py) ---------
+
+async def aget_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(VERSION_KEY, 1)
+    return version
+
+
+async def amake_key(kind, params=None):
+    raw = json.dumps(params or {}, sort_keys=True, default=str)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalog:v{await aget_version()}:{kind}:{digest}"
+
+
+async def _acount(outcome):
+    key = STATS_KEYS[outcome]
+    if not await cache.aadd(key, 1, timeout=None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, timeout=None)
+
+
+async def aget_or_compute(kind, params, compute, timeout=TIMEOUT):
+    """То же, что get_or_compute, но compute — корутинная функция."""
+    key = await amake_key(kind, params)
+    value = await cache.aget(key)
+    if value is not None:
+        await _acount("hit")
+        return value
+    await _acount("miss")
+    with primary_reads():
+        value = await compute()
+    await cache.aset(key, value, timeout)
+    return value
+
+
+def stats():
+    hits = cache.get(STATS_KEYS["hit"], 0)
+    misses = cache.get(STATS_KEYS["miss"], 0)
+    total = hits + misses
+    return {
+        "version": get_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
@@ -0,0 +1,123 @@
+"""
+Оформление заказа из корзины.
+
+place_order_db — один вызов хранимой функции ElShop_sp_checkout (миграции 0013-0014),
+включая резерв остатков (inventory.py); время оформления не зависит от размера корзины и задержки до БД.
+place_order_orm — прежний путь через ORM (отдельный запрос на каждую строку),
+оставлен для сравнения (команда bench_checkout) и как запасной режим.
+Режим выбирается настройкой ELSHOP_CHECKOUT_MODE: "db" (по умолчанию) или "orm".
+"""
+import json
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+from django.utils import timezone
+
+from .models import Address, Order, OrderItem, Payment
+from . import inventory
+
+
+class CheckoutError(Exception):
+    """
+    Заказ не может быть оформлен: корзина пуста, цены изменились или товара нет на складе.
+    code — код ошибки хранимой функции (PRICE_CHANGED — корзину стоит перевести на текущие цены).
+    """
+    PRICE_CHANGED = "EL001"
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def place_order_db(customer, cart, line1, city, country, payment_method):
+    items = [
+        {"product_id": int(pid), "quantity": int(item["quantity"]), "price": str(item["price"])}
+        for pid, item in cart.items()
+    ]
+    # Вне транзакции вызов функции атомарен сам по себе; внутри — нужна точка
+    # сохранения, чтобы ошибка проверки цен не обрывала внешнюю транзакцию
+    block = transaction.atomic() if connection.in_atomic_block else nullcontext()
+    try:
+        with block, connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT ElShop_sp_checkout(%s, %s, %s, %s, %s, %s::jsonb, %s)",
+                [customer.pk, line1, city, country, payment_method, json.dumps(items),
+                 timezone.get_current_timezone_name()],
+            )
+            return cursor.fetchone()[0]
+    except DatabaseError as e:
+        cause = e.__cause__
+        if getattr(cause, "pgcode", None) in ("EL001", "EL002", "EL003"):
+            raise CheckoutError(cause.diag.message_primary, cause.pgcode) from e
+        raise
+
+
+def place_order_orm(customer, cart, line1, city, country, payment_method):
+    with transaction.atomic():
+        existing = Address.objects.filter(
+            customer=customer,
+            line1__iexact=line1,
+            city__iexact=city,
+            country__iexact=country,
+        ).first()
+
+        if existing:
+            address = existing
+        else:
+            address = Address.objects.create(
+                customer=customer,
+                line1=line1,
+                city=city,
+                country=country,
+                is_default=False,
+            )
+
+        # создаём заказ
+        order = Order.objects.create(
+            customer=customer,
+            shipping_address=address,
+            status="draft",
+            subtotal=0, tax=0, shipping_cost=0, total=0
+        )
+
+        subtotal = 0
+        for pid, item in cart.items():
+            line_total = item["price"] * item["quantity"]
+            subtotal += line_total
+            OrderItem.objects.create(
+                order=order,
+                product_id=int(pid),
+                unit_price=item["price"],
+                quantity=item["quantity"],
+                discount=0,
+                line_total=line_total
+            )
+
+        order.subtotal = subtotal
+        order.total = subtotal
+        order.status = "paid"
+        order.save()
+
+        # платёж по выбранному способу
+        Payment.objects.create(
+            order=order,
+            method=payment_method,
+            amount=subtotal,
+        )
+
+        # резерв остатков — последним, чтобы блокировки строк склада жили меньше
+        try:
+            inventory.reserve(order.id, [(pid, item["quantity"]) for pid, item in cart.items()])
+        except inventory.OutOfStock as e:
+            raise CheckoutError(str(e))
+    return order.id
+
+
+def place_order(customer, cart, line1, city, country, payment_method):
+    """Создаёт оплаченный заказ из корзины и возвращает его id."""
+    if not cart:
+        raise CheckoutError("Корзина пуста")
+    mode = getattr(settings, "ELSHOP_CHECKOUT_MODE", "db")
+    place = place_order_orm if mode == "orm" else place_order_db
+    return place(customer, cart, line1, city, country, payment_method)
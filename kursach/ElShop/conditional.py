@@ -0,0 +1,98 @@
+"""
+Условные GET (ETag / Last-Modified) для товаров и заказов.
+
+Валидатор считается лёгким запросом только по (id, updated_at) — без
+загрузки строк целиком, prefetch и сериализации. Если клиент прислал
+совпадающий If-None-Match (или If-Modified-Since не старше Last-Modified),
+отвечаем 304; иначе строим ответ как обычно и добавляем ETag/Last-Modified.
+
+updated_at ставит БД (миграция 0020) при любой записи, включая связи товара
+с категориями и поставщиками и строки заказа. Свободный остаток товара в строку
+товара не пишется (резервирование не должно блокировать товар): его время —
+elshop_product_stock.updated_at, и валидаторы товаров берут оба столбца
+(timestamps). ETag сильный: хэш адреса, формата ответа и id и времён изменения
+всех строк ответа, поэтому меняется и при удалении/добавлении строк в список.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_validator(parts, last_modified):
+    """(ETag, Last-Modified) по значениям, от которых зависит тело ответа"""
+    digest = hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()
+    return quote_etag(digest), last_modified
+
+
+def _latest(values):
+    return max((value for value in values if value is not None), default=None)
+
+
+def row_validator(queryset, lookup, variant=(), timestamps=("updated_at",)):
+    """Валидатор одной строки: (ETag, Last-Modified) или None, если строки нет"""
+    try:
+        row = queryset.filter(**lookup).values_list("pk", *timestamps).first()
+    except (TypeError, ValueError, ValidationError):
+        return None  # кривой pk — обычный путь ответит 404
+    if row is None:
+        return None
+    return make_validator([*variant, *row], _latest(row[1:]))
+
+
+def rows_validator(rows, variant=(), timestamps=("updated_at",)):
+    """Валидатор набора строк (словари с id и timestamps) — например, страницы списка"""
+    parts = list(variant)
+    last_modified = None
+    for row in rows:
+        stamps = [row[name] for name in timestamps]
+        parts += [row["id"], *stamps]
+        last_modified = _latest([last_modified, *stamps])
+    return make_validator(parts, last_modified)
+
+
+def not_modified(request, validator):
+    """304 (или 412 для If-Match) по заголовкам запроса; None — нужен полный ответ"""
+    if validator is None or request.method not in ("GET", "HEAD"):
+        return None
+    etag, last_modified = validator
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def add_validators(response, validator, private=False):
+    """
+    ETag и Last-Modified для ответа 200/304. no-cache: кэши хранят ответ,
+    но каждый раз сверяют его с сервером; private — для страниц с данными пользователя.
+    """
+    if validator is None or response.status_code not in (200, 304):
+        return response
+    etag, last_modified = validator
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(int(last_modified.timestamp()))
+    if private:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def respond(request, validator, render, private=False):
+    """304 после запроса валидатора или render() с заголовками валидатора"""
+    response = not_modified(request, validator)
+    if response is None:
+        response = render()
+    return add_validators(response, validator, private)
+
+
+@lru_cache(maxsize=None)
+def template_version(*names):
+    """Хэш исходников шаблонов: после выкладки новых шаблонов ETag страниц меняются"""
+    digest = hashlib.md5()
+    for name in names:
+        digest.update(get_template(name).template.source.encode())
+    return digest.hexdigest()[:12]
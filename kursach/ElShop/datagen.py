@@ -0,0 +1,483 @@
+"""
+Генератор синтетических данных для нагрузочных тестов и замеров.
+
+Данные детерминированы: при одном и том же seed и пустой БД получается один
+и тот же набор строк. Все таблицы ElShop/models.py заполняются через
+PostgreSQL COPY пачками по batch_size строк, без создания объектов моделей.
+Первичные ключи назначаются явно (продолжают текущие MAX(id)), поэтому
+внешние ключи известны без обращения к БД; последовательности выставляются
+в конце.
+
+Пользовательские триггеры (аудит, проверка line_total) на время загрузки
+отключаются ALTER TABLE ... DISABLE TRIGGER USER — вызывающий код выполняет
+run() в одной транзакции, так что при ошибке откатывается и отключение.
+Журнал аудита для сгенерированных строк не ведётся; вклад новых заказов
+добавляется в агрегаты продаж одним запросом (rollups.apply_new_orders),
+резервы товара сводятся в Inventory.reserved, суммы остатков по товарам
+(elshop_product_stock) пересчитываются одним запросом.
+"""
+import io
+import math
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection
+
+from . import catalog_cache
+from .models import (
+    Customer, CustomerProfile, Address, Supplier, Category, Product, ProductSupplier,
+    Warehouse, Inventory, ProductStock, Order, StockReservation, CartLine, OrderItem, Payment,
+    UserSettings,
+)
+from .inventory import rebuild_stock_totals
+from .rollups import apply_new_orders
+
+GENERATED_PASSWORD = "elshop-demo"
+DEFAULT_BATCH_SIZE = 50000
+
+# Корневые категории: название, товары, диапазон цен (₽)
+ROOT_CATEGORIES = [
+    ("Телевизоры и видео", ["Телевизор", "Проектор", "Саундбар", "Медиаплеер"], (8000, 250000)),
+    ("Смартфоны и гаджеты", ["Смартфон", "Смарт-часы", "Фитнес-браслет", "Планшет"], (3000, 150000)),
+    ("Ноутбуки и компьютеры", ["Ноутбук", "Моноблок", "Системный блок", "Монитор"], (15000, 300000)),
+    ("Аудиотехника", ["Наушники", "Колонка", "Ресивер", "Микрофон"], (900, 90000)),
+    ("Фото и видео", ["Фотоаппарат", "Объектив", "Экшн-камера", "Штатив"], (2000, 350000)),
+    ("Бытовая техника", ["Пылесос", "Холодильник", "Микроволновая печь", "Кофемашина"], (3000, 200000)),
+    ("Игры и консоли", ["Игровая консоль", "Геймпад", "Руль", "VR-шлем"], (2500, 80000)),
+    ("Сетевое оборудование", ["Роутер", "Коммутатор", "Mesh-система", "Сетевое хранилище"], (1500, 60000)),
+    ("Комплектующие", ["Видеокарта", "Процессор", "SSD-накопитель", "Блок питания"], (2000, 200000)),
+    ("Умный дом", ["Умная лампа", "Датчик движения", "Умная розетка", "Видеозвонок"], (700, 25000)),
+]
+SUBCATEGORY_WORDS = [
+    "Премиум", "Бюджетные", "Игровые", "Для дома", "Для офиса", "Портативные",
+    "Аксессуары", "Профессиональные", "Новинки", "Беспроводные", "Компактные", "Уценка",
+]
+BRANDS = ["Samsung", "LG", "Sony", "Xiaomi", "Apple", "Philips", "Lenovo", "Asus", "Acer", "Huawei",
+          "Bosch", "Canon", "Nikon", "JBL", "TP-Link", "Dell", "HP", "Redmond", "Honor", "Realme"]
+FEATURES = ["4K HDR", "Wi-Fi 6", "Bluetooth 5.3", "быстрая зарядка", "OLED-экран", "шумоподавление",
+            "защита IP68", "металлический корпус", "гарантия 2 года", "energy class A++", "smart control",
+            "голосовой помощник", "USB-C", "беспроводная зарядка", "ультратонкий корпус"]
+FIRST_NAMES = {
+    "male": ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Иван", "Михаил", "Никита", "Егор"],
+    "female": ["Анна", "Мария", "Елена", "Ольга", "Наталья", "Екатерина", "Дарья", "Ирина", "Юлия", "Татьяна"],
+}
+LAST_NAMES = {
+    "male": ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Фёдоров"],
+    "female": ["Иванова", "Смирнова", "Кузнецова", "Попова", "Васильева", "Петрова", "Соколова", "Михайлова", "Новикова", "Фёдорова"],
+}
+CITIES = [("Москва", "Москва"), ("Санкт-Петербург", "Санкт-Петербург"), ("Новосибирск", "Новосибирская обл."),
+          ("Екатеринбург", "Свердловская обл."), ("Казань", "Татарстан"), ("Нижний Новгород", "Нижегородская обл."),
+          ("Самара", "Самарская обл."), ("Ростов-на-Дону", "Ростовская обл."), ("Краснодар", "Краснодарский край"),
+          ("Воронеж", "Воронежская обл.")]
+STREETS = ["ул. Ленина", "ул. Пушкина", "пр. Мира", "ул. Гагарина", "ул. Садовая", "Невский пр.", "ул. Советская"]
+SUPPLIER_WORDS = ["Техно", "Электро", "Digital", "Мега", "Профи", "Вольт", "Смарт", "Сигма", "Логистик", "Дистрибуция"]
+
+# Доли статусов заказов и способов оплаты
+ORDER_STATUSES = (["completed"] * 60 + ["shipped"] * 10 + ["paid"] * 15 + ["cancelled"] * 10 + ["draft"] * 5)
+PAID_STATUSES = {"paid", "shipped", "completed"}
+PAYMENT_METHODS = ["card"] * 6 + ["mir"] * 3 + ["transfer", "cash"]
+QUANTITIES = [1] * 7 + [2] * 2 + [3]
+
+_COPY_ESCAPE = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+@dataclass
+class Scale:
+    """Объёмы генерации по сущностям."""
+    categories: int = 200
+    suppliers: int = 200
+    warehouses: int = 5
+    products: int = 10000
+    customers: int = 1000
+    orders: int = 10000
+    lines_per_order: int = 3  # в среднем; фактически от 1 до 2 * lines_per_order - 1
+    days: int = 730  # заказы распределены по последним days дням
+    cart_share: float = 0.05  # доля пользователей с непустой корзиной
+
+
+def money(kopecks):
+    """Копейки → текст NUMERIC(…, 2) для COPY."""
+    return f"{kopecks // 100}.{kopecks % 100:02d}"
+
+
+def copy_value(value):
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPE)
+    return str(value)
+
+
+def copy_rows(cursor, table, columns, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Загружает строки (кортежи в порядке columns) через COPY ... FROM STDIN
+    пачками по batch_size — в памяти не больше одной пачки. Возвращает число строк.
+    """
+    qn = connection.ops.quote_name
+    sql = f"COPY {qn(table)} ({', '.join(qn(c) for c in columns)}) FROM STDIN"
+    buffer, pending, total = io.StringIO(), 0, 0
+    for row in rows:
+        buffer.write("\t".join([copy_value(v) for v in row]))
+        buffer.write("\n")
+        pending += 1
+        if pending >= batch_size:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            total += pending
+            buffer, pending = io.StringIO(), 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+        total += pending
+    return total
+
+
+class DataGenerator:
+    """
+    Заполняет все таблицы магазина по Scale. run() нужно вызывать внутри
+    transaction.atomic(): таблицы блокируются от записи до конца транзакции.
+    """
+
+    TABLE_MODELS = [
+        User, UserSettings, Customer, CustomerProfile, Address, Supplier, Category, Product,
+        ProductSupplier, Warehouse, Inventory, Order, OrderItem, Payment, StockReservation, CartLine,
+    ]
+
+    def __init__(self, scale, seed=42, batch_size=DEFAULT_BATCH_SIZE, progress=None, as_of=None):
+        self.scale = scale
+        self.seed = seed
+        self.batch_size = batch_size
+        self.progress = progress
+        self.rng = random.Random(seed)
+        # Даты отсчитываются от полуночи as_of (по умолчанию — сегодня, UTC)
+        day = as_of or datetime.now(dt_timezone.utc).date()
+        self.now = datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+        self.counts = {}
+
+    # --------- Служебное ---------
+
+    def _tables(self):
+        tables = [model._meta.db_table for model in self.TABLE_MODELS]
+        return tables + [Product.categories.through._meta.db_table]
+
+    def _next_ids(self, cursor):
+        """Первый свободный id для каждой таблицы (после блокировки — без гонок)."""
+        qn = connection.ops.quote_name
+        ids = {}
+        for model in self.TABLE_MODELS + [Product.categories.through]:
+            table = model._meta.db_table
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {qn(table)}")
+            ids[table] = cursor.fetchone()[0]
+        return ids
+
+    def _copy(self, cursor, model, columns, rows):
+        table = model._meta.db_table
+        started = time.monotonic()
+        n = copy_rows(cursor, table, columns, rows, self.batch_size)
+        self.counts[table] = self.counts.get(table, 0) + n
+        if self.progress:
+            self.progress(table, n, time.monotonic() - started)
+        return n
+
+    def _timestamp(self, days_back):
+        """Случайный момент за последние days_back дней."""
+        return self.now - timedelta(seconds=self.rng.randrange(max(1, int(days_back * 86400))))
+
+    def _skewed(self, n):
+        """Индекс 0..n-1 с перекосом к началу: «популярные» товары и покупатели."""
+        return int(n * self.rng.random() ** 2)
+
+    # --------- Загрузка ---------
+
+    def run(self):
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            tables = self._tables()
+            cursor.execute(f"LOCK TABLE {', '.join(qn(t) for t in tables)} IN SHARE ROW EXCLUSIVE MODE")
+            for table in tables:
+                cursor.execute(f"ALTER TABLE {qn(table)} DISABLE TRIGGER USER")
+            # Внешние ключи Django отложенные: проверяем сразу, иначе к COMMIT
+            # копится очередь событий на каждую строку, а ENABLE TRIGGER невозможен
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            self.ids = self._next_ids(cursor)
+            raw = cursor.cursor  # copy_expert есть только у курсора psycopg2
+
+            self._load_catalog(raw)
+            self._load_customers(raw)
+            self._load_orders(raw)
+            self._load_carts(raw)
+
+            # Свободный остаток не может быть меньше активных резервов
+            cursor.execute(f"""
+                UPDATE {qn(Inventory._meta.db_table)} i
+                SET reserved = i.reserved + r.total, quantity = GREATEST(i.quantity, i.reserved + r.total)
+                FROM (SELECT product_id, warehouse_id, SUM(quantity) AS total
+                      FROM {qn(StockReservation._meta.db_table)}
+                      WHERE status = 'active' AND id >= %s
+                      GROUP BY product_id, warehouse_id) r
+                WHERE i.product_id = r.product_id AND i.warehouse_id = r.warehouse_id
+            """, [self.ids[StockReservation._meta.db_table]])
+
+            for table in tables:
+                cursor.execute(f"ALTER TABLE {qn(table)} ENABLE TRIGGER USER")
+            for sql in connection.ops.sequence_reset_sql(no_style(), self.TABLE_MODELS + [Product.categories.through]):
+                cursor.execute(sql)
+
+            apply_new_orders(self.ids[Order._meta.db_table])
+            rebuild_stock_totals()
+            for table in tables + [ProductStock._meta.db_table]:
+                cursor.execute(f"ANALYZE {qn(table)}")
+        catalog_cache.bump_version()
+        return self.counts
+
+    def _load_catalog(self, cursor):
+        rng, scale = self.rng, self.scale
+
+        # Дерево категорий: корни, второй уровень (до 8 на корень), остальное — третий уровень
+        first_category = self.ids[Category._meta.db_table]
+        total = max(1, scale.categories)
+        n_roots = min(total, len(ROOT_CATEGORIES))
+        n_second = min(total - n_roots, n_roots * 8)
+        categories = []  # (id, name, parent_id, root_index)
+        for i in range(n_roots):
+            categories.append((first_category + i, ROOT_CATEGORIES[i][0], None, i))
+        second = []
+        for i in range(n_second):
+            parent = categories[i % n_roots]
+            second.append((first_category + n_roots + i, rng.choice(SUBCATEGORY_WORDS), parent[0], parent[3]))
+        categories += second
+        levels = second or categories[:n_roots]
+        for i in range(total - n_roots - n_second):
+            parent = rng.choice(levels)
+            categories.append((first_category + n_roots + n_second + i, rng.choice(SUBCATEGORY_WORDS),
+                               parent[0], parent[3]))
+        # Уникальность имён — по id; у вложенных в начале имя родительского корня
+        rows = [
+            (cid, f"{name} #{cid}" if parent is None else f"{ROOT_CATEGORIES[root][0]}: {name} #{cid}", parent)
+            for cid, name, parent, root in categories
+        ]
+        self._copy(cursor, Category, ["id", "name", "parent_id"], rows)
+        parents = {parent for _, _, parent, _ in categories if parent is not None}
+        leaves = [(cid, root) for cid, _, _, root in categories if cid not in parents]
+        root_ids = [c[0] for c in categories[:n_roots]]
+
+        first_supplier = self.ids[Supplier._meta.db_table]
+        self.supplier_ids = range(first_supplier, first_supplier + max(1, scale.suppliers))
+        self._copy(cursor, Supplier, ["id", "name", "contact_email", "phone"], (
+            (sid, f"ООО «{rng.choice(SUPPLIER_WORDS)}-{rng.choice(SUPPLIER_WORDS)}» #{sid}",
+             f"supplier{sid}@example.com", f"+7 495 {rng.randrange(100, 1000)}-{rng.randrange(10, 100)}-{rng.randrange(10, 100)}")
+            for sid in self.supplier_ids
+        ))
+
+        first_warehouse = self.ids[Warehouse._meta.db_table]
+        self.warehouse_ids = range(first_warehouse, first_warehouse + max(1, scale.warehouses))
+        warehouse_rows = []
+        for wid in self.warehouse_ids:
+            city, state = CITIES[(wid - first_warehouse) % len(CITIES)]
+            warehouse_rows.append((wid, f"Склад {city} #{wid}", f"{city}, {rng.choice(STREETS)}, {rng.randrange(1, 200)}"))
+        self._copy(cursor, Warehouse, ["id", "name", "location"], warehouse_rows)
+
+        # Товары: цена и основной склад нужны дальше для заказов и резервов
+        first_product = self.ids[Product._meta.db_table]
+        self.product_ids = range(first_product, first_product + scale.products)
+        self.product_prices = []
+        self.product_warehouse = []
+        product_leaf = []
+
+        def products():
+            for pid in self.product_ids:
+                leaf, root = rng.choice(leaves)
+                noun_list, (low, high) = ROOT_CATEGORIES[root][1], ROOT_CATEGORIES[root][2]
+                noun, brand = rng.choice(noun_list), rng.choice(BRANDS)
+                model = f"{rng.choice('ABCDEFGHKMNPRSTXZ')}{rng.choice('ABCDEFGHKMNPRSTXZ')}-{rng.randrange(100, 10000)}"
+                price = int(math.exp(rng.uniform(math.log(low), math.log(high))) / 10) * 1000 - 100
+                self.product_prices.append(max(price, 9900))
+                product_leaf.append((leaf, root_ids[root]))
+                features = ", ".join(rng.sample(FEATURES, 3))
+                yield (pid, f"GEN-{pid:08d}", f"{noun} {brand} {model}",
+                       f"{noun} {brand} {model}: {features}.", money(self.product_prices[-1]),
+                       self._timestamp(scale.days * 2).isoformat(), rng.random() < 0.95, None)
+
+        self._copy(cursor, Product, ["id", "sku", "name", "description", "base_price", "created_at", "active", "image"],
+                   products())
+
+        link_model = Product.categories.through
+        first_link = self.ids[link_model._meta.db_table]
+
+        def links():
+            link_id = first_link
+            for pid, (leaf, root) in zip(self.product_ids, product_leaf):
+                for cid in (leaf, root) if leaf != root else (leaf,):
+                    yield (link_id, pid, cid)
+                    link_id += 1
+
+        self._copy(cursor, link_model, ["id", "product_id", "category_id"], links())
+        del product_leaf
+
+        first_ps = self.ids[ProductSupplier._meta.db_table]
+
+        def product_suppliers():
+            ps_id = first_ps
+            for pid, price in zip(self.product_ids, self.product_prices):
+                for sid in rng.sample(self.supplier_ids, min(len(self.supplier_ids), rng.choice((1, 1, 2)))):
+                    yield (ps_id, pid, sid, f"S{sid}-{pid}", rng.randrange(1, 31),
+                           money(price * rng.randrange(60, 86) // 100))
+                    ps_id += 1
+
+        self._copy(cursor, ProductSupplier, ["id", "product_id", "supplier_id", "supplier_sku", "lead_time_days", "price"],
+                   product_suppliers())
+
+        first_inventory = self.ids[Inventory._meta.db_table]
+
+        def inventory():
+            inv_id = first_inventory
+            warehouses = list(self.warehouse_ids)
+            for pid in self.product_ids:
+                stocked = [w for w in warehouses if rng.random() < 0.6] or [rng.choice(warehouses)]
+                self.product_warehouse.append(stocked[0])
+                for wid in stocked:
+                    quantity = 0 if rng.random() < 0.1 else rng.randrange(1, 200)
+                    yield (inv_id, pid, wid, quantity, 0, self._timestamp(90).isoformat())
+                    inv_id += 1
+
+        self._copy(cursor, Inventory, ["id", "product_id", "warehouse_id", "quantity", "reserved", "last_restocked"],
+                   inventory())
+
+    def _load_customers(self, cursor):
+        rng, scale = self.rng, self.scale
+        password = make_password(GENERATED_PASSWORD)
+        first_user = self.ids[User._meta.db_table]
+        first_customer = self.ids[Customer._meta.db_table]
+        self.user_ids = range(first_user, first_user + scale.customers)
+        self.customer_ids = range(first_customer, first_customer + scale.customers)
+
+        people = []
+        for _ in range(scale.customers):
+            gender = rng.choice(("male", "female"))
+            people.append((gender, rng.choice(FIRST_NAMES[gender]), rng.choice(LAST_NAMES[gender]),
+                           self._timestamp(scale.days * 2)))
+
+        self._copy(cursor, User, ["id", "password", "last_login", "is_superuser", "username", "first_name",
+                                  "last_name", "email", "is_staff", "is_active", "date_joined"], (
+            (uid, password, None, False, f"user{uid}", first, last, f"user{uid}@example.com", False, True,
+             joined.isoformat())
+            for uid, (_, first, last, joined) in zip(self.user_ids, people)
+        ))
+        first_settings = self.ids[UserSettings._meta.db_table]
+        self._copy(cursor, UserSettings, ["id", "user_id", "theme"], (
+            (first_settings + i, uid, "dark" if rng.random() < 0.3 else "light")
+            for i, uid in enumerate(self.user_ids)
+        ))
+        self._copy(cursor, Customer, ["id", "user_id", "email", "first_name", "last_name", "phone", "created_at"], (
+            (cid, uid, f"user{uid}@example.com", first, last,
+             f"+7 9{rng.randrange(10, 100)} {rng.randrange(100, 1000)}-{rng.randrange(10, 100)}-{rng.randrange(10, 100)}",
+             joined.isoformat())
+            for cid, uid, (_, first, last, joined) in zip(self.customer_ids, self.user_ids, people)
+        ))
+        first_profile = self.ids[CustomerProfile._meta.db_table]
+        self._copy(cursor, CustomerProfile, ["id", "customer_id", "date_of_birth", "gender", "loyalty_points"], (
+            (first_profile + i, cid, (self.now - timedelta(days=rng.randrange(18 * 365, 70 * 365))).date().isoformat(),
+             gender, rng.randrange(0, 5000))
+            for i, (cid, (gender, _, _, _)) in enumerate(zip(self.customer_ids, people))
+        ))
+        del people
+
+        # У каждого покупателя 1–2 адреса, первый — по умолчанию
+        first_address = self.ids[Address._meta.db_table]
+        self.customer_address = []
+
+        def addresses():
+            address_id = first_address
+            for cid in self.customer_ids:
+                self.customer_address.append(address_id)
+                for n in range(rng.choice((1, 1, 2))):
+                    city, state = rng.choice(CITIES)
+                    yield (address_id, cid, f"{rng.choice(STREETS)}, {rng.randrange(1, 200)}",
+                           f"кв. {rng.randrange(1, 300)}" if rng.random() < 0.7 else None,
+                           city, state, "Россия", n == 0)
+                    address_id += 1
+
+        self._copy(cursor, Address, ["id", "customer_id", "line1", "line2", "city", "state", "country", "is_default"],
+                   addresses())
+
+    def _load_orders(self, cursor):
+        """Заказы, строки, оплаты и резервы — пачками по batch_size заказов."""
+        rng, scale = self.rng, self.scale
+        order_id = self.ids[Order._meta.db_table]
+        item_id = self.ids[OrderItem._meta.db_table]
+        payment_id = self.ids[Payment._meta.db_table]
+        reservation_id = self.ids[StockReservation._meta.db_table]
+        n_products, n_customers = len(self.product_ids), len(self.customer_ids)
+        max_lines = max(1, 2 * scale.lines_per_order - 1)
+        if not n_products or not n_customers:
+            return
+
+        remaining = scale.orders
+        while remaining > 0:
+            batch = min(remaining, self.batch_size)
+            remaining -= batch
+            orders, items, payments, reservations = [], [], [], []
+            for _ in range(batch):
+                customer = self._skewed(n_customers)
+                created_at = self._timestamp(scale.days)
+                status = rng.choice(ORDER_STATUSES)
+                subtotal = 0
+                for _ in range(rng.randint(1, max_lines)):
+                    index = self._skewed(n_products)
+                    price, quantity = self.product_prices[index], rng.choice(QUANTITIES)
+                    discount = price * quantity // 20 if rng.random() < 0.1 else 0
+                    line_total = price * quantity - discount
+                    subtotal += line_total
+                    product_id = self.product_ids[index]
+                    items.append((item_id, order_id, product_id, money(price), quantity, money(discount), money(line_total)))
+                    item_id += 1
+                    if status == "paid":
+                        reservations.append((reservation_id, order_id, product_id, self.product_warehouse[index],
+                                             quantity, "active", created_at.isoformat(), None))
+                        reservation_id += 1
+                address = self.customer_address[customer]
+                created = created_at.isoformat()
+                orders.append((order_id, self.customer_ids[customer], address, address, created, status, "₽",
+                               money(subtotal), "0.00", "0.00", money(subtotal)))
+                if status in PAID_STATUSES:
+                    paid_at = created_at + timedelta(seconds=rng.randrange(5, 600))
+                    payments.append((payment_id, order_id, money(subtotal), rng.choice(PAYMENT_METHODS),
+                                     paid_at.isoformat(), f"GEN-{order_id}"))
+                    payment_id += 1
+                order_id += 1
+
+            self._copy(cursor, Order, ["id", "customer_id", "billing_address_id", "shipping_address_id", "created_at",
+                                       "status", "currency", "subtotal", "tax", "shipping_cost", "total"], orders)
+            self._copy(cursor, OrderItem, ["id", "order_id", "product_id", "unit_price", "quantity", "discount",
+                                           "line_total"], items)
+            self._copy(cursor, Payment, ["id", "order_id", "amount", "method", "paid_at", "transaction_ref"], payments)
+            self._copy(cursor, StockReservation, ["id", "order_id", "product_id", "warehouse_id", "quantity", "status",
+                                                  "created_at", "expires_at"], reservations)
+
+    def _load_carts(self, cursor):
+        rng, scale = self.rng, self.scale
+        n_products = len(self.product_ids)
+        first_line = self.ids[CartLine._meta.db_table]
+        if not n_products:
+            return
+
+        def lines():
+            line_id = first_line
+            for uid in self.user_ids:
+                if rng.random() >= scale.cart_share:
+                    continue
+                for index in sorted({self._skewed(n_products) for _ in range(rng.randint(1, 4))}):
+                    yield (line_id, uid, self.product_ids[index], money(self.product_prices[index]),
+                           rng.choice(QUANTITIES), self._timestamp(7).isoformat())
+                    line_id += 1
+
+        self._copy(cursor, CartLine, ["id", "user_id", "product_id", "unit_price", "quantity", "added_at"], lines())
@@ -0,0 +1,21 @@
+"""
+Бэкенд PostgreSQL Django с метриками соединений (ElShop/dbpool.py).
+
+get_new_connection — это и установка нового соединения, и ожидание
+свободного соединения в пуле psycopg, поэтому его время и есть время,
+которое запрос ждёт базу до первого SQL.
+"""
+from django.db.backends.postgresql import base
+
+from ElShop import dbpool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        return dbpool.timed_acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def is_usable(self):
+        usable = super().is_usable()
+        if not usable:
+            dbpool.metrics.record_unhealthy()
+        return usable
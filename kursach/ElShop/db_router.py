@@ -0,0 +1,140 @@
+"""
+Чтение с реплик PostgreSQL (настройка ELSHOP_DB_REPLICAS) с гарантией «вижу свои записи».
+
+На реплики уходят только чтения моделей ElShop из view, отмеченных
+replica_reads (атрибут класса или декоратор), и только для GET/HEAD:
+каталог, карточка товара, история заказов, аналитика, выгрузки CSV и
+list/retrieve API. Сессии, пользователи и всё остальное читаются с основной базы.
+
+ReplicaRoutingMiddleware на время запроса ставит execute_wrapper на основную
+базу: как только запрос что-то записал (ORM, хранимые функции ElShop_sp_*),
+оставшиеся чтения этого запроса идут на основную базу, а в ответ ставится
+cookie на ELSHOP_REPLICA_PIN_SECONDS — следующие запросы клиента тоже читают
+с основной, пока реплика не догонит (оформление заказа, профиль, корзина).
+
+Выборки, которые сохраняются в общий кэш (страницы, категории и фасеты каталога),
+читаются с основной базы — блок primary_reads(): иначе отставшая реплика положила бы
+в кэш под новой версией каталога старые данные на весь TIMEOUT.
+
+Локально реплику можно изобразить второй записью в DATABASES на тот же сервер:
+ELSHOP_DB_REPLICA_HOSTS=127.0.0.1 python manage.py runserver
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .audit import WRITE_SQL
+
+PIN_COOKIE = "elshop_primary"
+REPLICA_APPS = {"ElShop"}
+
+_state = ContextVar("replica_routing_state", default=None)
+
+
+class RoutingState:
+    def __init__(self, replica=None, pinned=False):
+        self.replica = replica
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_reads(view):
+    """Декоратор view-функции: GET/HEAD могут читать с реплики"""
+    view.replica_reads = True
+    return view
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут на основную базу, даже если view читает с реплики"""
+    state = _state.get()
+    if state is None or state.replica is None:
+        yield
+        return
+    primary = RoutingState(pinned=state.pinned)
+    primary.wrote = state.wrote
+    token = _state.set(primary)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def _reads_from_replica(view_func):
+    # Обычные view, CBV (view_class) и viewset'ы DRF (cls)
+    for target in (view_func, getattr(view_func, "view_class", None), getattr(view_func, "cls", None)):
+        if getattr(target, "replica_reads", False):
+            return True
+    return False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: связи между объектами с разных алиасов допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "ELSHOP_DB_REPLICAS", None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "ELSHOP_REPLICA_PIN_SECONDS", 10)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is not None and request.method in ("GET", "HEAD") and _reads_from_replica(view_func):
+            state.replica = random.choice(settings.ELSHOP_DB_REPLICAS)
+
+    def __call__(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+
+        def wrapper(execute, sql, params, many, context):
+            if not state.wrote and WRITE_SQL.search(sql):
+                state.wrote = True
+            return execute(sql, params, many, context)
+
+        token = _state.set(state)
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(wrapper):
+                response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax")
+        if getattr(response, "streaming", False) and state.replica is not None:
+            # Потоковые выгрузки читают БД уже после выхода из view
+            response.streaming_content = _with_state(response.streaming_content, state)
+        return response
+
+
+def _with_state(content, state):
+    iterator = iter(content)
+    while True:
+        token = _state.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _state.reset(token)
+        yield chunk
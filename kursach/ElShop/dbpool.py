@@ -0,0 +1,130 @@
+"""
+Режимы соединений с PostgreSQL и метрики получения соединения.
+
+configure() вызывается из settings.py и по ELSHOP_DB_POOL["mode"] дописывает
+в DATABASES["default"] нужные параметры:
+  off        — новое соединение на каждый запрос (CONN_MAX_AGE = 0, прежний режим);
+  persistent — постоянные соединения потоков-воркеров (CONN_MAX_AGE = max_lifetime)
+               с проверкой перед повторным использованием (CONN_HEALTH_CHECKS);
+  pool       — пул psycopg 3 (psycopg[pool]) размером min_size..max_size на процесс;
+               ожидание свободного соединения ограничено timeout секундами;
+  pgbouncer  — за PgBouncer в режиме pool_mode = transaction: без серверных
+               курсоров (.iterator()) и без состояния сессии. Пользователь для
+               аудита и так передаётся только внутри транзакции (ElShop/audit.py).
+
+Во всех режимах ENGINE — ElShop.db_backend: он замеряет время получения
+соединения (установка соединения или ожидание в пуле) и неудачные проверки.
+Метрики процесса — stats(), для staff — /db/pool-stats/.
+"""
+import importlib.util
+import threading
+import time
+from collections import deque
+
+from django.core.exceptions import ImproperlyConfigured
+
+MODES = ("off", "persistent", "pool", "pgbouncer")
+SAMPLE_SIZE = 1000
+
+
+def configure(database, mode="persistent", min_size=2, max_size=20, timeout=10, max_lifetime=600,
+              max_idle=300, health_checks=True):
+    """Копия настроек базы из DATABASES для выбранного режима соединений."""
+    if mode not in MODES:
+        raise ImproperlyConfigured(f"ELSHOP_DB_POOL: неизвестный режим {mode!r}, допустимы {', '.join(MODES)}")
+    if not 0 < min_size <= max_size:
+        raise ImproperlyConfigured("ELSHOP_DB_POOL: нужно 0 < min_size <= max_size")
+
+    database = dict(database, OPTIONS=dict(database.get("OPTIONS", {})))
+    database["ENGINE"] = "ElShop.db_backend"
+    database["CONN_HEALTH_CHECKS"] = health_checks
+    database["CONN_MAX_AGE"] = 0 if mode in ("off", "pool") else max_lifetime
+
+    if mode == "pool":
+        if importlib.util.find_spec("psycopg_pool") is None:
+            raise ImproperlyConfigured("ELSHOP_DB_POOL: режим 'pool' требует psycopg 3 с пулом: pip install 'psycopg[pool]'")
+        database["OPTIONS"]["pool"] = {
+            "min_size": min_size,
+            "max_size": max_size,
+            "timeout": timeout,
+            "max_lifetime": max_lifetime,
+            "max_idle": max_idle,
+        }
+    if mode == "pgbouncer":
+        # Серверный курсор живёт дольше транзакции, а PgBouncer отдаёт соединение другому клиенту
+        database["DISABLE_SERVER_SIDE_CURSORS"] = True
+    return database
+
+
+class ConnectionMetrics:
+    """Счётчики процесса: сколько раз и как долго ждали соединение"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.acquired = 0
+            self.errors = 0
+            self.unhealthy = 0
+            self.wait_ms_total = 0.0
+            self.wait_ms_max = 0.0
+            self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def record_acquire(self, wait_ms, ok=True):
+        with self.lock:
+            if not ok:
+                self.errors += 1
+                return
+            self.acquired += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            self.samples.append(wait_ms)
+
+    def record_unhealthy(self):
+        with self.lock:
+            self.unhealthy += 1
+
+    def snapshot(self):
+        # Импорт здесь: модуль загружается из settings.py, до настройки Django
+        from .sql_telemetry import percentile
+
+        with self.lock:
+            samples = list(self.samples)
+            return {
+                "acquired": self.acquired,
+                "errors": self.errors,
+                "unhealthy": self.unhealthy,
+                "wait_ms_avg": round(self.wait_ms_total / self.acquired, 3) if self.acquired else 0.0,
+                "wait_ms_p95": round(percentile(samples, 0.95), 3),
+                "wait_ms_max": round(self.wait_ms_max, 3),
+            }
+
+
+metrics = ConnectionMetrics()
+
+
+def timed_acquire(connect):
+    """Вызывает connect() и записывает время ожидания соединения"""
+    started = time.perf_counter()
+    try:
+        connection = connect()
+    except Exception:
+        metrics.record_acquire(0, ok=False)
+        raise
+    metrics.record_acquire((time.perf_counter() - started) * 1000)
+    return connection
+
+
+def stats():
+    """Метрики процесса и, в режиме pool, статистика пула psycopg по каждой базе"""
+    from django.conf import settings
+    from django.db import connections
+
+    result = {"mode": settings.ELSHOP_DB_POOL.get("mode"), "connections": metrics.snapshot(), "pools": {}}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            result["pools"][alias] = pool.get_stats()
+    return result
@@ -0,0 +1,105 @@
+"""
+Фасеты панели фильтров каталога: число товаров по категориям и гистограмма цен.
+
+Считаются одним запросом для текущего состояния фильтра (каталог кэширует
+результат по тем же параметрам, что и страницу). Как принято для фасетов,
+счётчики категорий не учитывают выбранную категорию, а гистограмма цен —
+выбранный диапазон цен: иначе у соседних значений всегда был бы ноль.
+"""
+from decimal import Decimal
+
+from django.db import connection
+
+from .models import Product, ProductStock
+
+# Границы корзин гистограммы, ₽: [0, 1000), [1000, 5000), ..., [100000, ∞)
+PRICE_BUCKETS = (0, 1000, 5000, 10000, 30000, 60000, 100000)
+
+_PRODUCT = Product._meta.db_table
+_PRODUCT_CATEGORIES = Product.categories.through._meta.db_table
+_PRODUCT_STOCK = ProductStock._meta.db_table
+
+_FACETS_SQL = f"""
+    WITH base AS (
+        SELECT p.id, p.base_price,
+               {{price_match}} AS price_match,
+               {{category_match}} AS category_match
+        FROM {_PRODUCT} p
+        WHERE {{base_where}}
+    )
+    SELECT 'category', pc.category_id, COUNT(*)
+    FROM base b
+    JOIN {_PRODUCT_CATEGORIES} pc ON pc.product_id = b.id
+    WHERE b.price_match
+    GROUP BY pc.category_id
+    UNION ALL
+    SELECT 'total', NULL, COUNT(*) FROM base b WHERE b.price_match
+    UNION ALL
+    SELECT 'price', width_bucket(b.base_price, %s::numeric[]), COUNT(*)
+    FROM base b
+    WHERE b.category_match
+    GROUP BY 2
+"""
+
+
+def _build_sql(filters):
+    base_where, params = ["p.active"], []
+    if filters.get("q"):
+        base_where.append("p.search_vector @@ ElShop_fn_product_tsquery(%s)")
+        params.append(filters["q"])
+    if filters.get("in_stock"):
+        base_where.append(f"EXISTS (SELECT 1 FROM {_PRODUCT_STOCK} s WHERE s.product_id = p.id AND s.available > 0)")
+
+    price_match, price_params = ["TRUE"], []
+    if filters.get("min_price") is not None:
+        price_match.append("p.base_price >= %s")
+        price_params.append(filters["min_price"])
+    if filters.get("max_price") is not None:
+        price_match.append("p.base_price <= %s")
+        price_params.append(filters["max_price"])
+
+    category_match, category_params = "TRUE", []
+    if filters.get("category") is not None:
+        category_match = (
+            f"EXISTS (SELECT 1 FROM {_PRODUCT_CATEGORIES} c "
+            f"WHERE c.product_id = p.id AND c.category_id = %s)"
+        )
+        category_params.append(filters["category"])
+
+    sql = _FACETS_SQL.format(
+        price_match=" AND ".join(price_match),
+        category_match=category_match,
+        base_where=" AND ".join(base_where),
+    )
+    # Порядок параметров — как в тексте запроса: SELECT базы, затем WHERE, затем корзины
+    return sql, price_params + category_params + params + [list(PRICE_BUCKETS)]
+
+
+def compute_facets(filters):
+    """
+    filters — нормализованный фильтр каталога (ProductListView.get_filters).
+    Возвращает {"total": n, "categories": {id: n}, "prices": [{"min", "max", "count"}, ...]}.
+    """
+    sql, params = _build_sql(filters)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    categories, by_bucket, total = {}, {}, 0
+    for kind, key, count in rows:
+        if kind == "category":
+            categories[key] = count
+        elif kind == "total":
+            total = count
+        else:
+            by_bucket[key] = count
+
+    prices = []
+    for i, low in enumerate(PRICE_BUCKETS):
+        high = PRICE_BUCKETS[i + 1] if i + 1 < len(PRICE_BUCKETS) else None
+        prices.append({
+            "min": Decimal(low),
+            "max": Decimal(high) if high is not None else None,
+            "count": by_bucket.get(i + 1, 0),
+        })
+    return {"total": total, "categories": categories, "prices": prices}
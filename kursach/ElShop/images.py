@@ -0,0 +1,186 @@
+"""
+Уменьшенные копии изображений товаров (Pillow).
+
+Для Product.image строятся копии по RENDITIONS (thumb — списки и админка,
+card — карточка каталога, detail — страница товара) в исходном формате
+(JPEG, либо PNG при прозрачности) и в WebP. Имя файла — хэш содержимого
+исходника и параметров SPEC_VERSION:
+    products/renditions/ab/ab12…-card.webp
+поэтому новое изображение всегда получает новые адреса, а файлы по этим
+адресам можно отдавать с Cache-Control: max-age=31536000, immutable.
+
+Метаданные лежат в Product.image_renditions (NULL — ещё не построены):
+    {"source": "products/x.jpg", "spec": 1, "hash": "...",
+     "renditions": {"card": {"width": 400, "height": 300, "jpg": "...", "webp": "..."}, ...}}
+Строятся после сохранения товара с новым изображением (signals.py) и
+командой build_image_renditions для уже загруженных. В шаблонах —
+{% load elshop_images %}{% product_image product "card" %}.
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Имя → наибольшая сторона, px. Меняете размеры или качество — увеличьте SPEC_VERSION
+RENDITIONS = {"thumb": 160, "card": 400, "detail": 1000}
+SPEC_VERSION = 1
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+RENDITIONS_DIR = "products/renditions"
+
+# Запросы srcset/sizes для шаблонов: ширина картинки на странице
+SIZES = {
+    "thumb": "160px",
+    "card": "(min-width: 768px) 33vw, 100vw",
+    "detail": "(min-width: 768px) 50vw, 100vw",
+}
+
+IMAGE_ERRORS = (OSError, UnidentifiedImageError, Image.DecompressionBombError)
+
+
+def content_hash(data):
+    digest = hashlib.sha256(data)
+    digest.update(f"spec:{SPEC_VERSION}".encode())
+    return digest.hexdigest()[:20]
+
+
+def rendition_name(digest, name, ext):
+    return f"{RENDITIONS_DIR}/{digest[:2]}/{digest}-{name}.{ext}"
+
+
+def _encode(image, ext):
+    buffer = io.BytesIO()
+    if ext == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif ext == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def build_renditions(source_name, storage=default_storage):
+    """Строит недостающие копии для файла source_name и возвращает метаданные"""
+    with storage.open(source_name, "rb") as f:
+        data = f.read()
+    digest = content_hash(data)
+    existing = _existing_renditions(digest, storage)
+    if existing is not None:
+        return {"source": source_name, "spec": SPEC_VERSION, "hash": digest, "renditions": existing}
+
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        transparent = original.mode in ("RGBA", "LA", "PA") or "transparency" in original.info
+        original = original.convert("RGBA" if transparent else "RGB")
+        fallback = "png" if transparent else "jpg"
+
+        renditions = {}
+        for name, size in RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)  # не увеличивает
+            entry = {"width": image.width, "height": image.height}
+            for ext in (fallback, "webp"):
+                path = rendition_name(digest, name, ext)
+                # Имя зависит только от содержимого: готовый файл не пересобираем
+                if not storage.exists(path):
+                    saved = storage.save(path, ContentFile(_encode(image, ext)))
+                    if saved != path:
+                        storage.delete(saved)  # параллельный процесс успел записать тот же файл
+                entry[ext] = path
+            renditions[name] = entry
+    return {"source": source_name, "spec": SPEC_VERSION, "hash": digest, "renditions": renditions}
+
+
+def _existing_renditions(digest, storage):
+    """
+    Метаданные уже построенных копий того же содержимого (одно изображение у
+    нескольких товаров, повторный запуск) — размеры читаются из заголовка
+    файла без декодирования. None, если чего-то не хватает.
+    """
+    renditions = {}
+    for name in RENDITIONS:
+        for fallback in ("jpg", "png"):
+            path = rendition_name(digest, name, fallback)
+            if storage.exists(path) and storage.exists(rendition_name(digest, name, "webp")):
+                break
+        else:
+            return None
+        with storage.open(path, "rb") as f, Image.open(f) as image:
+            width, height = image.size
+        renditions[name] = {"width": width, "height": height, fallback: path,
+                            "webp": rendition_name(digest, name, "webp")}
+    return renditions
+
+
+def update_product_renditions(product_id):
+    """
+    Строит копии для изображения товара и сохраняет метаданные. Возвращает
+    "built", "cleared" (изображения нет — метаданные сняты) или "failed":
+    для битого файла записывается пустой набор (шаблоны покажут исходник),
+    чтобы не пытаться снова на каждом сохранении.
+    """
+    from . import catalog_cache
+    from .models import Product
+
+    name = Product.objects.filter(pk=product_id).values_list("image", flat=True).first()
+    if not name:
+        Product.objects.filter(pk=product_id, image_renditions__isnull=False).update(image_renditions=None)
+        return "cleared"
+    try:
+        meta = build_renditions(name)
+        status = "built"
+    except IMAGE_ERRORS as e:
+        meta = {"source": name, "spec": SPEC_VERSION, "hash": None, "renditions": {}, "error": str(e)[:200]}
+        status = "failed"
+    # Изображение могли сменить, пока строили копии — тогда метаданные уже не его
+    if Product.objects.filter(pk=product_id, image=name).update(image_renditions=meta):
+        catalog_cache.bump_version()
+    return status
+
+
+def needs_renditions(product):
+    image = product.image.name if product.image else ""
+    meta = product.image_renditions
+    if not image:
+        return meta is not None
+    return meta is None or meta.get("source") != image or meta.get("spec") != SPEC_VERSION
+
+
+def pending_products(queryset):
+    """Товары, которым нужно построить или снять копии (как needs_renditions, но одним запросом)"""
+    from django.db.models import F, Q
+    from django.db.models.fields.json import KT
+
+    has_image = ~Q(image="") & Q(image__isnull=False)
+    return queryset.annotate(rendered_source=KT("image_renditions__source"), rendered_spec=KT("image_renditions__spec")).filter(
+        (has_image & (Q(rendered_source__isnull=True) | ~Q(rendered_source=F("image"))
+                      | Q(rendered_spec__isnull=True) | ~Q(rendered_spec=str(SPEC_VERSION))))
+        | (~has_image & Q(image_renditions__isnull=False))
+    )
+
+
+# --------- Для шаблонов ---------
+def rendition(product, name):
+    """Метаданные копии name или None, если копий нет"""
+    meta = product.image_renditions or {}
+    if meta.get("source") != (product.image.name if product.image else None):
+        return None
+    return meta.get("renditions", {}).get(name)
+
+
+def srcset(product, ext=None):
+    """'url 160w, url 400w, …' по всем копиям: ext="webp" или исходный формат (одинаковые ширины — один раз)"""
+    meta = product.image_renditions or {}
+    if meta.get("source") != (product.image.name if product.image else None):
+        return ""
+    candidates = {}
+    for entry in meta.get("renditions", {}).values():
+        candidates.setdefault(entry["width"], entry[ext or fallback_ext(entry)])
+    return ", ".join(f"{default_storage.url(path)} {width}w" for width, path in sorted(candidates.items()))
+
+
+def fallback_ext(entry):
+    return "png" if "png" in entry else "jpg"
+
@@ -0,0 +1,153 @@
+import codecs
+import csv
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Product, Category
+from . import catalog_cache
+
+IMPORT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта: количество строк, ошибки по строкам и скорость."""
+    imported: int = 0
+    skipped: int = 0
+    duplicates: int = 0  # строки с sku, повторённым ниже в той же пачке (записана последняя)
+    errors: list = field(default_factory=list)  # [(номер строки, сообщение), ...]
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+
+def iter_decoded_lines(binary_file, encoding='cp1251'):
+    """Построчно декодирует файл (в т.ч. UploadedFile), не читая его целиком в память."""
+    return codecs.iterdecode(binary_file, encoding)
+
+
+class ProductImporter:
+    """
+    Пакетный импорт товаров из CSV формата export_products_csv.
+
+    Строки обрабатываются пачками по chunk_size: категории разрешаются одним
+    запросом на пачку, товары вставляются/обновляются по sku одним
+    INSERT ... ON CONFLICT, связи с категориями переписываются массово.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._category_ids = {}
+
+    def run(self, lines):
+        result = ImportResult()
+        started = time.monotonic()
+        reader = csv.DictReader(lines, delimiter=';')
+
+        chunk = []
+        accepted = 0  # номер для артикулов без ID: уникален в пределах файла
+        for row in reader:
+            parsed = self._parse_row(row, accepted + 1)
+            if parsed is None:
+                result.skipped += 1
+                continue
+            if isinstance(parsed, str):
+                result.errors.append((reader.line_num, parsed))
+                continue
+            chunk.append(parsed)
+            accepted += 1
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk, result, started)
+                chunk = []
+
+        if chunk:
+            self._flush(chunk, result, started)
+        if result.imported:
+            catalog_cache.bump_version()
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def _parse_row(self, row, seq):
+        """Возвращает dict с данными товара, None для пустой строки или текст ошибки."""
+        name = (row.get('Название') or '').strip()
+        if not name:
+            return None
+        if len(name) > Product._meta.get_field('name').max_length:
+            return f"Слишком длинное название: {name[:30]}…"
+
+        price_str = (row.get('Цена') or '0').strip().replace(',', '.')
+        try:
+            base_price = Decimal(price_str)
+        except InvalidOperation:
+            return f"Неверный формат цены: {price_str}"
+        if not base_price.is_finite():
+            return f"Неверный формат цены: {price_str}"
+        if base_price < 0:
+            return "Цена не может быть отрицательной"
+        # Округление до копеек и max_digits поля — иначе переполнение numeric отменит всю пачку в БД
+        price_field = Product._meta.get_field('base_price')
+        try:
+            base_price = base_price.quantize(Decimal(1).scaleb(-price_field.decimal_places))
+            price_field.run_validators(base_price)
+        except (InvalidOperation, ValidationError):
+            return f"Слишком большая цена: {price_str}"
+
+        sku = (row.get('ID') or '').strip() or f"SKU_{name[:5].upper()}_{seq}"
+        if len(sku) > Product._meta.get_field('sku').max_length:
+            return f"Слишком длинный артикул: {sku[:30]}…"
+
+        categories = [c.strip() for c in (row.get('Категории') or '').split(',') if c.strip()]
+        return {
+            'sku': sku,
+            'name': name,
+            'description': (row.get('Описание') or '').strip(),
+            'base_price': base_price,
+            'categories': categories,
+        }
+
+    def _resolve_categories(self, names):
+        missing = {n for n in names if n not in self._category_ids}
+        if not missing:
+            return
+        Category.objects.bulk_create([Category(name=n) for n in missing], ignore_conflicts=True)
+        self._category_ids.update(
+            Category.objects.filter(name__in=missing).values_list('name', 'id')
+        )
+
+    def _flush(self, chunk, result, started):
+        # Повторяющийся sku в пачке: побеждает последняя строка, как при построчном импорте
+        rows = {r['sku']: r for r in chunk}
+
+        with transaction.atomic():
+            self._resolve_categories({n for r in rows.values() for n in r['categories']})
+
+            products = Product.objects.bulk_create(
+                [
+                    Product(sku=r['sku'], name=r['name'], description=r['description'], base_price=r['base_price'])
+                    for r in rows.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=['name', 'description', 'base_price'],
+            )
+
+            Link = Product.categories.through
+            product_ids = [p.pk for p in products]
+            Link.objects.filter(product_id__in=product_ids).delete()
+            Link.objects.bulk_create([
+                Link(product_id=p.pk, category_id=self._category_ids[name])
+                for p in products
+                for name in dict.fromkeys(rows[p.sku]['categories'])
+            ])
+
+        result.imported += len(rows)
+        result.duplicates += len(chunk) - len(rows)
+        if self.progress:
+            self.progress(result.imported, time.monotonic() - started)
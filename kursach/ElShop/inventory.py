@@ -0,0 +1,121 @@
+"""
+Резервирование остатков под заказы.
+
+Логика живёт в хранимых функциях (миграции 0014, 0022), чтобы оформление заказа
+через ElShop_sp_checkout резервировало товар в том же вызове:
+  ElShop_sp_reserve_stock       — атомарные условные UPDATE по складам;
+  ElShop_sp_release_stock       — снятие резерва при отмене / списание при отгрузке;
+  ElShop_sp_confirm_reservations — оплата: резерв становится бессрочным;
+  ElShop_sp_expire_reservations — снятие просроченных резервов (с TTL).
+
+Оформление создаёт уже оплаченный заказ — резерв бессрочный. Черновик заказа
+(API) удерживает товар ELSHOP_RESERVATION_TTL (hold): не оплаченный за это время
+резерв снимает команда expire_reservations.
+"""
+import json
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+
+
+class OutOfStock(Exception):
+    """На складах недостаточно свободного остатка."""
+
+
+def _lines_payload(lines):
+    return json.dumps([{"product_id": int(pid), "quantity": int(qty)} for pid, qty in lines])
+
+
+def _call(sql, params):
+    # Внутри транзакции — точка сохранения: нехватка товара не обрывает внешнюю транзакцию
+    block = transaction.atomic() if connection.in_atomic_block else nullcontext()
+    try:
+        with block, connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+    except DatabaseError as e:
+        cause = e.__cause__
+        if getattr(cause, "pgcode", None) == "EL003":
+            raise OutOfStock(cause.diag.message_primary) from e
+        raise
+
+
+def reserve(order_id, lines, ttl=None):
+    """
+    Резервирует [(product_id, quantity), ...] под заказ. ttl (timedelta) — срок,
+    после которого резерв снимается командой expire_reservations.
+    """
+    _call("SELECT ElShop_sp_reserve_stock(%s, %s::jsonb, %s)", [order_id, _lines_payload(lines), ttl])
+
+
+def hold(order_id, lines):
+    """Резерв под неоплаченный заказ на ELSHOP_RESERVATION_TTL; прежний резерв заказа снимается."""
+    release(order_id)
+    reserve(order_id, lines, getattr(settings, "ELSHOP_RESERVATION_TTL", timedelta(minutes=30)))
+
+
+def confirm(order_id):
+    """
+    Оплата заказа: его резерв становится бессрочным. Если удержание уже истекло
+    (expire_reservations), строки заказа резервируются заново (OutOfStock, если
+    товара не хватает).
+    """
+    return _call("SELECT ElShop_sp_confirm_reservations(%s)", [order_id])
+
+
+def release(order_id):
+    """Возвращает зарезервированный под заказ товар в свободный остаток."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT ElShop_sp_release_stock(%s, FALSE)", [order_id])
+        return cursor.fetchone()[0]
+
+
+def fulfil(order_id):
+    """Списывает зарезервированный товар со склада при отгрузке."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT ElShop_sp_release_stock(%s, TRUE)", [order_id])
+        return cursor.fetchone()[0]
+
+
+def expire_stale():
+    """Снимает просроченные резервы, возвращает их количество."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT ElShop_sp_expire_reservations()")
+        return cursor.fetchone()[0]
+
+
+def apply_stock_deltas():
+    """
+    Переносит приращения остатков текущей транзакции в elshop_product_stock сразу,
+    а не при COMMIT (миграция 0025) — если суммы нужно прочитать до фиксации.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS trg_stock_delta_apply IMMEDIATE")
+        cursor.execute("SET CONSTRAINTS trg_stock_delta_apply DEFERRED")
+
+
+def rebuild_stock_totals():
+    """
+    Пересчитывает elshop_product_stock по складам целиком. Обычно суммы ведут
+    триггеры миграций 0021 и 0025; нужно после загрузки с отключёнными триггерами
+    (datagen) или ручных правок. Возвращает число изменённых строк.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE elshop_inventory IN SHARE MODE")
+        apply_stock_deltas()  # иначе при COMMIT они легли бы поверх пересчёта
+        cursor.execute(
+            """
+            INSERT INTO elshop_product_stock AS s (product_id, quantity, reserved)
+            SELECT p.id, COALESCE(SUM(i.quantity), 0), COALESCE(SUM(i.reserved), 0)
+            FROM elshop_product p LEFT JOIN elshop_inventory i ON i.product_id = p.id
+            GROUP BY p.id
+            ON CONFLICT (product_id) DO UPDATE
+              SET quantity = EXCLUDED.quantity, reserved = EXCLUDED.reserved,
+                  updated_at = CASE WHEN s.available <> EXCLUDED.quantity - EXCLUDED.reserved
+                                    THEN clock_timestamp() ELSE s.updated_at END
+              WHERE (s.quantity, s.reserved) IS DISTINCT FROM (EXCLUDED.quantity, EXCLUDED.reserved)
+            """
+        )
+        return cursor.rowcount
@@ -0,0 +1,168 @@
+import asyncio
+import io
+import statistics
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from ElShop.async_views import urlpatterns as async_urlpatterns
+from ElShop.models import Order, Product
+from ElShop.sql_telemetry import percentile
+
+HOST = "localhost"
+
+# Режимы: (точка входа, асинхронные view чтения)
+MODES = {
+    "wsgi": ("wsgi", False),
+    "asgi-sync": ("asgi", False),
+    "asgi-async": ("asgi", True),
+}
+
+
+def wsgi_request(app, url):
+    """Один запрос через WSGI-приложение; (статус, секунды)"""
+    parts = urlsplit(url)
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": parts.path, "QUERY_STRING": parts.query,
+        "SERVER_NAME": HOST, "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "HTTP_HOST": HOST,
+        "HTTP_ACCEPT": "application/json" if parts.path.startswith("/api/") else "text/html",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+    status = []
+    started = time.perf_counter()
+    body = app(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+    return status[0], time.perf_counter() - started
+
+
+async def asgi_request(app, url):
+    """Один запрос через ASGI-приложение, как его передал бы сервер (uvicorn, daphne)"""
+    parts = urlsplit(url)
+    accept = b"application/json" if parts.path.startswith("/api/") else b"text/html"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": parts.path, "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(), "root_path": "",
+        "headers": [(b"host", HOST.encode()), (b"accept", accept)],
+        "server": (HOST, 80), "client": ("127.0.0.1", 50000),
+    }
+    done = asyncio.Event()
+    sent = {"request": False, "status": 0}
+
+    async def receive():
+        if not sent["request"]:
+            sent["request"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    done.set()
+    return sent["status"], time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Сравнение WSGI и ASGI (синхронные и асинхронные view чтения): запросов/с и хвосты задержек'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[10, 50],
+            help='Число одновременных запросов (потоков WSGI / задач ASGI); не больше max_connections БД',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=300,
+            help='Запросов на каждый режим и уровень параллельности',
+        )
+        parser.add_argument(
+            '--modes',
+            nargs='+',
+            choices=list(MODES),
+            default=list(MODES),
+            help='wsgi — WSGI и синхронные view; asgi-sync — ASGI и те же view; asgi-async — ASGI и async_views',
+        )
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(active=True).order_by('id').first()
+        order = Order.objects.order_by('id').first()
+        if product is None or order is None:
+            raise CommandError("Нужны товары и заказы (например, python manage.py generate_data)")
+        urls = [
+            "/", "/?page=2", f"/product/{product.pk}/",
+            "/api/products/?page_size=50", f"/api/products/{product.pk}/",
+            "/api/orders/?page_size=20", f"/api/orders/{order.pk}/",
+        ]
+
+        # Обычный URLconf и URLconf с асинхронными view поверх тех же адресов
+        base = __import__(settings.ROOT_URLCONF, fromlist=['urlpatterns']).urlpatterns
+        base = [p for p in base if p not in async_urlpatterns]
+        urlconfs = {False: types.ModuleType("bench_sync_urls"), True: types.ModuleType("bench_async_urls")}
+        urlconfs[False].urlpatterns = base
+        urlconfs[True].urlpatterns = async_urlpatterns + base
+        wsgi_app, asgi_app = get_wsgi_application(), get_asgi_application()
+
+        self.stdout.write(f"{'режим':>11} {'параллельно':>11} {'запросов/с':>11} "
+                          f"{'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'ошибок':>7}")
+        for concurrency in options['concurrency']:
+            for mode in options['modes']:
+                entry, use_async = MODES[mode]
+                targets = [urls[i % len(urls)] for i in range(options['requests'])]
+                with override_settings(ROOT_URLCONF=urlconfs[use_async]):
+                    # Прогрев: первые запросы заполняют кэш каталога и открывают соединения
+                    self.run(entry, wsgi_app, asgi_app, urls, min(concurrency, len(urls)))
+                    started = time.perf_counter()
+                    results = self.run(entry, wsgi_app, asgi_app, targets, concurrency)
+                    elapsed = time.perf_counter() - started
+
+                latencies = [seconds * 1000 for _, seconds in results]
+                errors = sum(1 for status, _ in results if status >= 400)
+                self.stdout.write(
+                    f"{mode:>11} {concurrency:>11} {len(results) / elapsed:>11.0f} "
+                    f"{statistics.median(latencies):>8.1f} {percentile(latencies, 0.95):>8.1f} "
+                    f"{percentile(latencies, 0.99):>8.1f} {errors:>7}"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Готово: клиент и приложение работают в одном процессе, сравнивайте режимы между собой"
+        ))
+
+    def run(self, entry, wsgi_app, asgi_app, urls, concurrency):
+        if entry == "wsgi":
+            # Как воркер gunicorn с concurrency потоками
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                return list(pool.map(lambda url: wsgi_request(wsgi_app, url), urls))
+
+        async def main():
+            # Один процесс с циклом событий, как uvicorn: не больше concurrency запросов одновременно
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(url):
+                async with semaphore:
+                    return await asgi_request(asgi_app, url)
+
+            return await asyncio.gather(*(one(url) for url in urls))
+
+        return asyncio.run(main())
@@ -0,0 +1,90 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from ElShop.carts import CART_STORES
+from ElShop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Сравнение хранилищ корзины: операций в секунду и потерянные обновления при параллельных кликах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines',
+            type=int,
+            default=20,
+            help='Строк в корзине',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=20,
+            help='Повторов цикла «добавить все строки, изменить количество, удалить»',
+        )
+
+    def handle(self, *args, **options):
+        session_engine = import_module(settings.SESSION_ENGINE)
+        factory = RequestFactory()
+
+        # Все тестовые данные создаются в транзакции и откатываются в конце
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench_cart_user', password='bench')
+            products = Product.objects.bulk_create([
+                Product(sku=f'BENCH-CART-{i}', name=f'Bench product {i}', base_price=100 + i)
+                for i in range(options['lines'])
+            ])
+            session = session_engine.SessionStore()
+            session.create()
+
+            def click(store_name, operation):
+                """Один запрос: сессия читается из БД и сохраняется, если изменилась (как SessionMiddleware)"""
+                request = factory.post('/')
+                request.user = user
+                request.session = session_engine.SessionStore(session.session_key)
+                store = CART_STORES[store_name](request)
+                result = operation(store)
+                if request.session.modified:
+                    request.session.save()
+                return result
+
+            self.stdout.write(f"{'хранилище':>10} {'операций/с':>11} {'мкс/операция':>13} {'потеряно':>9}")
+            for name in CART_STORES:
+                click(name, lambda store: store.clear())
+                ops = 0
+                started = time.perf_counter()
+                for _ in range(options['rounds']):
+                    for product in products:
+                        click(name, lambda store: store.add(product))
+                    for product in products:
+                        click(name, lambda store: store.set_quantity(product.pk, 3))
+                    for product in products:
+                        click(name, lambda store: store.remove(product.pk))
+                    ops += 3 * len(products)
+                elapsed = time.perf_counter() - started
+
+                # Два параллельных клика «добавить» по одному товару: оба прочитали
+                # корзину до того, как кто-либо из них её записал
+                first, second = factory.post('/'), factory.post('/')
+                for request in (first, second):
+                    request.user = user
+                    request.session = session_engine.SessionStore(session.session_key)
+                    CART_STORES[name](request).lines()
+                for request in (first, second):
+                    CART_STORES[name](request).add(products[0])
+                    if request.session.modified:
+                        request.session.save()
+                quantity = click(name, lambda store: store.lines())[str(products[0].pk)]['quantity']
+                click(name, lambda store: store.clear())
+
+                self.stdout.write(
+                    f"{name:>10} {ops / elapsed:>11.0f} {elapsed / ops * 1e6:>13.0f} {2 - quantity:>9}"
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Готово, тестовые данные откачены"))
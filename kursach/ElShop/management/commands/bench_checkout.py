@@ -0,0 +1,85 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from ElShop.checkout import CheckoutError, place_order_db, place_order_orm
+from ElShop.models import Customer, Inventory, Product, Warehouse
+
+
+class Command(BaseCommand):
+    help = 'Сравнение оформления заказа: хранимая функция ElShop_sp_checkout и прежний путь через ORM'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1,10,100',
+            help='Размеры корзины (строк) через запятую',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество заказов на каждый размер и режим',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',')]
+        repeat = options['repeat']
+
+        # Все тестовые данные создаются в транзакции и откатываются в конце
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench_checkout_user', password='bench')
+            customer = Customer.objects.create(
+                user=user, email='bench_checkout@example.com', first_name='Bench', last_name='Checkout'
+            )
+            products = Product.objects.bulk_create([
+                Product(sku=f'BENCH-CHK-{i}', name=f'Bench product {i}', base_price=100 + i)
+                for i in range(max(sizes))
+            ])
+            # Остатка хватает на все заказы прогона: замеряется оформление, а не отказ EL003
+            warehouse = Warehouse.objects.create(name='Bench checkout warehouse')
+            Inventory.objects.bulk_create([
+                Inventory(product=p, warehouse=warehouse, quantity=2 * 2 * (repeat + 1) * len(sizes))
+                for p in products
+            ])
+
+            self.stdout.write(f"{'строк':>6} {'режим':>5} {'среднее, мс':>12} {'p95, мс':>9} {'запросов':>9} "
+                              f"{'отказов':>8}")
+            for size in sizes:
+                cart = {
+                    str(p.pk): {'name': p.name, 'price': float(p.base_price), 'quantity': 2,
+                                'line_total': float(p.base_price) * 2}
+                    for p in products[:size]
+                }
+                for mode, place in (('orm', place_order_orm), ('db', place_order_db)):
+                    rejected = 0
+                    with CaptureQueriesContext(connection) as ctx:
+                        rejected += self._place(place, customer, cart)
+                    queries = len(ctx.captured_queries)
+
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        rejected += self._place(place, customer, cart)
+                        timings.append((time.perf_counter() - started) * 1000)
+
+                    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                    self.stdout.write(
+                        f"{size:>6} {mode:>5} {statistics.mean(timings):>12.2f} {p95:>9.2f} {queries:>9} "
+                        f"{rejected:>8}"
+                    )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Готово, тестовые данные откачены"))
+
+    @staticmethod
+    def _place(place, customer, cart):
+        """1, если заказ отклонён (цены, остатки), иначе 0; отказ откатывает свою точку сохранения"""
+        try:
+            place(customer, cart, 'ул. Тестовая, 1', 'Москва', 'Россия', 'card')
+        except CheckoutError:
+            return 1
+        return 0
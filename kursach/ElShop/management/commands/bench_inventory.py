@@ -0,0 +1,101 @@
+import multiprocessing
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+from ElShop.checkout import place_order_db, CheckoutError
+from ElShop.models import Customer, Product, Warehouse, Inventory, Order, OrderItem, StockReservation
+
+HOT_SKU = 'BENCH-INV-HOT'
+
+
+def _worker(args):
+    customer_id, product_id, price, attempts = args
+    connections.close_all()
+    customer = Customer.objects.get(pk=customer_id)
+    cart = {str(product_id): {'name': HOT_SKU, 'price': price, 'quantity': 1, 'line_total': price}}
+
+    ok = out_of_stock = errors = 0
+    latencies = []
+    for _ in range(attempts):
+        started = time.perf_counter()
+        try:
+            place_order_db(customer, cart, 'ул. Тестовая, 1', 'Москва', 'Россия', 'card')
+            ok += 1
+        except CheckoutError:
+            out_of_stock += 1
+        except Exception:
+            errors += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+    connections.close_all()
+    return ok, out_of_stock, errors, latencies
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест резервирования: много процессов покупают один «горячий» товар'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Количество процессов-покупателей')
+        parser.add_argument('--attempts', type=int, default=100, help='Попыток оформления на процесс')
+        parser.add_argument('--warehouses', type=int, default=4, help='Количество складов с остатком')
+        parser.add_argument('--stock', type=int, default=100, help='Остаток товара на каждом складе')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовые данные')
+
+    def handle(self, *args, **options):
+        product, customer = self._prepare(options['warehouses'], options['stock'])
+        total_stock = options['warehouses'] * options['stock']
+        jobs = [(customer.pk, product.pk, float(product.base_price), options['attempts'])] * options['processes']
+
+        connections.close_all()
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+            results = pool.map(_worker, jobs)
+        elapsed = time.perf_counter() - started
+
+        ok = sum(r[0] for r in results)
+        out_of_stock = sum(r[1] for r in results)
+        errors = sum(r[2] for r in results)
+        latencies = sorted(l for r in results for l in r[3])
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+
+        inventory = Inventory.objects.filter(product=product)
+        reserved = inventory.aggregate(s=Sum('reserved'))['s'] or 0
+        sold = OrderItem.objects.filter(product=product).aggregate(s=Sum('quantity'))['s'] or 0
+        overbooked_rows = sum(1 for inv in inventory if inv.reserved > inv.quantity)
+        oversold = max(0, sold - total_stock) + overbooked_rows
+
+        self.stdout.write(f"Остаток: {total_stock} шт. на {options['warehouses']} складах")
+        self.stdout.write(f"Попыток: {len(latencies)} за {elapsed:.2f} с — {len(latencies) / elapsed:.0f} оформлений/с")
+        self.stdout.write(f"Успешно: {ok}, нет в наличии: {out_of_stock}, ошибок: {errors}")
+        self.stdout.write(f"Задержка p95: {p95:.1f} мс")
+        self.stdout.write(f"Продано: {sold}, в резерве: {reserved}")
+        style = self.style.SUCCESS if oversold == 0 and sold == reserved == ok else self.style.ERROR
+        self.stdout.write(style(f"Перепродаж: {oversold}"))
+
+        if not options['keep']:
+            self._cleanup(product, customer)
+
+    def _prepare(self, warehouses, stock):
+        user, _ = User.objects.get_or_create(username='bench_inventory_user')
+        customer, _ = Customer.objects.get_or_create(
+            user=user, defaults={'email': 'bench_inventory@example.com', 'first_name': 'Bench', 'last_name': 'Inventory'}
+        )
+        product, _ = Product.objects.get_or_create(sku=HOT_SKU, defaults={'name': 'Горячий товар', 'base_price': 999})
+        self._cleanup_orders(product, customer)
+        Inventory.objects.filter(product=product).delete()
+        for i in range(warehouses):
+            warehouse, _ = Warehouse.objects.get_or_create(name=f'BENCH-INV склад {i + 1}')
+            Inventory.objects.create(product=product, warehouse=warehouse, quantity=stock)
+        return product, customer
+
+    def _cleanup_orders(self, product, customer):
+        StockReservation.objects.filter(product=product).delete()
+        Order.objects.filter(customer=customer).delete()
+
+    def _cleanup(self, product, customer):
+        self._cleanup_orders(product, customer)
+        Inventory.objects.filter(product=product).delete()
+        Warehouse.objects.filter(name__startswith='BENCH-INV').delete()
+        product.delete()
+        customer.user.delete()
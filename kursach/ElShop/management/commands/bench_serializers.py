@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from ElShop.models import Category, Order, OrderItem, Product, Supplier
+from ElShop.serializers import OrderSerializer, ProductSerializer, ValuesReadPlan
+
+# Те же выборки, что у ProductViewSet и OrderViewSet
+TARGETS = {
+    "products": (ProductSerializer, lambda: Product.objects.order_by("-id").prefetch_related(
+        Prefetch("categories", queryset=Category.objects.order_by("id")),
+        Prefetch("suppliers", queryset=Supplier.objects.order_by("id")),
+    )),
+    "orders": (OrderSerializer, lambda: Order.objects.order_by("-id").prefetch_related(
+        Prefetch("items", queryset=OrderItem.objects.order_by("id")),
+    )),
+}
+
+
+class Command(BaseCommand):
+    help = 'Сериализация списков API: ModelSerializer и ValuesReadPlan (values()), мс на 1000 строк'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Строк в одном списке')
+        parser.add_argument('--rounds', type=int, default=5, help='Повторов, берётся лучший')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        self.stdout.write(
+            f"{'список':>9} {'способ':>10} {'строк':>6} {'чтение, мс/1k':>14} {'сериализация, мс/1k':>20}"
+        )
+        for name, (serializer_class, queryset) in TARGETS.items():
+            plan = ValuesReadPlan.for_serializer(serializer_class())
+            if plan is None:
+                raise CommandError(f"{serializer_class.__name__}: план values() не строится")
+
+            def regular():
+                rows = list(queryset()[:options['rows']])
+                started = time.perf_counter()
+                return rows, started, serializer_class(rows, many=True).data
+
+            def fast():
+                rows = list(plan.queryset(queryset())[:options['rows']])
+                started = time.perf_counter()
+                return rows, started, plan.serialize(rows)  # вместе с запросами id связей страницы
+
+            results = {}
+            for method, run in (("serializer", regular), ("values", fast)):
+                best_read = best_serialize = float("inf")
+                for _ in range(options['rounds']):
+                    started = time.perf_counter()
+                    rows, serialized_at, data = run()
+                    finished = time.perf_counter()
+                    best_read = min(best_read, serialized_at - started)
+                    best_serialize = min(best_serialize, finished - serialized_at)
+                results[method] = renderer.render(data)
+                per_k = 1000 / max(len(rows), 1) * 1000
+                self.stdout.write(
+                    f"{name:>9} {method:>10} {len(rows):>6} {best_read * per_k:>14.1f} {best_serialize * per_k:>20.1f}"
+                )
+            if results["serializer"] != results["values"]:
+                raise CommandError(f"{name}: JSON различается")
+        self.stdout.write(self.style.SUCCESS("JSON совпадает байт в байт"))
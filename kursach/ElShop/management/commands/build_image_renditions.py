@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from ElShop import images
+from ElShop.models import Product
+
+
+def _worker(product_ids):
+    connections.close_all()
+    counts = {"built": 0, "failed": 0, "cleared": 0}
+    for product_id in product_ids:
+        try:
+            counts[images.update_product_renditions(product_id)] += 1
+        except Exception:
+            counts["failed"] += 1
+    connections.close_all()
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Уменьшенные копии изображений товаров (thumb, card, detail, WebP) для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='Количество процессов')
+        parser.add_argument('--chunk-size', type=int, default=20, help='Товаров на одно задание процесса')
+        parser.add_argument('--all', action='store_true',
+                            help='Все товары с изображениями, а не только без актуальных копий')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.order_by('id')
+        if options['all']:
+            queryset = queryset.exclude(image='').exclude(image=None)
+        else:
+            queryset = images.pending_products(queryset)
+        ids = list(queryset.values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.SUCCESS("Все копии актуальны"))
+            return
+
+        size = options['chunk_size']
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+        processes = max(1, min(options['processes'], len(chunks)))
+
+        # Процессы-потомки не должны унаследовать открытые соединения
+        connections.close_all()
+        started = time.perf_counter()
+        totals = {"built": 0, "failed": 0, "cleared": 0}
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            for done, counts in enumerate(pool.imap_unordered(_worker, chunks), 1):
+                for key, value in counts.items():
+                    totals[key] += value
+                if done % 50 == 0 or done == len(chunks):
+                    self.stdout.write(f"  {sum(totals.values())}/{len(ids)}")
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Процессов: {processes}, товаров: {len(ids)} за {elapsed:.1f} с "
+                          f"({len(ids) / elapsed:.1f} товаров/с)")
+        style = self.style.SUCCESS if totals["failed"] == 0 else self.style.WARNING
+        self.stdout.write(style(f"Построено: {totals['built']}, не удалось прочитать: {totals['failed']}, "
+                                f"снято без изображения: {totals['cleared']}"))
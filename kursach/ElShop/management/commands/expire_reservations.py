@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ElShop.inventory import expire_stale
+
+
+class Command(BaseCommand):
+    help = 'Снятие просроченных резервов товара (запускать по расписанию, например раз в минуту)'
+
+    def handle(self, *args, **options):
+        released = expire_stale()
+        self.stdout.write(self.style.SUCCESS(f"Снято просроченных резервов: {released}"))
@@ -0,0 +1,48 @@
+import os
+from django.core.management.base import BaseCommand
+from ElShop.importers import ProductImporter, iter_decoded_lines, IMPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Пакетный импорт товаров из большого CSV-файла (формат экспорта товаров)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'csv_file',
+            type=str,
+            help='Путь к CSV-файлу (разделитель ";")',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='cp1251',
+            help='Кодировка файла (по умолчанию cp1251)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help='Количество строк в одной пачке/транзакции',
+        )
+
+    def handle(self, *args, **options):
+        csv_file = options['csv_file']
+        if not os.path.exists(csv_file):
+            self.stderr.write(self.style.ERROR(f"Файл не найден: {csv_file}"))
+            return
+
+        def progress(imported, elapsed):
+            rate = imported / elapsed if elapsed else 0
+            self.stdout.write(f"  импортировано {imported} строк ({rate:.0f} строк/с)")
+
+        importer = ProductImporter(chunk_size=options['chunk_size'], progress=progress)
+        with open(csv_file, 'rb') as f:
+            result = importer.run(iter_decoded_lines(f, options['encoding']))
+
+        for line, msg in result.errors:
+            self.stderr.write(self.style.WARNING(f"Строка {line}: {msg}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано {result.imported} строк за {result.elapsed:.1f} с "
+            f"({result.rows_per_sec:.0f} строк/с), пропущено {result.skipped}, "
+            f"повторов артикула {result.duplicates}, ошибок {len(result.errors)}"
+        ))
@@ -0,0 +1,54 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+def shift_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание журнала аудита: создаёт партиции на месяцы вперёд '
+            'и удаляет целиком партиции старше срока хранения (запускать раз в сутки)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=12,
+            help='Сколько месяцев журнала хранить, включая текущий',
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='На сколько месяцев вперёд заранее создавать партиции',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать партиции, которые будут удалены',
+        )
+
+    def handle(self, *args, **options):
+        this_month = date.today().replace(day=1)
+        cutoff = shift_months(this_month, -(max(options['keep_months'], 1) - 1))
+        horizon = shift_months(this_month, options['months_ahead'])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT ElShop_sp_audit_ensure_partitions(%s, %s)", [this_month, horizon]
+            )
+            created = cursor.fetchone()[0]
+            cursor.execute("SELECT * FROM ElShop_sp_audit_drop_partitions(%s)", [cutoff])
+            dropped = [row[0] for row in cursor.fetchall()]
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"Создано партиций: {created}")
+        for name in dropped:
+            self.stdout.write(f"  удалена {name}" if not options['dry_run'] else f"  будет удалена {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Журнал хранится с {cutoff:%Y-%m}, удалено партиций: {len(dropped)}"
+        ))
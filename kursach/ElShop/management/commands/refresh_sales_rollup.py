@@ -0,0 +1,29 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from ElShop.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт агрегатов продаж для аналитики (за период или за всё время)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=str,
+            help='Начало периода (YYYY-MM-DD), по умолчанию — с первого заказа',
+        )
+        parser.add_argument(
+            '--end-date',
+            type=str,
+            help='Конец периода (YYYY-MM-DD), по умолчанию — по последний заказ',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start_date = date.fromisoformat(options['start_date']) if options['start_date'] else None
+            end_date = date.fromisoformat(options['end_date']) if options['end_date'] else None
+        except ValueError as e:
+            raise CommandError(f"Неверный формат даты: {e}")
+
+        rows = rebuild_rollups(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"Агрегаты продаж пересчитаны: {rows} строк по товарам"))
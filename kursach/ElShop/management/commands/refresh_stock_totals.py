@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ElShop.inventory import rebuild_stock_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт сумм остатков по товарам (elshop_product_stock) из складов — после ручных правок в обход триггеров'
+
+    def handle(self, *args, **options):
+        changed = rebuild_stock_totals()
+        self.stdout.write(self.style.SUCCESS(f"Исправлено строк остатков: {changed}"))
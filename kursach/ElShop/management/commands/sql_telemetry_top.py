@@ -0,0 +1,82 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ElShop.sql_telemetry import percentile
+
+
+class Command(BaseCommand):
+    help = 'Самые дорогие SQL-запросы по данным телеметрии (ELSHOP_SQL_TELEMETRY_FILE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='Файл телеметрии, по умолчанию — ELSHOP_SQL_TELEMETRY_FILE',
+        )
+        parser.add_argument(
+            '--order-by',
+            choices=['total', 'p95', 'count'],
+            default='total',
+            help='Сортировка: суммарное время, p95 или число запросов',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько строк вывести',
+        )
+        parser.add_argument(
+            '--view',
+            help='Только запросы указанного view (например, ProductListView или OrderViewSet.list)',
+        )
+        parser.add_argument(
+            '--stacks',
+            action='store_true',
+            help='Показать стеки медленных запросов',
+        )
+
+    def handle(self, *args, **options):
+        path = options['file'] or getattr(settings, 'ELSHOP_SQL_TELEMETRY_FILE', None)
+        try:
+            with open(path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать файл телеметрии: {e}")
+
+        # Сводим окна всех процессов по паре (view, отпечаток)
+        merged = {}
+        for record in records:
+            if options['view'] and record['view'] != options['view']:
+                continue
+            key = (record['view'], record['fingerprint'])
+            entry = merged.setdefault(key, {
+                'view': record['view'], 'sql': record['sql'],
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'samples': [], 'slow': [],
+            })
+            entry['count'] += record['count']
+            entry['total_ms'] += record['total_ms']
+            entry['max_ms'] = max(entry['max_ms'], record['max_ms'])
+            entry['samples'] += record['samples']
+            entry['slow'] += record['slow']
+
+        for entry in merged.values():
+            entry['p95_ms'] = percentile(entry['samples'], 0.95)
+        sort_key = {'total': 'total_ms', 'p95': 'p95_ms', 'count': 'count'}[options['order_by']]
+        top = sorted(merged.values(), key=lambda e: e[sort_key], reverse=True)[:options['limit']]
+
+        self.stdout.write(
+            f"{'всего, мс':>10} {'запросов':>9} {'среднее':>8} {'p95':>8} {'макс':>8}  view / запрос"
+        )
+        for entry in top:
+            self.stdout.write(
+                f"{entry['total_ms']:>10.1f} {entry['count']:>9} {entry['total_ms'] / entry['count']:>8.2f} "
+                f"{entry['p95_ms']:>8.2f} {entry['max_ms']:>8.2f}  {entry['view']}"
+            )
+            self.stdout.write(f"{'':>48}{entry['sql'][:200]}")
+            if options['stacks']:
+                for slow in sorted(entry['slow'], key=lambda s: s['ms'], reverse=True)[:3]:
+                    self.stdout.write(f"{'':>48}-- {slow['ms']} мс:")
+                    for frame in slow['stack']:
+                        self.stdout.write(f"{'':>50}{frame}")
+
+        if not top:
+            self.stdout.write("Нет данных")
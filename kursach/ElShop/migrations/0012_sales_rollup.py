@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0011_remove_product_weight_kg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'db_table': 'elshop_daily_revenue_rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('lines', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='ElShop.product')),
+            ],
+            options={
+                'db_table': 'elshop_sales_rollup',
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='uniq_sales_rollup_day_product')],
+            },
+        ),
+    ]
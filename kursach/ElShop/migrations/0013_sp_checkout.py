@@ -0,0 +1,106 @@
+from django.db import migrations
+
+SQL = r"""
+-- === Оформление заказа одним вызовом ===
+-- p_items: [{"product_id": 1, "quantity": 2, "price": "59999.00"}, ...]
+-- Цены из корзины сверяются с текущими ElShop_product.base_price,
+-- все вставки (адрес, заказ, строки, платёж, агрегаты продаж) — набором.
+
+CREATE OR REPLACE FUNCTION ElShop_sp_checkout(
+  p_customer_id BIGINT,
+  p_line1 TEXT,
+  p_city TEXT,
+  p_country TEXT,
+  p_payment_method TEXT,
+  p_items JSONB,
+  p_timezone TEXT DEFAULT 'UTC'
+)
+RETURNS BIGINT LANGUAGE plpgsql AS $$
+DECLARE
+  v_address_id BIGINT;
+  v_order_id BIGINT;
+  v_subtotal NUMERIC := 0;
+  v_lines INT := 0;
+  v_invalid TEXT;
+  v_day DATE := (now() AT TIME ZONE p_timezone)::date;
+BEGIN
+  SELECT string_agg(c.product_id::text, ', ')
+    INTO v_invalid
+  FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT, price NUMERIC)
+  LEFT JOIN ElShop_product p ON p.id = c.product_id
+  WHERE p.id IS NULL OR p.base_price <> c.price OR c.quantity IS NULL OR c.quantity <= 0;
+
+  IF v_invalid IS NOT NULL THEN
+    RAISE EXCEPTION 'Цена или наличие товаров изменились: %', v_invalid USING ERRCODE = 'EL001';
+  END IF;
+
+  SELECT COALESCE(SUM(p.base_price * c.quantity), 0), COUNT(*) INTO v_subtotal, v_lines
+  FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT)
+  JOIN ElShop_product p ON p.id = c.product_id;
+
+  IF v_lines = 0 THEN
+    RAISE EXCEPTION 'Корзина пуста' USING ERRCODE = 'EL002';
+  END IF;
+
+  SELECT id INTO v_address_id FROM ElShop_address
+  WHERE customer_id = p_customer_id
+    AND UPPER(line1) = UPPER(p_line1)
+    AND UPPER(city) = UPPER(p_city)
+    AND UPPER(country) = UPPER(p_country)
+  ORDER BY id
+  LIMIT 1;
+
+  IF v_address_id IS NULL THEN
+    INSERT INTO ElShop_address(customer_id, line1, city, country, is_default)
+    VALUES (p_customer_id, p_line1, p_city, p_country, FALSE)
+    RETURNING id INTO v_address_id;
+  END IF;
+
+  INSERT INTO ElShop_order(customer_id, shipping_address_id, created_at, status, currency,
+                           subtotal, tax, shipping_cost, total)
+  VALUES (p_customer_id, v_address_id, now(), 'paid', '₽', v_subtotal, 0, 0, v_subtotal)
+  RETURNING id INTO v_order_id;
+
+  INSERT INTO ElShop_order_item(order_id, product_id, unit_price, quantity, discount, line_total)
+  SELECT v_order_id, c.product_id, p.base_price, c.quantity, 0, p.base_price * c.quantity
+  FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT)
+  JOIN ElShop_product p ON p.id = c.product_id;
+
+  INSERT INTO ElShop_payment(order_id, amount, method, paid_at)
+  VALUES (v_order_id, v_subtotal, p_payment_method, now());
+
+  -- Агрегаты продаж для аналитики (см. ElShop/rollups.py)
+  INSERT INTO elshop_daily_revenue_rollup(day, orders, revenue)
+  VALUES (v_day, 1, v_subtotal)
+  ON CONFLICT (day) DO UPDATE SET
+    orders = elshop_daily_revenue_rollup.orders + EXCLUDED.orders,
+    revenue = elshop_daily_revenue_rollup.revenue + EXCLUDED.revenue;
+
+  INSERT INTO elshop_sales_rollup(day, product_id, lines, quantity, revenue)
+  SELECT v_day, oi.product_id, 1, oi.quantity, oi.line_total
+  FROM ElShop_order_item oi
+  WHERE oi.order_id = v_order_id
+  ON CONFLICT (day, product_id) DO UPDATE SET
+    lines = elshop_sales_rollup.lines + EXCLUDED.lines,
+    quantity = elshop_sales_rollup.quantity + EXCLUDED.quantity,
+    revenue = elshop_sales_rollup.revenue + EXCLUDED.revenue;
+
+  RETURN v_order_id;
+END;
+$$;
+"""
+
+REVERSE_SQL = r"""
+DROP FUNCTION IF EXISTS ElShop_sp_checkout(BIGINT, TEXT, TEXT, TEXT, TEXT, JSONB, TEXT);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0012_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
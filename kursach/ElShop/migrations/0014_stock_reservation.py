@@ -0,0 +1,249 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:22
+
+import django.db.models.deletion
+from importlib import import_module
+from django.db import migrations, models
+
+SQL = r"""
+-- === Резервирование остатков ===
+-- Для каждого товара (в порядке id — единый порядок блокировок):
+--  1) одна строка склада, где свободного остатка хватает на всё количество,
+--     FOR UPDATE SKIP LOCKED — покупатели «горячего» товара не ждут друг друга,
+--     а расходятся по разным складам;
+--  2) если такой нет, блокируются все строки товара (по id, с ожиданием)
+--     и количество распределяется по складам. Нехватка — ошибка EL003.
+
+CREATE OR REPLACE FUNCTION ElShop_sp_reserve_stock(p_order_id BIGINT, p_items JSONB, p_ttl INTERVAL DEFAULT NULL)
+RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+  it RECORD;
+  v_rows INT;
+  v_free BIGINT;
+BEGIN
+  FOR it IN
+    SELECT c.product_id, SUM(c.quantity)::INT AS quantity
+    FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT)
+    GROUP BY c.product_id
+    ORDER BY c.product_id
+  LOOP
+    WITH taken AS (
+      UPDATE ElShop_inventory SET reserved = reserved + it.quantity
+      WHERE id = (
+        SELECT id FROM ElShop_inventory
+        WHERE product_id = it.product_id AND quantity - reserved >= it.quantity
+        ORDER BY quantity - reserved DESC
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+      )
+      AND quantity - reserved >= it.quantity
+      RETURNING warehouse_id
+    )
+    INSERT INTO ElShop_stock_reservation(order_id, product_id, warehouse_id, quantity, status, created_at, expires_at)
+    SELECT p_order_id, it.product_id, warehouse_id, it.quantity, 'active', now(), now() + p_ttl
+    FROM taken;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    CONTINUE WHEN v_rows > 0;
+
+    SELECT COALESCE(SUM(free), 0) INTO v_free
+    FROM (
+      SELECT quantity - reserved AS free FROM ElShop_inventory
+      WHERE product_id = it.product_id
+      ORDER BY id
+      FOR UPDATE
+    ) locked;
+
+    IF v_free < it.quantity THEN
+      RAISE EXCEPTION 'Недостаточно товара % на складах: нужно %, доступно %', it.product_id, it.quantity, v_free
+        USING ERRCODE = 'EL003';
+    END IF;
+
+    WITH plan AS (
+      SELECT id, warehouse_id,
+             LEAST(quantity - reserved,
+                   it.quantity - COALESCE(SUM(quantity - reserved) OVER w, 0)) AS take
+      FROM ElShop_inventory
+      WHERE product_id = it.product_id AND quantity > reserved
+      WINDOW w AS (ORDER BY quantity - reserved DESC, id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+    ), taken AS (
+      UPDATE ElShop_inventory i SET reserved = i.reserved + p.take
+      FROM plan p
+      WHERE i.id = p.id AND p.take > 0
+      RETURNING p.warehouse_id, p.take
+    )
+    INSERT INTO ElShop_stock_reservation(order_id, product_id, warehouse_id, quantity, status, created_at, expires_at)
+    SELECT p_order_id, it.product_id, warehouse_id, take, 'active', now(), now() + p_ttl
+    FROM taken;
+  END LOOP;
+END;
+$$;
+
+-- Снятие резерва (отмена заказа) или списание со склада (отгрузка)
+CREATE OR REPLACE FUNCTION ElShop_sp_release_stock(p_order_id BIGINT, p_fulfil BOOLEAN DEFAULT FALSE)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+  v_rows INT;
+BEGIN
+  WITH closed AS (
+    UPDATE ElShop_stock_reservation
+    SET status = CASE WHEN p_fulfil THEN 'fulfilled' ELSE 'released' END
+    WHERE order_id = p_order_id AND status = 'active'
+    RETURNING product_id, warehouse_id, quantity
+  ), per_row AS (
+    SELECT product_id, warehouse_id, SUM(quantity) AS qty FROM closed GROUP BY product_id, warehouse_id
+  )
+  UPDATE ElShop_inventory i
+  SET reserved = i.reserved - r.qty,
+      quantity = i.quantity - CASE WHEN p_fulfil THEN r.qty ELSE 0 END
+  FROM per_row r
+  WHERE i.product_id = r.product_id AND i.warehouse_id = r.warehouse_id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+-- Снятие просроченных резервов (созданных с p_ttl)
+CREATE OR REPLACE FUNCTION ElShop_sp_expire_reservations()
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+  v_rows INT;
+BEGIN
+  WITH closed AS (
+    UPDATE ElShop_stock_reservation
+    SET status = 'released'
+    WHERE status = 'active' AND expires_at IS NOT NULL AND expires_at < now()
+    RETURNING product_id, warehouse_id, quantity
+  ), per_row AS (
+    SELECT product_id, warehouse_id, SUM(quantity) AS qty, COUNT(*) AS n
+    FROM closed GROUP BY product_id, warehouse_id
+  ), released AS (
+    UPDATE ElShop_inventory i SET reserved = i.reserved - r.qty
+    FROM per_row r
+    WHERE i.product_id = r.product_id AND i.warehouse_id = r.warehouse_id
+    RETURNING r.n
+  )
+  SELECT COALESCE(SUM(n), 0) INTO v_rows FROM released;
+  RETURN v_rows;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION ElShop_sp_checkout(
+  p_customer_id BIGINT,
+  p_line1 TEXT,
+  p_city TEXT,
+  p_country TEXT,
+  p_payment_method TEXT,
+  p_items JSONB,
+  p_timezone TEXT DEFAULT 'UTC'
+)
+RETURNS BIGINT LANGUAGE plpgsql AS $$
+DECLARE
+  v_address_id BIGINT;
+  v_order_id BIGINT;
+  v_subtotal NUMERIC := 0;
+  v_lines INT := 0;
+  v_invalid TEXT;
+  v_day DATE := (now() AT TIME ZONE p_timezone)::date;
+BEGIN
+  SELECT string_agg(c.product_id::text, ', ')
+    INTO v_invalid
+  FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT, price NUMERIC)
+  LEFT JOIN ElShop_product p ON p.id = c.product_id
+  WHERE p.id IS NULL OR p.base_price <> c.price OR c.quantity IS NULL OR c.quantity <= 0;
+
+  IF v_invalid IS NOT NULL THEN
+    RAISE EXCEPTION 'Цена или наличие товаров изменились: %', v_invalid USING ERRCODE = 'EL001';
+  END IF;
+
+  SELECT COALESCE(SUM(p.base_price * c.quantity), 0), COUNT(*) INTO v_subtotal, v_lines
+  FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT)
+  JOIN ElShop_product p ON p.id = c.product_id;
+
+  IF v_lines = 0 THEN
+    RAISE EXCEPTION 'Корзина пуста' USING ERRCODE = 'EL002';
+  END IF;
+
+  SELECT id INTO v_address_id FROM ElShop_address
+  WHERE customer_id = p_customer_id
+    AND UPPER(line1) = UPPER(p_line1)
+    AND UPPER(city) = UPPER(p_city)
+    AND UPPER(country) = UPPER(p_country)
+  ORDER BY id
+  LIMIT 1;
+
+  IF v_address_id IS NULL THEN
+    INSERT INTO ElShop_address(customer_id, line1, city, country, is_default)
+    VALUES (p_customer_id, p_line1, p_city, p_country, FALSE)
+    RETURNING id INTO v_address_id;
+  END IF;
+
+  INSERT INTO ElShop_order(customer_id, shipping_address_id, created_at, status, currency,
+                           subtotal, tax, shipping_cost, total)
+  VALUES (p_customer_id, v_address_id, now(), 'paid', '₽', v_subtotal, 0, 0, v_subtotal)
+  RETURNING id INTO v_order_id;
+
+  INSERT INTO ElShop_order_item(order_id, product_id, unit_price, quantity, discount, line_total)
+  SELECT v_order_id, c.product_id, p.base_price, c.quantity, 0, p.base_price * c.quantity
+  FROM jsonb_to_recordset(p_items) AS c(product_id BIGINT, quantity INT)
+  JOIN ElShop_product p ON p.id = c.product_id;
+
+  INSERT INTO ElShop_payment(order_id, amount, method, paid_at)
+  VALUES (v_order_id, v_subtotal, p_payment_method, now());
+
+  -- Агрегаты продаж для аналитики (см. ElShop/rollups.py)
+  INSERT INTO elshop_daily_revenue_rollup(day, orders, revenue)
+  VALUES (v_day, 1, v_subtotal)
+  ON CONFLICT (day) DO UPDATE SET
+    orders = elshop_daily_revenue_rollup.orders + EXCLUDED.orders,
+    revenue = elshop_daily_revenue_rollup.revenue + EXCLUDED.revenue;
+
+  INSERT INTO elshop_sales_rollup(day, product_id, lines, quantity, revenue)
+  SELECT v_day, oi.product_id, 1, oi.quantity, oi.line_total
+  FROM ElShop_order_item oi
+  WHERE oi.order_id = v_order_id
+  ON CONFLICT (day, product_id) DO UPDATE SET
+    lines = elshop_sales_rollup.lines + EXCLUDED.lines,
+    quantity = elshop_sales_rollup.quantity + EXCLUDED.quantity,
+    revenue = elshop_sales_rollup.revenue + EXCLUDED.revenue;
+
+  -- Резерв последним шагом: блокировки строк остатков держатся минимальное время
+  PERFORM ElShop_sp_reserve_stock(v_order_id, p_items, NULL);
+
+  RETURN v_order_id;
+END;
+$$;
+
+"""
+
+REVERSE_SQL = r"""
+DROP FUNCTION IF EXISTS ElShop_sp_expire_reservations();
+DROP FUNCTION IF EXISTS ElShop_sp_release_stock(BIGINT, BOOLEAN);
+DROP FUNCTION IF EXISTS ElShop_sp_reserve_stock(BIGINT, JSONB, INTERVAL);
+""" + import_module('ElShop.migrations.0013_sp_checkout').SQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0013_sp_checkout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('released', 'Released'), ('fulfilled', 'Fulfilled')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='ElShop.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, to='ElShop.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, to='ElShop.warehouse')),
+            ],
+            options={
+                'db_table': 'elshop_stock_reservation',
+                'indexes': [models.Index(condition=models.Q(('expires_at__isnull', False), ('status', 'active')), fields=['expires_at'], name='stock_resv_active_expiry_idx')],
+            },
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
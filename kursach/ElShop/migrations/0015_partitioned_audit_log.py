@@ -0,0 +1,189 @@
+from django.db import migrations
+
+SQL = r"""
+-- === Партиционирование журнала аудита по месяцам ===
+
+CREATE OR REPLACE FUNCTION ElShop_sp_audit_ensure_partitions(p_from DATE, p_to DATE)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+  m DATE := date_trunc('month', p_from)::date;
+  v_created INT := 0;
+BEGIN
+  WHILE m <= p_to LOOP
+    IF to_regclass(format('elshop_audit_log_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'))) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF elshop_audit_log FOR VALUES FROM (%L) TO (%L)',
+        format('elshop_audit_log_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM')),
+        m::timestamp AT TIME ZONE 'UTC',
+        (m + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC'
+      );
+      v_created := v_created + 1;
+    END IF;
+    m := (m + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN v_created;
+END;
+$$;
+
+-- Удаление месячных партиций, целиком лежащих раньше p_before (мгновенно, без DELETE)
+CREATE OR REPLACE FUNCTION ElShop_sp_audit_drop_partitions(p_before DATE)
+RETURNS SETOF TEXT LANGUAGE plpgsql AS $$
+DECLARE
+  r RECORD;
+BEGIN
+  FOR r IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'elshop_audit_log'::regclass
+      AND c.relname ~ '^elshop_audit_log_y[0-9]{4}m[0-9]{2}$'
+      AND (to_date(substring(c.relname from 'y([0-9]{4})m') || substring(c.relname from 'm([0-9]{2})$'), 'YYYYMM')
+           + INTERVAL '1 month') <= p_before
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('DROP TABLE %I', r.relname);
+    RETURN NEXT r.relname;
+  END LOOP;
+END;
+$$;
+
+ALTER TABLE elshop_audit_log RENAME TO elshop_audit_log_old;
+ALTER INDEX elshop_audit_log_pkey RENAME TO elshop_audit_log_old_pkey;
+
+CREATE TABLE elshop_audit_log (
+  id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+  table_name VARCHAR(100) NOT NULL,
+  operation VARCHAR(10) NOT NULL,
+  row_data JSONB NULL,
+  changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  changed_by VARCHAR(100) NULL,
+  PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+-- Страховочная партиция на случай, если prune_audit_log давно не запускали
+CREATE TABLE elshop_audit_log_default PARTITION OF elshop_audit_log DEFAULT;
+
+SELECT ElShop_sp_audit_ensure_partitions(
+  COALESCE((SELECT MIN(changed_at) FROM elshop_audit_log_old), now())::date,
+  (now() + INTERVAL '3 months')::date
+);
+
+INSERT INTO elshop_audit_log(id, table_name, operation, row_data, changed_at, changed_by)
+SELECT id, table_name, operation, row_data, changed_at, changed_by FROM elshop_audit_log_old;
+
+SELECT setval(
+  pg_get_serial_sequence('elshop_audit_log', 'id'),
+  COALESCE((SELECT MAX(id) FROM elshop_audit_log), 0) + 1,
+  false
+);
+
+DROP TABLE elshop_audit_log_old;
+
+-- === Триггер аудита уровня оператора ===
+-- Одна вставка в журнал на оператор (INSERT ... SELECT по таблицам переходов).
+-- INSERT — новая строка целиком, UPDATE — только изменённые столбцы (+ id),
+-- строки без изменений пропускаются, DELETE — удалённая строка.
+
+CREATE OR REPLACE FUNCTION ElShop_fn_audit_log_statement()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO ElShop_audit_log(table_name, operation, row_data, changed_by, changed_at)
+    SELECT TG_TABLE_NAME, TG_OP, to_jsonb(n), current_setting('app.current_user', true), now()
+    FROM new_rows n;
+  ELSIF TG_OP = 'UPDATE' THEN
+    INSERT INTO ElShop_audit_log(table_name, operation, row_data, changed_by, changed_at)
+    SELECT TG_TABLE_NAME, TG_OP, d.diff || jsonb_build_object('id', n.id),
+           current_setting('app.current_user', true), now()
+    FROM old_rows o
+    JOIN new_rows n ON n.id = o.id
+    CROSS JOIN LATERAL (SELECT to_jsonb(o) AS old_row, to_jsonb(n) AS new_row) j
+    CROSS JOIN LATERAL (
+      SELECT jsonb_object_agg(e.key, e.value) AS diff
+      FROM jsonb_each(j.new_row) e
+      WHERE j.old_row -> e.key IS DISTINCT FROM e.value
+    ) d
+    WHERE d.diff IS NOT NULL;
+  ELSE
+    INSERT INTO ElShop_audit_log(table_name, operation, row_data, changed_by, changed_at)
+    SELECT TG_TABLE_NAME, TG_OP, to_jsonb(o), current_setting('app.current_user', true), now()
+    FROM old_rows o;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_audit_products ON ElShop_product;
+DROP TRIGGER IF EXISTS trg_audit_orders ON ElShop_order;
+
+CREATE TRIGGER trg_audit_products_ins AFTER INSERT ON ElShop_product
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_audit_log_statement();
+CREATE TRIGGER trg_audit_products_upd AFTER UPDATE ON ElShop_product
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_audit_log_statement();
+CREATE TRIGGER trg_audit_products_del AFTER DELETE ON ElShop_product
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_audit_log_statement();
+
+CREATE TRIGGER trg_audit_orders_ins AFTER INSERT ON ElShop_order
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_audit_log_statement();
+CREATE TRIGGER trg_audit_orders_upd AFTER UPDATE ON ElShop_order
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_audit_log_statement();
+CREATE TRIGGER trg_audit_orders_del AFTER DELETE ON ElShop_order
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_audit_log_statement();
+"""
+
+REVERSE_SQL = r"""
+ALTER TABLE elshop_audit_log RENAME TO elshop_audit_log_part;
+ALTER INDEX elshop_audit_log_pkey RENAME TO elshop_audit_log_part_pkey;
+
+CREATE TABLE elshop_audit_log (
+  id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  table_name VARCHAR(100) NOT NULL,
+  operation VARCHAR(10) NOT NULL,
+  row_data JSONB NULL,
+  changed_at TIMESTAMPTZ NOT NULL,
+  changed_by VARCHAR(100) NULL
+);
+
+INSERT INTO elshop_audit_log(id, table_name, operation, row_data, changed_at, changed_by)
+SELECT id, table_name, operation, row_data, changed_at, changed_by FROM elshop_audit_log_part;
+
+SELECT setval(
+  pg_get_serial_sequence('elshop_audit_log', 'id'),
+  COALESCE((SELECT MAX(id) FROM elshop_audit_log), 0) + 1,
+  false
+);
+
+DROP TABLE elshop_audit_log_part;
+DROP FUNCTION IF EXISTS ElShop_sp_audit_ensure_partitions(DATE, DATE);
+DROP FUNCTION IF EXISTS ElShop_sp_audit_drop_partitions(DATE);
+
+DROP TRIGGER IF EXISTS trg_audit_products_ins ON ElShop_product;
+DROP TRIGGER IF EXISTS trg_audit_products_upd ON ElShop_product;
+DROP TRIGGER IF EXISTS trg_audit_products_del ON ElShop_product;
+DROP TRIGGER IF EXISTS trg_audit_orders_ins ON ElShop_order;
+DROP TRIGGER IF EXISTS trg_audit_orders_upd ON ElShop_order;
+DROP TRIGGER IF EXISTS trg_audit_orders_del ON ElShop_order;
+DROP FUNCTION IF EXISTS ElShop_fn_audit_log_statement();
+
+CREATE TRIGGER trg_audit_products AFTER INSERT OR UPDATE OR DELETE ON ElShop_product
+  FOR EACH ROW EXECUTE FUNCTION ElShop_fn_audit_log();
+CREATE TRIGGER trg_audit_orders AFTER INSERT OR UPDATE OR DELETE ON ElShop_order
+  FOR EACH ROW EXECUTE FUNCTION ElShop_fn_audit_log();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0014_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
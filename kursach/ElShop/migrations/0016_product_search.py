@@ -0,0 +1,76 @@
+from django.db import migrations
+
+SQL = r"""
+-- === Полнотекстовый поиск по товарам ===
+-- search_vector поддерживается самой БД (генерируемый столбец) при любых записях,
+-- включая bulk_create/upsert импорта. Вес A — артикул и название, B — описание;
+-- название и описание индексируются в русской и английской конфигурациях.
+
+ALTER TABLE elshop_product ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple'::regconfig, COALESCE(sku, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, COALESCE(description, '')), 'B') ||
+    setweight(to_tsvector('english'::regconfig, COALESCE(description, '')), 'B')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS elshop_product_search_idx ON elshop_product USING GIN (search_vector);
+
+-- Запрос пользователя в синтаксисе websearch ("фраза", or, -исключение):
+-- совпадение в любой из конфигураций
+CREATE OR REPLACE FUNCTION ElShop_fn_product_tsquery(p_query TEXT)
+RETURNS TSQUERY LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT websearch_to_tsquery('russian'::regconfig, p_query)
+      || websearch_to_tsquery('english'::regconfig, p_query)
+      || websearch_to_tsquery('simple'::regconfig, p_query)
+$$;
+
+-- Служебный столбец поиска не пишем в журнал аудита
+CREATE OR REPLACE FUNCTION ElShop_fn_audit_log_statement()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO ElShop_audit_log(table_name, operation, row_data, changed_by, changed_at)
+    SELECT TG_TABLE_NAME, TG_OP, to_jsonb(n) - 'search_vector', current_setting('app.current_user', true), now()
+    FROM new_rows n;
+  ELSIF TG_OP = 'UPDATE' THEN
+    INSERT INTO ElShop_audit_log(table_name, operation, row_data, changed_by, changed_at)
+    SELECT TG_TABLE_NAME, TG_OP, d.diff || jsonb_build_object('id', n.id),
+           current_setting('app.current_user', true), now()
+    FROM old_rows o
+    JOIN new_rows n ON n.id = o.id
+    CROSS JOIN LATERAL (SELECT to_jsonb(o) - 'search_vector' AS old_row,
+                               to_jsonb(n) - 'search_vector' AS new_row) j
+    CROSS JOIN LATERAL (
+      SELECT jsonb_object_agg(e.key, e.value) AS diff
+      FROM jsonb_each(j.new_row) e
+      WHERE j.old_row -> e.key IS DISTINCT FROM e.value
+    ) d
+    WHERE d.diff IS NOT NULL;
+  ELSE
+    INSERT INTO ElShop_audit_log(table_name, operation, row_data, changed_by, changed_at)
+    SELECT TG_TABLE_NAME, TG_OP, to_jsonb(o) - 'search_vector', current_setting('app.current_user', true), now()
+    FROM old_rows o;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+REVERSE_SQL = r"""
+DROP FUNCTION IF EXISTS ElShop_fn_product_tsquery(TEXT);
+DROP INDEX IF EXISTS elshop_product_search_idx;
+ALTER TABLE elshop_product DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0015_partitioned_audit_log'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0016_product_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('quantity', models.PositiveIntegerField()),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ElShop.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_lines', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'elshop_cart_line',
+                'constraints': [models.UniqueConstraint(fields=('user', 'product'), name='uniq_cart_line_user_product')],
+            },
+        ),
+    ]
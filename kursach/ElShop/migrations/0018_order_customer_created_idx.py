@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0017_cart_line'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0018_order_customer_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_renditions',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
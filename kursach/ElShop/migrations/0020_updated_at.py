@@ -0,0 +1,111 @@
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+SQL = r"""
+-- === updated_at товаров и заказов ===
+-- Ставит БД, поэтому годится при любой записи: save(), update(), bulk_create/upsert
+-- импорта, хранимые функции, COPY (значение по умолчанию now()).
+-- BEFORE UPDATE: время меняется, только если строка действительно изменилась
+-- (кроме столбцов из аргументов триггера) или updated_at выставлен явно («touch»).
+-- clock_timestamp(), а не now(): долгая транзакция не запишет время раньше уже
+-- отданного клиенту; GREATEST — время строки только растёт.
+
+CREATE OR REPLACE FUNCTION ElShop_fn_touch_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.updated_at IS DISTINCT FROM OLD.updated_at
+     OR (to_jsonb(NEW) - TG_ARGV) IS DISTINCT FROM (to_jsonb(OLD) - TG_ARGV) THEN
+    NEW.updated_at := GREATEST(clock_timestamp(), OLD.updated_at + interval '1 microsecond');
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_product_updated_at ON elshop_product;
+CREATE TRIGGER trg_product_updated_at BEFORE UPDATE ON elshop_product
+  FOR EACH ROW EXECUTE FUNCTION ElShop_fn_touch_updated_at('updated_at', 'search_vector');
+DROP TRIGGER IF EXISTS trg_order_updated_at ON elshop_order;
+CREATE TRIGGER trg_order_updated_at BEFORE UPDATE ON elshop_order
+  FOR EACH ROW EXECUTE FUNCTION ElShop_fn_touch_updated_at('updated_at');
+
+-- Связанные строки, которые отдаются вместе с родителем (категории и поставщики
+-- товара, строки заказа): одно UPDATE родителей на оператор по таблицам переходов.
+-- TG_ARGV: таблица родителя и столбец ссылки на него.
+
+CREATE OR REPLACE FUNCTION ElShop_fn_touch_parent()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    EXECUTE format('UPDATE %I SET updated_at = clock_timestamp() WHERE id IN (SELECT %I FROM new_rows)',
+                   TG_ARGV[0], TG_ARGV[1]);
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    EXECUTE format('UPDATE %I SET updated_at = clock_timestamp() WHERE id IN (SELECT %I FROM old_rows)',
+                   TG_ARGV[0], TG_ARGV[1]);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  t RECORD;
+BEGIN
+  FOR t IN SELECT * FROM (VALUES
+      ('elshop_product_categories', 'elshop_product', 'product_id'),
+      ('elshop_product_supplier', 'elshop_product', 'product_id'),
+      ('elshop_order_item', 'elshop_order', 'order_id')
+    ) AS v(child, parent, fk)
+  LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_touch_' || t.child || '_ins', t.child);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_touch_' || t.child || '_upd', t.child);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_touch_' || t.child || '_del', t.child);
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_touch_parent(%L, %L)',
+                   'trg_touch_' || t.child || '_ins', t.child, t.parent, t.fk);
+    EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_touch_parent(%L, %L)',
+                   'trg_touch_' || t.child || '_upd', t.child, t.parent, t.fk);
+    EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_touch_parent(%L, %L)',
+                   'trg_touch_' || t.child || '_del', t.child, t.parent, t.fk);
+  END LOOP;
+END $$;
+"""
+
+REVERSE_SQL = r"""
+DROP TRIGGER IF EXISTS trg_product_updated_at ON elshop_product;
+DROP TRIGGER IF EXISTS trg_order_updated_at ON elshop_order;
+DROP TRIGGER IF EXISTS trg_touch_elshop_product_categories_ins ON elshop_product_categories;
+DROP TRIGGER IF EXISTS trg_touch_elshop_product_categories_upd ON elshop_product_categories;
+DROP TRIGGER IF EXISTS trg_touch_elshop_product_categories_del ON elshop_product_categories;
+DROP TRIGGER IF EXISTS trg_touch_elshop_product_supplier_ins ON elshop_product_supplier;
+DROP TRIGGER IF EXISTS trg_touch_elshop_product_supplier_upd ON elshop_product_supplier;
+DROP TRIGGER IF EXISTS trg_touch_elshop_product_supplier_del ON elshop_product_supplier;
+DROP TRIGGER IF EXISTS trg_touch_elshop_order_item_ins ON elshop_order_item;
+DROP TRIGGER IF EXISTS trg_touch_elshop_order_item_upd ON elshop_order_item;
+DROP TRIGGER IF EXISTS trg_touch_elshop_order_item_del ON elshop_order_item;
+DROP FUNCTION IF EXISTS ElShop_fn_touch_parent();
+DROP FUNCTION IF EXISTS ElShop_fn_touch_updated_at();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0019_product_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False),
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
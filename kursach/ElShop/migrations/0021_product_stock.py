@@ -0,0 +1,166 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:40
+
+import django.db.models.deletion
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+# Триггеры и начальное заполнение; conftest создаёт их и в тестовой БД
+SQL = r"""
+-- Строка остатка для каждого нового товара (одна вставка на оператор)
+CREATE OR REPLACE FUNCTION ElShop_fn_product_stock_row()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO elshop_product_stock (product_id, quantity, reserved)
+  SELECT id, 0, 0 FROM new_rows
+  ON CONFLICT (product_id) DO NOTHING;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_product_stock_row ON elshop_product;
+CREATE TRIGGER trg_product_stock_row AFTER INSERT ON elshop_product
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_product_stock_row();
+
+-- Приращения остатков по товарам из таблиц переходов elshop_inventory: один
+-- upsert на оператор, сколько бы строк складов он ни изменил. Если изменился
+-- свободный остаток, у товара обновляется updated_at (ETag API и страницы).
+CREATE OR REPLACE FUNCTION ElShop_fn_inventory_stock()
+RETURNS TRIGGER AS $$
+DECLARE
+  delta TEXT;
+  touched INT[];
+BEGIN
+  delta := CASE TG_OP
+    WHEN 'INSERT' THEN 'SELECT product_id, quantity::bigint, reserved::bigint FROM new_rows'
+    WHEN 'DELETE' THEN 'SELECT product_id, -quantity::bigint, -reserved::bigint FROM old_rows'
+    ELSE 'SELECT product_id, quantity::bigint, reserved::bigint FROM new_rows '
+         'UNION ALL SELECT product_id, -quantity::bigint, -reserved::bigint FROM old_rows'
+  END;
+  EXECUTE format($f$
+    WITH delta AS (
+      SELECT product_id, SUM(dq) AS dq, SUM(dr) AS dr
+      FROM (%s) d(product_id, dq, dr)
+      GROUP BY product_id
+      HAVING SUM(dq) <> 0 OR SUM(dr) <> 0
+    ), stock AS (
+      INSERT INTO elshop_product_stock AS s (product_id, quantity, reserved)
+      SELECT product_id, dq, dr FROM delta
+      ON CONFLICT (product_id) DO UPDATE
+        SET quantity = s.quantity + EXCLUDED.quantity, reserved = s.reserved + EXCLUDED.reserved
+    )
+    SELECT array_agg(product_id) FILTER (WHERE dq <> dr) FROM delta
+  $f$, delta) INTO touched;
+  -- Отдельным оператором по массиву id: у таблиц переходов нет статистики,
+  -- и соединение с ними в UPDATE планировщик строит вложенным циклом
+  IF touched IS NOT NULL THEN
+    UPDATE elshop_product SET updated_at = clock_timestamp() WHERE id = ANY(touched);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_inventory_stock_ins ON elshop_inventory;
+DROP TRIGGER IF EXISTS trg_inventory_stock_upd ON elshop_inventory;
+DROP TRIGGER IF EXISTS trg_inventory_stock_del ON elshop_inventory;
+CREATE TRIGGER trg_inventory_stock_ins AFTER INSERT ON elshop_inventory
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_inventory_stock();
+CREATE TRIGGER trg_inventory_stock_upd AFTER UPDATE ON elshop_inventory
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_inventory_stock();
+CREATE TRIGGER trg_inventory_stock_del AFTER DELETE ON elshop_inventory
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION ElShop_fn_inventory_stock();
+
+INSERT INTO elshop_product_stock AS s (product_id, quantity, reserved)
+SELECT p.id, COALESCE(SUM(i.quantity), 0), COALESCE(SUM(i.reserved), 0)
+FROM elshop_product p LEFT JOIN elshop_inventory i ON i.product_id = p.id
+GROUP BY p.id
+ON CONFLICT (product_id) DO UPDATE SET quantity = EXCLUDED.quantity, reserved = EXCLUDED.reserved;
+"""
+
+REVERSE_SQL = r"""
+DROP TRIGGER IF EXISTS trg_product_stock_row ON elshop_product;
+DROP TRIGGER IF EXISTS trg_inventory_stock_ins ON elshop_inventory;
+DROP TRIGGER IF EXISTS trg_inventory_stock_upd ON elshop_inventory;
+DROP TRIGGER IF EXISTS trg_inventory_stock_del ON elshop_inventory;
+DROP FUNCTION IF EXISTS ElShop_fn_inventory_stock();
+DROP FUNCTION IF EXISTS ElShop_fn_product_stock_row();
+"""
+
+# Представление и пополнение складов из 0002: представление читает готовые
+# суммы, пополнение — один оператор вместо цикла, т.е. один пересчёт остатков
+RESTOCK_SQL = r"""
+CREATE OR REPLACE VIEW ElShop_vw_product_inventory AS
+SELECT p.id AS product_id, p.sku, p.name, s.quantity AS total_quantity, s.reserved AS total_reserved
+FROM ElShop_product p
+JOIN elshop_product_stock s ON s.product_id = p.id;
+
+CREATE OR REPLACE FUNCTION ElShop_sp_bulk_restock(items ElShop_restock_item[])
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO ElShop_inventory(product_id, warehouse_id, quantity, reserved, last_restocked)
+  SELECT it.product_id, it.warehouse_id, SUM(GREATEST(it.qty, 0)), 0, now()
+  FROM unnest(items) AS it
+  GROUP BY it.product_id, it.warehouse_id
+  ON CONFLICT (product_id, warehouse_id)
+  DO UPDATE SET quantity = ElShop_inventory.quantity + EXCLUDED.quantity,
+                last_restocked = now();
+END;
+$$;
+"""
+
+RESTOCK_REVERSE_SQL = r"""
+CREATE OR REPLACE VIEW ElShop_vw_product_inventory AS
+SELECT
+  p.id AS product_id,
+  p.sku,
+  p.name,
+  COALESCE(SUM(i.quantity),0) AS total_quantity,
+  COALESCE(SUM(i.reserved),0) AS total_reserved
+FROM ElShop_product p
+LEFT JOIN ElShop_inventory i ON p.id = i.product_id
+GROUP BY p.id, p.sku, p.name;
+
+CREATE OR REPLACE FUNCTION ElShop_sp_bulk_restock(items ElShop_restock_item[])
+RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+  it ElShop_restock_item;
+BEGIN
+  FOREACH it IN ARRAY items LOOP
+    INSERT INTO ElShop_inventory(product_id, warehouse_id, quantity, last_restocked)
+    VALUES (it.product_id, it.warehouse_id, GREATEST(it.qty,0), now())
+    ON CONFLICT (product_id, warehouse_id)
+    DO UPDATE SET quantity = ElShop_inventory.quantity + GREATEST(it.qty,0),
+                  last_restocked = now();
+  END LOOP;
+END;
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0020_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock', serialize=False, to='ElShop.product')),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('reserved', models.BigIntegerField(default=0)),
+                ('available', models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('quantity'), '-', models.F('reserved')), output_field=models.BigIntegerField())),
+            ],
+            options={
+                'db_table': 'elshop_product_stock',
+                'indexes': [models.Index(condition=models.Q(('available__gt', 0)), fields=['product'], name='product_stock_in_stock_idx')],
+            },
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+        migrations.RunSQL(RESTOCK_SQL, RESTOCK_REVERSE_SQL),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Резерв неоплаченного заказа держится p_ttl и снимается ElShop_sp_expire_reservations
+# (команда expire_reservations); оплата делает его бессрочным
+SQL = r"""
+CREATE OR REPLACE FUNCTION ElShop_sp_confirm_reservations(p_order_id BIGINT)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+  v_rows INT;
+  v_items JSONB;
+BEGIN
+  UPDATE ElShop_stock_reservation SET expires_at = NULL
+  WHERE order_id = p_order_id AND status = 'active';
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows > 0 THEN
+    RETURN v_rows;
+  END IF;
+
+  -- Удержание истекло до оплаты: резервируем строки заказа заново. Заказы,
+  -- которые товар не удерживали вовсе, резерв не получают, как и раньше
+  IF NOT EXISTS (
+    SELECT 1 FROM ElShop_stock_reservation
+    WHERE order_id = p_order_id AND status = 'released' AND expires_at IS NOT NULL
+  ) THEN
+    RETURN 0;
+  END IF;
+
+  SELECT jsonb_agg(jsonb_build_object('product_id', product_id, 'quantity', quantity))
+    INTO v_items
+  FROM ElShop_order_item
+  WHERE order_id = p_order_id;
+  IF v_items IS NOT NULL THEN
+    PERFORM ElShop_sp_reserve_stock(p_order_id, v_items, NULL);
+  END IF;
+  RETURN 0;
+END;
+$$;
+"""
+
+REVERSE_SQL = r"""
+DROP FUNCTION IF EXISTS ElShop_sp_confirm_reservations(BIGINT);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0021_product_stock'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
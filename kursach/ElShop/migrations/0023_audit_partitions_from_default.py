@@ -0,0 +1,61 @@
+from importlib import import_module
+from django.db import migrations
+
+# Партиция месяца, строки которого уже попали в DEFAULT (prune_audit_log давно не
+# запускали), не создаётся через PARTITION OF: PostgreSQL отказывает, так как
+# DEFAULT нарушила бы новое ограничение. Тогда таблица месяца создаётся отдельно,
+# строки переносятся в неё из DEFAULT и она подключается ATTACH PARTITION.
+SQL = r"""
+CREATE OR REPLACE FUNCTION ElShop_sp_audit_ensure_partitions(p_from DATE, p_to DATE)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+  m DATE := date_trunc('month', p_from)::date;
+  v_name TEXT;
+  v_start TIMESTAMPTZ;
+  v_end TIMESTAMPTZ;
+  v_created INT := 0;
+BEGIN
+  WHILE m <= p_to LOOP
+    v_name := format('elshop_audit_log_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'));
+    v_start := m::timestamp AT TIME ZONE 'UTC';
+    v_end := (m + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+    IF to_regclass(v_name) IS NULL THEN
+      IF EXISTS (SELECT 1 FROM elshop_audit_log_default WHERE changed_at >= v_start AND changed_at < v_end) THEN
+        EXECUTE format('CREATE TABLE %I (LIKE elshop_audit_log INCLUDING DEFAULTS)', v_name);
+        EXECUTE format(
+          'WITH moved AS (DELETE FROM elshop_audit_log_default WHERE changed_at >= %L AND changed_at < %L RETURNING *) '
+          'INSERT INTO %I SELECT * FROM moved',
+          v_start, v_end, v_name
+        );
+        EXECUTE format(
+          'ALTER TABLE elshop_audit_log ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+          v_name, v_start, v_end
+        );
+      ELSE
+        EXECUTE format(
+          'CREATE TABLE %I PARTITION OF elshop_audit_log FOR VALUES FROM (%L) TO (%L)',
+          v_name, v_start, v_end
+        );
+      END IF;
+      v_created := v_created + 1;
+    END IF;
+    m := (m + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN v_created;
+END;
+$$;
+"""
+
+_PARTITIONED = import_module('ElShop.migrations.0015_partitioned_audit_log').SQL
+REVERSE_SQL = _PARTITIONED[:_PARTITIONED.index('-- Удаление месячных партиций')]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0022_confirm_reservations'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# websearch_to_tsquery зависит от словарей и настроек конфигураций, поэтому STABLE:
+# IMMUTABLE позволил бы планировщику вычислить запрос заранее и закэшировать его
+SQL = r"""
+CREATE OR REPLACE FUNCTION ElShop_fn_product_tsquery(p_query TEXT)
+RETURNS TSQUERY LANGUAGE sql STABLE PARALLEL SAFE AS $$
+  SELECT websearch_to_tsquery('russian'::regconfig, p_query)
+      || websearch_to_tsquery('english'::regconfig, p_query)
+      || websearch_to_tsquery('simple'::regconfig, p_query)
+$$;
+"""
+
+REVERSE_SQL = r"""
+ALTER FUNCTION ElShop_fn_product_tsquery(TEXT) IMMUTABLE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0023_audit_partitions_from_default'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
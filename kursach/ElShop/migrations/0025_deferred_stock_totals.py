@@ -0,0 +1,117 @@
+import django.db.models.functions.datetime
+from importlib import import_module
+from django.db import migrations, models
+
+_PRODUCT_STOCK = import_module('ElShop.migrations.0021_product_stock').SQL
+_INVENTORY_STOCK = _PRODUCT_STOCK[
+    _PRODUCT_STOCK.index('CREATE OR REPLACE FUNCTION ElShop_fn_inventory_stock'):
+    _PRODUCT_STOCK.index('DROP TRIGGER IF EXISTS trg_inventory_stock_ins')
+]
+
+# Суммы остатков применяются при COMMIT, а не в операторе, изменившем склады:
+# триггер elshop_inventory только дописывает приращения в очередь транзакции
+# (вставки не конфликтуют между собой), а отложенный триггер очереди одним
+# upsert переносит их в elshop_product_stock. Строка остатка «горячего» товара
+# блокируется на время фиксации, а не всего оформления заказа, и строка товара
+# (updated_at, аудит) не трогается вовсе: ETag по остатку — elshop_product_stock.updated_at.
+SQL = r"""
+-- Очередь живёт внутри транзакции (строки удаляются при её же фиксации),
+-- поэтому журнал ей не нужен
+CREATE UNLOGGED TABLE IF NOT EXISTS elshop_product_stock_delta (
+  xact_id XID8 NOT NULL DEFAULT pg_current_xact_id(),
+  product_id BIGINT NOT NULL,
+  dq BIGINT NOT NULL,
+  dr BIGINT NOT NULL,
+  flush BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE INDEX IF NOT EXISTS elshop_product_stock_delta_xact_idx ON elshop_product_stock_delta (xact_id);
+
+-- Приращения по товарам из таблиц переходов: одна вставка на оператор. Первая
+-- строка транзакции помечается flush — по ней сработает отложенный триггер;
+-- признак в настройке транзакции откатывается вместе с точкой сохранения.
+CREATE OR REPLACE FUNCTION ElShop_fn_inventory_stock()
+RETURNS TRIGGER AS $$
+DECLARE
+  delta TEXT;
+  first BOOLEAN := current_setting('elshop.stock_delta_pending', true) IS DISTINCT FROM 'on';
+  queued INT;
+BEGIN
+  delta := CASE TG_OP
+    WHEN 'INSERT' THEN 'SELECT product_id, quantity::bigint, reserved::bigint FROM new_rows'
+    WHEN 'DELETE' THEN 'SELECT product_id, -quantity::bigint, -reserved::bigint FROM old_rows'
+    ELSE 'SELECT product_id, quantity::bigint, reserved::bigint FROM new_rows '
+         'UNION ALL SELECT product_id, -quantity::bigint, -reserved::bigint FROM old_rows'
+  END;
+  EXECUTE format($f$
+    INSERT INTO elshop_product_stock_delta (product_id, dq, dr, flush)
+    SELECT product_id, SUM(dq), SUM(dr), $1 AND row_number() OVER () = 1
+    FROM (%s) d(product_id, dq, dr)
+    GROUP BY product_id
+    HAVING SUM(dq) <> 0 OR SUM(dr) <> 0
+  $f$, delta) USING first;
+  GET DIAGNOSTICS queued = ROW_COUNT;
+  IF first AND queued > 0 THEN
+    PERFORM set_config('elshop.stock_delta_pending', 'on', true);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перенос очереди транзакции в суммы: товары по возрастанию id (без взаимных
+-- блокировок), updated_at — только если изменился свободный остаток. Строки
+-- удалённых в той же транзакции товаров пропускаются.
+CREATE OR REPLACE FUNCTION ElShop_fn_apply_stock_deltas()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_xact XID8 := pg_current_xact_id();
+BEGIN
+  WITH queued AS (
+    DELETE FROM elshop_product_stock_delta WHERE xact_id = v_xact
+    RETURNING product_id, dq, dr
+  ), delta AS (
+    SELECT product_id, SUM(dq) AS dq, SUM(dr) AS dr
+    FROM queued
+    GROUP BY product_id
+    HAVING SUM(dq) <> 0 OR SUM(dr) <> 0
+  )
+  INSERT INTO elshop_product_stock AS s (product_id, quantity, reserved)
+  SELECT d.product_id, d.dq, d.dr FROM delta d
+  WHERE EXISTS (SELECT 1 FROM elshop_product p WHERE p.id = d.product_id)
+  ORDER BY d.product_id
+  ON CONFLICT (product_id) DO UPDATE
+    SET quantity = s.quantity + EXCLUDED.quantity,
+        reserved = s.reserved + EXCLUDED.reserved,
+        updated_at = CASE WHEN EXCLUDED.quantity <> EXCLUDED.reserved
+                          THEN GREATEST(clock_timestamp(), s.updated_at + interval '1 microsecond')
+                          ELSE s.updated_at END;
+  PERFORM set_config('elshop.stock_delta_pending', '', true);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_stock_delta_apply ON elshop_product_stock_delta;
+CREATE CONSTRAINT TRIGGER trg_stock_delta_apply AFTER INSERT ON elshop_product_stock_delta
+  DEFERRABLE INITIALLY DEFERRED
+  FOR EACH ROW WHEN (NEW.flush) EXECUTE FUNCTION ElShop_fn_apply_stock_deltas();
+"""
+
+REVERSE_SQL = r"""
+DROP TABLE IF EXISTS elshop_product_stock_delta;
+DROP FUNCTION IF EXISTS ElShop_fn_apply_stock_deltas();
+""" + _INVENTORY_STOCK
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ElShop', '0024_product_tsquery_stable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstock',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False),
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import Q, Sum, F
+from django.db.models.functions import Now
 from django.core.exceptions import ValidationError
 
 class Customer(models.Model):
@@ -80,8 +81,13 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     base_price = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Время последнего изменения строки, связей с категориями и поставщиками —
+    # ставит триггер БД при любой записи (миграция 0020), для ETag/Last-Modified
+    updated_at = models.DateTimeField(db_default=Now(), editable=False)
     active = models.BooleanField(default=True)
     image = models.ImageField(upload_to="products/", blank=True, null=True)
+    # Уменьшенные копии изображения (ElShop/images.py); NULL — ещё не построены
+    image_renditions = models.JSONField(blank=True, null=True, editable=False)
     categories = models.ManyToManyField(Category, related_name="products", blank=True)
     suppliers = models.ManyToManyField(Supplier, through="ProductSupplier", related_name="products")
 
@@ -137,6 +143,31 @@ class Inventory(models.Model):
         db_table = "elshop_inventory"
 
 
+class ProductStock(models.Model):
+    """
+    Остаток товара по всем складам — суммы Inventory.quantity и reserved.
+    Строка есть у каждого товара; её ведут триггеры БД (миграции 0021, 0025)
+    приращениями при любом изменении Inventory, в т.ч. ElShop_sp_bulk_restock
+    и резервированием при оформлении заказа. Приращения применяются при COMMIT
+    изменившей склады транзакции (inventory.apply_stock_deltas — раньше).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="stock")
+    quantity = models.BigIntegerField(default=0)
+    reserved = models.BigIntegerField(default=0)
+    available = models.GeneratedField(
+        expression=F("quantity") - F("reserved"), output_field=models.BigIntegerField(), db_persist=True,
+    )
+    # Время последнего изменения свободного остатка — ETag товара (conditional.py)
+    updated_at = models.DateTimeField(db_default=Now(), editable=False)
+
+    class Meta:
+        db_table = "elshop_product_stock"
+        indexes = [
+            # Фильтр «только в наличии»: товары со свободным остатком
+            models.Index(fields=["product"], condition=Q(available__gt=0), name="product_stock_in_stock_idx"),
+        ]
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("draft", "Draft"),
@@ -156,9 +187,58 @@ class Order(models.Model):
     tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     shipping_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Как Product.updated_at: заказ или его строки (триггер БД, миграция 0020)
+    updated_at = models.DateTimeField(db_default=Now(), editable=False)
 
     class Meta:
         db_table = "elshop_order"
+        indexes = [
+            # История заказов покупателя: keyset-пагинация по (created_at, id)
+            models.Index(fields=["customer", "-created_at", "-id"], name="order_customer_created_idx"),
+        ]
+
+
+class StockReservation(models.Model):
+    """Резерв товара на складе под заказ (см. ElShop/inventory.py)"""
+    STATUS_CHOICES = [
+        ("active", "Active"),
+        ("released", "Released"),
+        ("fulfilled", "Fulfilled"),
+    ]
+
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, null=True, blank=True, related_name="reservations")
+    product = models.ForeignKey(Product, on_delete=models.RESTRICT)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.RESTRICT)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Срок удержания для неоплаченного заказа; у оплаченного — NULL (бессрочно)
+    expires_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "elshop_stock_reservation"
+        indexes = [
+            models.Index(
+                fields=["expires_at"],
+                condition=Q(status="active", expires_at__isnull=False),
+                name="stock_resv_active_expiry_idx",
+            ),
+        ]
+
+
+class CartLine(models.Model):
+    """Строка корзины покупателя для хранилища корзины "db" (см. ElShop/carts.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cart_lines")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "elshop_cart_line"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "product"], name="uniq_cart_line_user_product"),
+        ]
 
 
 class OrderItem(models.Model):
@@ -194,6 +274,7 @@ class Payment(models.Model):
 
 
 class AuditLog(models.Model):
+    """Журнал аудита; в БД секционирован по месяцам changed_at (миграция 0015, команда prune_audit_log)"""
     table_name = models.CharField(max_length=100)
     operation = models.CharField(max_length=10)
     row_data = models.JSONField(blank=True, null=True)
@@ -203,6 +284,31 @@ class AuditLog(models.Model):
     class Meta:
         db_table = "elshop_audit_log"
 
+class SalesRollup(models.Model):
+    """Продажи за день по товару (только заказы в статусах paid/shipped/completed)"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sales_rollups")
+    lines = models.IntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = "elshop_sales_rollup"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="uniq_sales_rollup_day_product"),
+        ]
+
+
+class DailyRevenueRollup(models.Model):
+    """Выручка и количество оплаченных заказов за день"""
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = "elshop_daily_revenue_rollup"
+
+
 class UserSettings(models.Model):
     THEME_CHOICES = [
         ("light", "Светлая"),
@@ -0,0 +1,43 @@
+import base64
+import binascii
+from datetime import datetime
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация по первичному ключу: WHERE id < последний_id
+    ORDER BY id DESC LIMIT n. Глубокие страницы стоят столько же, сколько первая.
+    """
+    ordering = "-id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Результаты поиска упорядочены по релевантности, а не по id,
+    поэтому для них курсор не подходит — обычные номера страниц.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+def encode_cursor(created_at, pk):
+    """Курсор keyset-пагинации по (created_at, id) для HTML-страниц"""
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    """(created_at, id) или None, если курсор пустой или испорчен"""
+    if not value:
+        return None
+    try:
+        created_at, pk = base64.urlsafe_b64decode(value.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
@@ -0,0 +1,253 @@
+"""
+Предагрегированные продажи для страницы аналитики.
+
+SalesRollup хранит продажи за день по товару, DailyRevenueRollup — выручку
+заказов за день. Таблицы обновляются приращениями из сигналов (signals.py),
+когда заказ переходит в статус paid/shipped/completed или выходит из него,
+а также при изменении строк и суммы уже оплаченного заказа. Массовые
+операции в обход сигналов (QuerySet.update, bulk_create) пересчитываются
+командой refresh_sales_rollup; строки заказа из API (OrderSerializer) вносятся
+одним запросом apply_lines.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection, transaction
+from django.db.models import Sum, Count, IntegerField, DecimalField, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, SalesRollup, DailyRevenueRollup
+
+COUNTED_STATUSES = ('paid', 'shipped', 'completed')
+
+_UPSERT_REVENUE = f"""
+    INSERT INTO {DailyRevenueRollup._meta.db_table} (day, orders, revenue)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (day) DO UPDATE SET
+        orders = {DailyRevenueRollup._meta.db_table}.orders + EXCLUDED.orders,
+        revenue = {DailyRevenueRollup._meta.db_table}.revenue + EXCLUDED.revenue
+"""
+
+_UPSERT_LINE = f"""
+    INSERT INTO {SalesRollup._meta.db_table} (day, product_id, lines, quantity, revenue)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        lines = {SalesRollup._meta.db_table}.lines + EXCLUDED.lines,
+        quantity = {SalesRollup._meta.db_table}.quantity + EXCLUDED.quantity,
+        revenue = {SalesRollup._meta.db_table}.revenue + EXCLUDED.revenue
+"""
+
+_UPSERT_ORDER_LINES = f"""
+    INSERT INTO {SalesRollup._meta.db_table} (day, product_id, lines, quantity, revenue)
+    SELECT %s, product_id, %s * COUNT(*), %s * SUM(quantity), %s * SUM(line_total)
+    FROM {OrderItem._meta.db_table}
+    WHERE order_id = %s
+    GROUP BY product_id
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        lines = {SalesRollup._meta.db_table}.lines + EXCLUDED.lines,
+        quantity = {SalesRollup._meta.db_table}.quantity + EXCLUDED.quantity,
+        revenue = {SalesRollup._meta.db_table}.revenue + EXCLUDED.revenue
+"""
+
+_UPSERT_LINES = f"""
+    INSERT INTO {SalesRollup._meta.db_table} (day, product_id, lines, quantity, revenue)
+    SELECT %s, product_id, SUM(lines), SUM(quantity), SUM(revenue)
+    FROM unnest(%s::int[], %s::int[], %s::int[], %s::numeric[]) AS t(product_id, lines, quantity, revenue)
+    GROUP BY product_id
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        lines = {SalesRollup._meta.db_table}.lines + EXCLUDED.lines,
+        quantity = {SalesRollup._meta.db_table}.quantity + EXCLUDED.quantity,
+        revenue = {SalesRollup._meta.db_table}.revenue + EXCLUDED.revenue
+"""
+
+_UPSERT_ORDER_RANGE = f"""
+    WITH counted AS (
+        SELECT id, total, (created_at AT TIME ZONE %(tz)s)::date AS day
+        FROM {Order._meta.db_table}
+        WHERE id >= %(first_id)s AND status IN %(statuses)s
+    ), revenue AS (
+        INSERT INTO {DailyRevenueRollup._meta.db_table} (day, orders, revenue)
+        SELECT day, COUNT(*), SUM(total) FROM counted GROUP BY day
+        ON CONFLICT (day) DO UPDATE SET
+            orders = {DailyRevenueRollup._meta.db_table}.orders + EXCLUDED.orders,
+            revenue = {DailyRevenueRollup._meta.db_table}.revenue + EXCLUDED.revenue
+    )
+    INSERT INTO {SalesRollup._meta.db_table} (day, product_id, lines, quantity, revenue)
+    SELECT c.day, i.product_id, COUNT(*), SUM(i.quantity), SUM(i.line_total)
+    FROM counted c JOIN {OrderItem._meta.db_table} i ON i.order_id = c.id
+    GROUP BY c.day, i.product_id
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        lines = {SalesRollup._meta.db_table}.lines + EXCLUDED.lines,
+        quantity = {SalesRollup._meta.db_table}.quantity + EXCLUDED.quantity,
+        revenue = {SalesRollup._meta.db_table}.revenue + EXCLUDED.revenue
+"""
+
+
+def rollup_day(created_at):
+    """День заказа в текущем часовом поясе — так же, как TruncDate('created_at')."""
+    return timezone.localtime(created_at).date() if timezone.is_aware(created_at) else created_at.date()
+
+
+def to_money(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def apply_revenue(day, orders, revenue):
+    """Приращение количества заказов и выручки за день."""
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_REVENUE, [day, orders, to_money(revenue)])
+
+
+def apply_order(day, order_id, total, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) вклад заказа и всех его строк."""
+    apply_revenue(day, sign, sign * to_money(total))
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_ORDER_LINES, [day, sign, sign, sign, order_id])
+
+
+def apply_line(day, product_id, quantity, line_total, sign=1):
+    """Добавляет или вычитает одну строку заказа."""
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_LINE, [day, product_id, sign, sign * quantity, sign * to_money(line_total)])
+
+
+def apply_lines(day, lines):
+    """
+    Добавляет и вычитает набор строк [(product_id, quantity, line_total, sign), ...]
+    одним запросом — для массовой записи строк заказа в обход сигналов.
+    """
+    lines = list(lines)
+    if not lines:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_LINES, [
+            day,
+            [product_id for product_id, _, _, _ in lines],
+            [sign for _, _, _, sign in lines],
+            [sign * quantity for _, quantity, _, sign in lines],
+            [sign * to_money(line_total) for _, _, line_total, sign in lines],
+        ])
+
+
+def apply_new_orders(first_id):
+    """
+    Добавляет вклад всех заказов с id >= first_id одним запросом — для
+    массовой загрузки в обход сигналов (генератор данных). Возвращает число
+    строк по товарам.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_UPSERT_ORDER_RANGE, {
+            "tz": timezone.get_current_timezone_name(),
+            "first_id": first_id,
+            "statuses": COUNTED_STATUSES,
+        })
+        return cursor.rowcount
+
+
+def counted_order_day(order_id):
+    """День заказа, если он учитывается в продажах, иначе None."""
+    created_at = (
+        Order.objects.filter(pk=order_id, status__in=COUNTED_STATUSES)
+        .values_list('created_at', flat=True).first()
+    )
+    return rollup_day(created_at) if created_at else None
+
+
+@transaction.atomic
+def rebuild_rollups(start_date=None, end_date=None):
+    """Полный пересчёт агрегатов за период (или за всё время). Возвращает число строк."""
+    orders = Order.objects.filter(status__in=COUNTED_STATUSES)
+    if start_date:
+        orders = orders.filter(created_at__date__gte=start_date)
+    if end_date:
+        orders = orders.filter(created_at__date__lte=end_date)
+
+    stale_sales = SalesRollup.objects.all()
+    stale_revenue = DailyRevenueRollup.objects.all()
+    if start_date:
+        stale_sales = stale_sales.filter(day__gte=start_date)
+        stale_revenue = stale_revenue.filter(day__gte=start_date)
+    if end_date:
+        stale_sales = stale_sales.filter(day__lte=end_date)
+        stale_revenue = stale_revenue.filter(day__lte=end_date)
+    stale_sales.delete()
+    stale_revenue.delete()
+
+    revenue = (
+        orders
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(n=Count('id'), total_sum=Sum('total'))
+    )
+    DailyRevenueRollup.objects.bulk_create(
+        [DailyRevenueRollup(day=r['day'], orders=r['n'], revenue=r['total_sum']) for r in revenue],
+        batch_size=1000,
+    )
+
+    sales = (
+        OrderItem.objects
+        .filter(order__in=orders)
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product_id')
+        .annotate(n=Count('id'), qty=Sum('quantity'), revenue_sum=Sum('line_total'))
+    )
+    created = SalesRollup.objects.bulk_create(
+        [
+            SalesRollup(day=r['day'], product_id=r['product_id'], lines=r['n'],
+                        quantity=r['qty'], revenue=r['revenue_sum'])
+            for r in sales.iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+    )
+    return len(created)
+
+
+def category_sales():
+    """Продажи по категориям (шт.) за всё время."""
+    return (
+        SalesRollup.objects
+        .filter(lines__gt=0)
+        .values('product__categories__name')
+        .annotate(
+            total_sold=Coalesce(
+                Sum('quantity', output_field=IntegerField()),
+                Value(0, output_field=IntegerField()),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by('-total_sold')
+    )
+
+
+def daily_revenue(start_date, end_date):
+    """Доход по дням в периоде."""
+    return (
+        DailyRevenueRollup.objects
+        .filter(day__gte=start_date, day__lte=end_date, orders__gt=0)
+        .values('day')
+        .annotate(
+            total=Coalesce(
+                Sum('revenue', output_field=DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+        .order_by('day')
+    )
+
+
+def top_products(limit=5):
+    """Топ товаров по количеству проданных единиц."""
+    return (
+        SalesRollup.objects
+        .filter(lines__gt=0)
+        .values('product__name')
+        .annotate(
+            total_sold=Coalesce(
+                Sum('quantity', output_field=IntegerField()),
+                Value(0, output_field=IntegerField()),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by('-total_sold')[:limit]
+    )
@@ -0,0 +1,31 @@
+"""
+Полнотекстовый поиск по товарам.
+
+elshop_product.search_vector — генерируемый столбец с GIN-индексом (миграция 0016):
+артикул, название и описание в русской и английской конфигурациях. Столбец
+поддерживает сама БД, поэтому он актуален после любых записей, включая импорт.
+Поиск — обычный фильтр ORM и сочетается с фильтрами каталога и API.
+"""
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+MAX_QUERY_LENGTH = 200
+
+
+def normalize_query(value):
+    """Строка поиска без лишних пробелов; пустая строка — поиска нет"""
+    return " ".join((value or "").split())[:MAX_QUERY_LENGTH]
+
+
+def search_products(queryset, query):
+    """Товары, подходящие под запрос, по убыванию релевантности (search_rank)"""
+    table = queryset.model._meta.db_table
+    match = RawSQL(
+        f"{table}.search_vector @@ ElShop_fn_product_tsquery(%s)", [query],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank_cd({table}.search_vector, ElShop_fn_product_tsquery(%s))", [query],
+        output_field=FloatField(),
+    )
+    return queryset.filter(match).annotate(search_rank=rank).order_by("-search_rank", "id")
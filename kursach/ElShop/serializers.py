@@ -1,19 +1,74 @@
+import copy
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, models, transaction
+from django.db.models.fields.files import FieldFile
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from . import inventory, rollups
 from .models import Customer, Product, Order, OrderItem, Payment
 
-class CustomerSerializer(serializers.ModelSerializer):
+
+def get_requested_fields(request):
+    """Множество полей из ?fields=a,b,c или None, если параметр не задан."""
+    if request is None or request.method != "GET":
+        return None
+    raw = request.query_params.get("fields", "")
+    fields = {name.strip() for name in raw.split(",") if name.strip()}
+    return fields or None
+
+
+class SparseFieldsetMixin:
+    """Оставляет в ответе только поля, перечисленные в ?fields=..."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get("request"))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = "__all__"
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Свободный остаток по всем складам из elshop_product_stock (ведут триггеры
+    # миграции 0021); null — строки остатков ещё нет
+    available_quantity = serializers.IntegerField(source="stock.available", read_only=True, allow_null=True)
+
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("image_renditions",)  # служебные пути копий, для API достаточно image
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который берёт объекты из preloaded, если список их уже загрузил"""
+    preloaded = None
+
+    def to_internal_value(self, data):
+        if self.preloaded is not None and _is_pk(data) and int(data) in self.preloaded:
+            return self.preloaded[int(data)]
+        return super().to_internal_value(data)  # нет в preloaded — прежний запрос и прежняя ошибка
+
 
+def _is_pk(value):
+    return type(value) is int or isinstance(value, str) and value.isdigit()
 
-class OrderItemSerializer(serializers.ModelSerializer):
+
+def _field_value(obj, name=None):
+    """Значение поля для сравнения; связь — по id, без запроса связанного объекта"""
+    if name is not None:
+        obj = getattr(obj, obj._meta.get_field(name).attname)
+    return obj.pk if isinstance(obj, models.Model) else obj
+
+
+class OrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
@@ -21,40 +76,297 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+class OrderItemListSerializer(serializers.ListSerializer):
+    """Строки заказа: товары всех строк проверяются одним запросом, а не запросом на строку"""
+
+    def to_internal_value(self, data):
+        product = self.child.fields["product"]
+        if isinstance(data, list):
+            ids = {int(row["product"]) for row in data if isinstance(row, dict) and _is_pk(row.get("product"))}
+            product.preloaded = product.get_queryset().in_bulk(ids)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            product.preloaded = None
+
+
+class NestedOrderItemSerializer(OrderItemSerializer):
+    """Строка внутри заказа: заказ задаёт родитель, id — ключ существующей строки при обновлении"""
+    id = serializers.IntegerField(required=False)
+    product = PreloadedPrimaryKeyRelatedField(queryset=Product.objects.all())
+
+    class Meta(OrderItemSerializer.Meta):
+        read_only_fields = ("order",)
+        list_serializer_class = OrderItemListSerializer
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Заказ со строками. Строки пишутся пакетно и числом запросов, не зависящим
+    от их количества: новые — одним bulk_create, изменённые — одним bulk_update,
+    убранные из items — одним DELETE. Сигналы строк при этом не срабатывают,
+    поэтому агрегаты продаж обновляются одним rollups.apply_lines.
+    """
+    items = NestedOrderItemSerializer(many=True, required=False)
 
     class Meta:
         model = Order
         fields = "__all__"
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop("items", [])
         order = Order.objects.create(**validated_data)
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        self.write_items(order, items_data)
+        self.hold_stock(order)
         return order
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop("items", None)
 
-        # Обновляем поля заказа
+        # Обновляем поля заказа; оплата резервирует товар (signals.py)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        try:
+            instance.save()
+        except inventory.OutOfStock as e:
+            raise serializers.ValidationError({"status": [str(e)]})
 
-        # Обновляем или создаём OrderItem
+        # Строки без id — новые, с id — изменяем, не попавшие в items — удаляем
         if items_data is not None:
-            instance.items.all().delete()  # простой вариант: удаляем старые
-            for item_data in items_data:
-                OrderItem.objects.create(order=instance, **item_data)
+            self.write_items(instance, items_data, existing={item.pk: item for item in instance.items.all()})
+            self.hold_stock(instance)
 
         return instance
 
+    def hold_stock(self, order):
+        """Черновик удерживает товар на срок (inventory.hold); оплата сделает резерв бессрочным"""
+        if order.status != "draft":
+            return
+        try:
+            inventory.hold(order.pk, order.items.values_list("product_id", "quantity"))
+        except inventory.OutOfStock as e:
+            raise serializers.ValidationError({"items": [str(e)]})
+
+    def write_items(self, order, items_data, existing=None):
+        existing = existing or {}
+        created, changed, seen, fields = [], [], set(), set()
+        rollup = []  # (product_id, quantity, line_total, знак) для агрегатов продаж
+        for data in items_data:
+            pk = data.pop("id", None)
+            if pk is None:
+                created.append(OrderItem(order=order, **data))
+                continue
+            item = existing.get(pk)
+            if item is None or pk in seen:
+                raise serializers.ValidationError({"items": [f"Строка {pk} не принадлежит заказу или повторяется"]})
+            seen.add(pk)
+            diff = {name for name, value in data.items() if _field_value(item, name) != _field_value(value)}
+            if diff:
+                rollup.append((item.product_id, item.quantity, item.line_total, -1))
+                for name in diff:
+                    setattr(item, name, data[name])
+                rollup.append((item.product_id, item.quantity, item.line_total, 1))
+                changed.append(item)
+                fields |= diff
+        removed = [item for pk, item in existing.items() if pk not in seen]
+
+        if removed:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {OrderItem._meta.db_table} WHERE id = ANY(%s)", [[item.pk for item in removed]],
+                )
+            rollup += [(item.product_id, item.quantity, item.line_total, -1) for item in removed]
+        if changed:
+            OrderItem.objects.bulk_update(changed, sorted(fields))
+        if created:
+            OrderItem.objects.bulk_create(created)
+            rollup += [(item.product_id, item.quantity, item.line_total, 1) for item in created]
+
+        if rollup and order.status in rollups.COUNTED_STATUSES:
+            rollups.apply_lines(rollups.rollup_day(order.created_at), rollup)
 
-class PaymentSerializer(serializers.ModelSerializer):
+
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     order = serializers.PrimaryKeyRelatedField(queryset=Order.objects.all())
 
     class Meta:
         model = Payment
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+
+
+# --------- Быстрое чтение списков ---------
+# Поля, у которых to_representation для значения из БД ничего не меняет
+_PASSTHROUGH = (
+    serializers.IntegerField, serializers.BooleanField, serializers.CharField,
+    serializers.EmailField, serializers.SlugField, serializers.URLField,
+)
+
+
+class ValuesReadPlan:
+    """
+    Сериализация списка без экземпляров моделей: столбцы читаются через
+    values(), связи многие-ко-многим — одним запросом к промежуточной таблице
+    по id страницы, вложенные списки (items заказа) — своим планом. Значения
+    проходят через to_representation тех же полей сериализатора, поэтому JSON
+    совпадает с ModelSerializer байт в байт (порядок связей — по id, как у
+    Prefetch в viewset'ах).
+
+    Поле с source через точку по связи к одной строке (stock.available)
+    читается тем же values() через JOIN; такое поле должно быть allow_null,
+    как и у DRF, который для отсутствующей связи отдаёт null.
+
+    for_serializer() возвращает None, если у сериализатора есть поле, которое
+    так прочитать нельзя (SerializerMethodField, source="*" и т.п.) — тогда
+    список строится обычным сериализатором.
+    """
+
+    def __init__(self, serializer, extra_columns=()):
+        model = serializer.Meta.model
+        self.pk = model._meta.pk.attname
+        self.columns = [self.pk, *extra_columns]
+        self.steps = []      # (имя в ответе, столбец или None для связи, преобразование)
+        self.loaders = {}    # имя в ответе -> функция(ids) -> {id: [значения]}
+        for name, field in serializer.fields.items():
+            self._add(model, name, field)
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        try:
+            return cls(serializer)
+        except (NotImplementedError, FieldDoesNotExist):
+            return None
+
+    def _add(self, model, name, field):
+        if field.write_only:
+            return
+        if isinstance(field, serializers.ListSerializer):
+            self.steps.append((name, None, None))
+            self.loaders[name] = self._nested_loader(model, field)
+            return
+        if isinstance(field, serializers.ManyRelatedField):
+            self.steps.append((name, None, None))
+            self.loaders[name] = self._m2m_loader(model, field)
+            return
+        if field.source == "*" or isinstance(field, (serializers.ModelField, serializers.BaseSerializer)):
+            raise NotImplementedError(name)
+        if "." in field.source:
+            self._add_related(model, name, field)
+            return
+
+        model_field = model._meta.get_field(field.source)
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            if field.pk_field is not None or not model_field.many_to_one and not model_field.one_to_one:
+                raise NotImplementedError(name)
+            convert = None  # DRF отдаёт pk связанной строки, а это и есть значение столбца
+        elif isinstance(field, serializers.FileField):
+            convert = partial(self._file_representation, field, model_field)
+        elif type(field) in _PASSTHROUGH:
+            convert = None
+        elif isinstance(field, serializers.DecimalField) and self._plain_decimal(field):
+            convert = partial(self._decimal_representation, field, -field.decimal_places)
+        elif isinstance(field, serializers.RelatedField) or not model_field.concrete:
+            raise NotImplementedError(name)
+        else:
+            convert = field.to_representation
+        self.columns.append(model_field.attname)
+        self.steps.append((name, model_field.attname, convert))
+
+    def _add_related(self, model, name, field):
+        """Поле связанной строки (relation.column) — столбцом из JOIN, без экземпляров"""
+        relation_name, _, column_name = field.source.partition(".")
+        relation = model._meta.get_field(relation_name)
+        if not field.allow_null or "." in column_name \
+                or not (relation.many_to_one or relation.one_to_one):
+            raise NotImplementedError(name)
+        model_field = relation.related_model._meta.get_field(column_name)
+        if model_field.is_relation or not model_field.concrete or type(field) not in _PASSTHROUGH:
+            raise NotImplementedError(name)
+        column = f"{relation_name}__{model_field.attname}"
+        self.columns.append(column)
+        self.steps.append((name, column, None))
+
+    @staticmethod
+    def _plain_decimal(field):
+        coerce = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+        return coerce and field.decimal_places is not None and not field.localize and not field.normalize_output
+
+    @staticmethod
+    def _decimal_representation(field, exponent, value):
+        # numeric(p, s) приходит из БД уже с s знаками — quantize ничего бы не изменил
+        if isinstance(value, Decimal) and value.as_tuple().exponent == exponent:
+            return f"{value:f}"
+        return field.to_representation(value)
+
+    @staticmethod
+    def _file_representation(field, model_field, name):
+        return field.to_representation(FieldFile(None, model_field, name)) if name else None
+
+    def _m2m_loader(self, model, field):
+        child = field.child_relation
+        model_field = model._meta.get_field(field.source)
+        if not isinstance(child, serializers.PrimaryKeyRelatedField) or child.pk_field is not None \
+                or not model_field.many_to_many or not model_field.concrete:
+            raise NotImplementedError(field.field_name)
+        through = model_field.remote_field.through
+        source = through._meta.get_field(model_field.m2m_field_name()).attname
+        target = through._meta.get_field(model_field.m2m_reverse_field_name()).attname
+
+        def load(ids):
+            grouped = defaultdict(list)
+            rows = through.objects.filter(**{f"{source}__in": ids}).order_by(target).values_list(source, target)
+            for owner, related in rows:
+                grouped[owner].append(related)
+            return grouped
+        return load
+
+    def _nested_loader(self, model, field):
+        relation = model._meta.get_field(field.source)
+        if not relation.one_to_many or not isinstance(field.child, serializers.ModelSerializer):
+            raise NotImplementedError(field.field_name)
+        foreign_key = relation.field.attname
+        plan = ValuesReadPlan(field.child, extra_columns=[foreign_key])
+
+        def load(ids):
+            grouped = defaultdict(list)
+            rows = list(plan.queryset(relation.related_model.objects.filter(**{f"{foreign_key}__in": ids})
+                                      .order_by(plan.pk)))
+            for row, data in zip(rows, plan.serialize(rows)):
+                grouped[row[foreign_key]].append(data)
+            return grouped
+        return load
+
+    def queryset(self, queryset):
+        """Та же выборка и порядок, но строками-словарями и без prefetch"""
+        return queryset.prefetch_related(None).values(*dict.fromkeys(self.columns))
+
+    def _bound_steps(self):
+        """Шаги, где текущий часовой пояс DateTimeField берётся один раз на список, а не на значение"""
+        steps = []
+        for name, column, convert in self.steps:
+            field = getattr(convert, "__self__", None)
+            if isinstance(field, serializers.DateTimeField) and not hasattr(field, "timezone"):
+                field = copy.copy(field)
+                field.timezone = field.default_timezone()
+                convert = field.to_representation
+            steps.append((name, column, convert))
+        return steps
+
+    def serialize(self, rows):
+        """Список словарей в порядке полей сериализатора"""
+        rows = list(rows)
+        ids = [row[self.pk] for row in rows]
+        related = {name: load(ids) for name, load in self.loaders.items()} if ids else {}
+        steps = self._bound_steps()
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in steps:
+                if column is None:
+                    item[name] = related[name].get(row[self.pk], [])
+                    continue
+                value = row[column]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
@@ -1,9 +1,138 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_init, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserSettings
+from django.db import transaction
+from .models import UserSettings, Order, OrderItem, Product, Category
+from . import rollups, catalog_cache, inventory, images
 
 @receiver(post_save, sender=User)
 def create_user_settings(sender, instance, created, **kwargs):
     if created:
         UserSettings.objects.create(user=instance)
+
+
+# --------- Кэш каталога (catalog_cache.py) ---------
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.bump_version()
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def invalidate_catalog_cache_on_categories(sender, action, **kwargs):
+    if action.startswith("post_"):
+        catalog_cache.bump_version()
+
+
+# --------- Копии изображений товара (images.py) ---------
+@receiver(post_save, sender=Product)
+def build_product_image_renditions(sender, instance, **kwargs):
+    if {"image", "image_renditions"} & instance.get_deferred_fields():
+        return  # неполный объект — догонит build_image_renditions
+    if images.needs_renditions(instance):
+        # После COMMIT: файл уже сохранён, а медленный Pillow не держит транзакцию
+        transaction.on_commit(lambda: images.update_product_renditions(instance.pk), robust=True)
+
+
+# --------- Агрегаты продаж (rollups.py) ---------
+def _order_contribution(state):
+    """(день, сумма), если заказ в этом состоянии учитывается в продажах."""
+    status, created_at, total = state
+    if status in rollups.COUNTED_STATUSES and created_at:
+        return rollups.rollup_day(created_at), total
+    return None
+
+
+def _item_order_day(item):
+    order = item._state.fields_cache.get('order')
+    if order is None:
+        return rollups.counted_order_day(item.order_id)
+    contribution = _order_contribution((order.status, order.created_at, order.total))
+    return contribution[0] if contribution else None
+
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    fields = instance.__dict__
+    if 'status' in fields and 'created_at' in fields and 'total' in fields:
+        instance._rollup_state = (fields['status'], fields['created_at'], fields['total'])
+    else:
+        instance._rollup_state = None  # отложенные поля — состояние неизвестно
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup_for_order(sender, instance, created, **kwargs):
+    new_state = (instance.status, instance.created_at, instance.total)
+    if instance._rollup_state is not None:
+        was = _order_contribution(instance._rollup_state)
+        now = _order_contribution(new_state)
+        if was and now and was[0] == now[0]:
+            if rollups.to_money(was[1]) != rollups.to_money(now[1]):
+                rollups.apply_revenue(now[0], 0, rollups.to_money(now[1]) - rollups.to_money(was[1]))
+        else:
+            if was:
+                rollups.apply_order(was[0], instance.pk, was[1], sign=-1)
+            if now:
+                rollups.apply_order(now[0], instance.pk, now[1])
+    instance._rollup_state = new_state
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_sales_rollup(sender, instance, **kwargs):
+    # строки заказа к этому моменту уже удалены каскадом и вычтены своими сигналами
+    now = _order_contribution((instance.status, instance.created_at, instance.total))
+    if now:
+        rollups.apply_revenue(now[0], -1, -rollups.to_money(now[1]))
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_order_item_state(sender, instance, **kwargs):
+    fields = instance.__dict__
+    keys = ('product_id', 'quantity', 'line_total')
+    instance._rollup_state = tuple(fields[k] for k in keys) if all(k in fields for k in keys) else None
+
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_rollup_for_item(sender, instance, created, **kwargs):
+    new_state = (instance.product_id, instance.quantity, instance.line_total)
+    old_state, instance._rollup_state = instance._rollup_state, new_state
+    if not created and (old_state is None or old_state == new_state):
+        return
+
+    day = _item_order_day(instance)
+    if day is None:
+        return
+    if not created:
+        rollups.apply_line(day, *old_state, sign=-1)
+    rollups.apply_line(day, *new_state)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_item_from_sales_rollup(sender, instance, **kwargs):
+    day = _item_order_day(instance)
+    if day is not None:
+        rollups.apply_line(day, instance.product_id, instance.quantity, instance.line_total, sign=-1)
+
+
+# --------- Резервы остатков (inventory.py) ---------
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._stock_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def close_stock_reservations(sender, instance, **kwargs):
+    # Функции идемпотентны: затрагивают только активные резервы заказа
+    was, instance._stock_status = instance._stock_status, instance.status
+    if instance.status == "paid" and was != "paid":
+        inventory.confirm(instance.pk)  # удержание черновика становится бессрочным
+    elif instance.status == "cancelled":
+        inventory.release(instance.pk)
+    elif instance.status in ("shipped", "completed"):
+        inventory.fulfil(instance.pk)
+
+
+@receiver(pre_delete, sender=Order)
+def release_stock_on_order_delete(sender, instance, **kwargs):
+    if instance.status not in ("shipped", "completed"):
+        inventory.release(instance.pk)
@@ -0,0 +1,175 @@
+"""
+Телеметрия SQL по отпечаткам запросов (включается настройкой ELSHOP_SQL_TELEMETRY).
+
+SqlTelemetryMiddleware ставит connection.execute_wrapper на время запроса и
+замеряет каждый SQL-запрос. Текст приводится к отпечатку (литералы и списки
+значений заменяются на ?), и по паре (view, отпечаток) копятся число запросов,
+суммарное время и выборка длительностей для p95. Для запросов дольше
+ELSHOP_SQL_TELEMETRY_SLOW_MS сохраняется укороченный стек вызовов из кода проекта.
+
+Раз в ELSHOP_SQL_TELEMETRY_FLUSH_SECONDS накопленное дописывается строками JSON
+в ELSHOP_SQL_TELEMETRY_FILE (каждый процесс — свои строки); команда
+sql_telemetry_top сводит файл и печатает самые дорогие запросы.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+SAMPLE_SIZE = 200
+SLOW_STACKS = 5
+STACK_DEPTH = 8
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Нормализованный текст запроса: одинаковой формы запросы дают одинаковый отпечаток"""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = _VALUES_LIST.sub(r"\1", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint_id(normalized):
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _project_stack():
+    """Последние кадры стека из кода проекта (без Django, библиотек и этого модуля)"""
+    base = str(settings.BASE_DIR)
+    frames = [
+        f"{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}"
+        for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(base) and frame.filename != __file__
+        and "site-packages" not in frame.filename
+    ]
+    return frames[-STACK_DEPTH:]
+
+
+class Collector:
+    """Агрегаты процесса между сбросами в файл"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.started = time.time()
+
+    def record(self, view, sql, duration_ms, stack=None):
+        normalized = fingerprint(sql)
+        key = (view, fingerprint_id(normalized))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    "view": view, "fingerprint": key[1], "sql": normalized,
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "samples": [], "slow": [],
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            # Равномерная выборка длительностей (reservoir sampling) для p95
+            if len(entry["samples"]) < SAMPLE_SIZE:
+                entry["samples"].append(duration_ms)
+            else:
+                slot = random.randrange(entry["count"])
+                if slot < SAMPLE_SIZE:
+                    entry["samples"][slot] = duration_ms
+            if stack is not None and len(entry["slow"]) < SLOW_STACKS:
+                entry["slow"].append({"ms": round(duration_ms, 2), "stack": stack})
+
+    def flush(self, path):
+        with self.lock:
+            entries, self.entries = self.entries, {}
+            started, self.started = self.started, time.time()
+        if not entries:
+            return 0
+        window = {"pid": os.getpid(), "from": started, "to": time.time()}
+        with open(path, "a", encoding="utf-8") as f:
+            for entry in entries.values():
+                entry["total_ms"] = round(entry["total_ms"], 3)
+                entry["samples"] = [round(ms, 3) for ms in entry["samples"]]
+                f.write(json.dumps(dict(entry, **window), ensure_ascii=False) + "\n")
+        return len(entries)
+
+
+collector = Collector()
+
+
+def view_label(request, view_func):
+    """ProductListView, analytics_view, OrderViewSet.list и т. п."""
+    cls = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if cls is None:
+        return getattr(view_func, "__name__", "unknown")
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return f"{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+    return cls.__name__
+
+
+class SqlTelemetryMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "ELSHOP_SQL_TELEMETRY", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "ELSHOP_SQL_TELEMETRY_SLOW_MS", 100)
+        self.flush_seconds = getattr(settings, "ELSHOP_SQL_TELEMETRY_FLUSH_SECONDS", 60)
+        self.path = getattr(settings, "ELSHOP_SQL_TELEMETRY_FILE", settings.BASE_DIR / "sql_telemetry.jsonl")
+        self.last_flush = time.monotonic()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.sql_telemetry_view = view_label(request, view_func)
+
+    def __call__(self, request):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration_ms = (time.perf_counter() - started) * 1000
+                frames = _project_stack() if duration_ms >= self.slow_ms else None
+                view = getattr(request, "sql_telemetry_view", None) or "middleware"
+                collector.record(view, sql, duration_ms, frames)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            response = self.get_response(request)
+            # Потоковые ответы читают БД уже после выхода из view
+            if getattr(response, "streaming", False):
+                response.streaming_content = self._wrap_stream(response.streaming_content, stack.pop_all())
+                return response
+        self.maybe_flush()
+        return response
+
+    def _wrap_stream(self, content, stack):
+        with stack:
+            yield from content
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_seconds:
+            self.last_flush = now
+            collector.flush(self.path)
@@ -0,0 +1,36 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from ElShop import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image(product, name="card", css_class="", lazy=True):
+    """
+    <picture> с WebP и исходным форматом: srcset по всем копиям, sizes по
+    назначению name (images.SIZES), width/height копии name — без сдвига
+    вёрстки. Пока копий нет — исходное изображение, как раньше.
+    """
+    loading = "lazy" if lazy else "eager"
+    entry = images.rendition(product, name)
+    if entry is None:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" loading="{}">', product.image.url, css_class, product.name, loading,
+        )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" loading="{}" decoding="async">'
+        '</picture>',
+        images.srcset(product, "webp"), images.SIZES[name],
+        default_storage.url(entry[images.fallback_ext(entry)]), images.srcset(product), images.SIZES[name],
+        entry["width"], entry["height"], css_class, product.name, loading,
+    )
+
+
+@register.simple_tag
+def product_srcset(product, ext=None):
+    """Только значение srcset: {% product_srcset product "webp" %}"""
+    return images.srcset(product, ext)
@@ -1,20 +1,36 @@
 from django.shortcuts import redirect, render, get_object_or_404
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
 from django.views import View
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from django.views.generic import ListView, DetailView
-from .models import Customer, Product, Order, OrderItem, Payment, Category, Address, CustomerProfile, UserSettings, Inventory
+from django.core.paginator import Page
+from .models import Customer, Product, Order, OrderItem, Payment, Category, Address, CustomerProfile, UserSettings, Inventory, Supplier, ProductStock
 from .serializers import (
     CustomerSerializer,
     ProductSerializer,
     OrderSerializer,
     OrderItemSerializer,
     PaymentSerializer,
+    ValuesReadPlan,
+    get_requested_fields,
 )
+from .importers import ProductImporter, iter_decoded_lines
+from .batch import NDJSONParser, ProductBatch
+from . import rollups, catalog_cache, dbpool, conditional
+from .facets import compute_facets
+from .search import normalize_query, search_products
+from .pagination import SearchPagination, encode_cursor, decode_cursor
+from .checkout import place_order, CheckoutError
+from .carts import get_cart_store, cart_total
+from .db_router import replica_reads
 from django import forms
-from django.db.models import Sum, F, IntegerField, DecimalField, Value
-from django.db.models.functions import Coalesce, TruncDate
 from django.db import transaction, IntegrityError
+from django.db.models import Count, Sum, Q, OuterRef, Subquery, Prefetch
 from datetime import timedelta
 from django.contrib.auth.models import User
 from django.contrib.auth import login
@@ -25,75 +41,329 @@ from django.contrib import messages
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 import csv
+from functools import partial
+from urllib.parse import urlencode
+from django.conf import settings
 
 
 # --------- DRF viewsets ---------
-class CustomerViewSet(viewsets.ModelViewSet):
+class SparseFieldsetViewSetMixin:
+    """
+    Для GET-запросов с ?fields=... читает из БД только запрошенные столбцы
+    и подгружает связи из prefetch_fields, только если они запрошены.
+    Связи в prefetch_fields — имена или Prefetch с порядком по id: тот же
+    порядок даёт быстрый список (ValuesListViewSetMixin). related_fields —
+    поля ответа из связанной строки (поле -> путь вида stock__available),
+    они читаются через select_related в том же запросе.
+    """
+    prefetch_fields = ()
+    related_fields = {}
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.method != "GET":
+            return qs
+
+        requested = get_requested_fields(self.request)
+        prefetch = [
+            f for f in self.prefetch_fields
+            if requested is None or getattr(f, "prefetch_to", f) in requested
+        ]
+        if prefetch:
+            qs = qs.prefetch_related(*prefetch)
+        related = [path for name, path in self.related_fields.items() if requested is None or name in requested]
+        if related:
+            qs = qs.select_related(*{path.rpartition("__")[0] for path in related})
+        if requested:
+            concrete = {f.name for f in qs.model._meta.concrete_fields}
+            qs = qs.only("pk", *(requested & concrete), *related)
+        return qs
+
+
+class ValuesListViewSetMixin:
+    """
+    list через ValuesReadPlan (serializers.py): страница читается через values(),
+    связи — одним запросом на связь, без экземпляров моделей. JSON тот же, что
+    у serializer_class; если план для сериализатора не строится — обычный list.
+    """
+
+    def get_list_plan(self):
+        return ValuesReadPlan.for_serializer(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_list_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = plan.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.serialize(page))
+        return Response(plan.serialize(queryset))
+
+
+class ConditionalGetViewSetMixin:
+    """
+    ETag/Last-Modified для list и retrieve (ElShop/conditional.py): валидатор —
+    та же выборка и страница, но только id и validator_timestamps. Браузерный API (HTML)
+    содержит формы и пользователя — для него заголовки не ставятся.
+    """
+    validator_timestamps = ("updated_at",)
+
+    def get_validator_variant(self, request):
+        return [request.get_full_path(), request.accepted_media_type]
+
+    def uses_validators(self, request):
+        return not isinstance(request.accepted_renderer, BrowsableAPIRenderer)
+
+    def get_list_validator(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values("id", *self.validator_timestamps)
+        variant = self.get_validator_variant(request)
+        paginator = self.paginator
+        if paginator is None:
+            return conditional.rows_validator(queryset, variant, self.validator_timestamps)
+        rows = paginator.paginate_queryset(queryset, request, view=self)
+        variant += [paginator.get_next_link(), paginator.get_previous_link()]
+        if hasattr(paginator.page, "paginator"):
+            variant.append(paginator.page.paginator.count)  # постраничный поиск отдаёт count
+        return conditional.rows_validator(rows, variant, self.validator_timestamps)
+
+    def get_retrieve_validator(self, request):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        return conditional.row_validator(
+            self.filter_queryset(self.get_queryset()),
+            {self.lookup_field: self.kwargs[lookup]},
+            self.get_validator_variant(request),
+            self.validator_timestamps,
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.uses_validators(request):
+            return super().list(request, *args, **kwargs)
+        return conditional.respond(request, self.get_list_validator(request),
+                                   partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.uses_validators(request):
+            return super().retrieve(request, *args, **kwargs)
+        return conditional.respond(request, self.get_retrieve_validator(request),
+                                   partial(super().retrieve, request, *args, **kwargs))
+
+
+class CustomerViewSet(ValuesListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
+    replica_reads = True
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetViewSetMixin, ValuesListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
+    """?q=... — полнотекстовый поиск, результаты по релевантности; ?in_stock=1 — только в наличии"""
+    replica_reads = True
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    prefetch_fields = (
+        Prefetch("categories", queryset=Category.objects.order_by("id")),
+        Prefetch("suppliers", queryset=Supplier.objects.order_by("id")),
+    )
+    related_fields = {"available_quantity": "stock__available"}
+    validator_timestamps = ("updated_at", "stock__updated_at")
 
+    def get_search_query(self):
+        return normalize_query(self.request.query_params.get("q"))
 
-class OrderViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        qs = super().get_queryset()
+        q = self.get_search_query()
+        if q and self.action == "list":
+            qs = search_products(qs, q)
+        if self.action == "list" and self.request.query_params.get("in_stock") == "1":
+            qs = qs.filter(stock__available__gt=0)  # частичный индекс product_stock_in_stock_idx
+        return qs
+
+    @action(detail=False, methods=["post", "patch"], url_path="batch", parser_classes=[JSONParser, NDJSONParser])
+    def batch(self, request):
+        """
+        Пакетная запись по sku (ElShop/batch.py): тело — массив JSON или NDJSON
+        (application/x-ndjson). POST создаёт и изменяет товары, PATCH только
+        изменяет существующие. Ответ — счётчики и результат каждой строки.
+        """
+        if isinstance(request.data, dict):
+            raise ParseError("Ожидался массив объектов или NDJSON")
+        result = ProductBatch(create=request.method == "POST").run(request.data)
+        return Response(result.as_data())
+
+    @property
+    def paginator(self):
+        # Курсор по id не сохраняет порядок релевантности
+        if not hasattr(self, "_paginator") and self.get_search_query():
+            self._paginator = SearchPagination()
+        return super().paginator
+
+
+class OrderViewSet(ConditionalGetViewSetMixin, ValuesListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
+    replica_reads = True
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    prefetch_fields = (Prefetch("items", queryset=OrderItem.objects.order_by("id")),)
 
 
-class OrderItemViewSet(viewsets.ModelViewSet):
+class OrderItemViewSet(ValuesListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
+    replica_reads = True
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ValuesListViewSetMixin, SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
+    replica_reads = True
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
 
 
 # --------- Каталог ---------
 class ProductListView(ListView):
+    replica_reads = True
     model = Product
     template_name = "catalog.html"
     context_object_name = "products"
     paginate_by = 12
 
+    def get_filters(self):
+        """Нормализованные параметры фильтра: общие для запроса и ключа кэша"""
+        filters = {"q": normalize_query(self.request.GET.get("q")),
+                   "category": None, "min_price": None, "max_price": None,
+                   "in_stock": self.request.GET.get("in_stock") == "1"}
+
+        category_id = self.request.GET.get("category", "")
+        if category_id.isdigit():
+            filters["category"] = int(category_id)
+
+        for name in ("min_price", "max_price"):
+            value = self.request.GET.get(name)
+            if value:
+                try:
+                    price = Decimal(value.replace(",", "."))
+                except InvalidOperation:
+                    continue
+                if price.is_finite():
+                    filters[name] = price.normalize()
+        return filters
+
     def get_queryset(self):
+        filters = self.get_filters()
         qs = Product.objects.filter(active=True).prefetch_related("categories")
 
         # Фильтр по категории
-        category_id = self.request.GET.get("category")
-        if category_id:
-            qs = qs.filter(categories__id=category_id)
+        if filters["category"] is not None:
+            qs = qs.filter(categories__id=filters["category"])
 
         # Фильтр по цене
-        min_price = self.request.GET.get("min_price")
-        max_price = self.request.GET.get("max_price")
-        if min_price:
-            try:
-                qs = qs.filter(base_price__gte=float(min_price))
-            except ValueError:
-                pass
-        if max_price:
-            try:
-                qs = qs.filter(base_price__lte=float(max_price))
-            except ValueError:
-                pass
-
-        return qs.distinct()
+        if filters["min_price"] is not None:
+            qs = qs.filter(base_price__gte=filters["min_price"])
+        if filters["max_price"] is not None:
+            qs = qs.filter(base_price__lte=filters["max_price"])
+
+        # Только в наличии — по готовым суммам остатков (частичный индекс), без SUM по складам
+        if filters["in_stock"]:
+            qs = qs.filter(stock__available__gt=0)
+
+        qs = qs.distinct()
+        # Поиск — по релевантности, без него — по id
+        if filters["q"]:
+            return search_products(qs, filters["q"])
+        return qs.order_by("id")
+
+    def paginate_queryset(self, queryset, page_size):
+        # В кэше лежит только страница товаров и общее количество, Paginator собирается заново
+        paginate = super().paginate_queryset
+
+        def compute():
+            paginator, page, object_list, is_paginated = paginate(queryset, page_size)
+            return {"count": paginator.count, "number": page.number, "products": list(object_list)}
+
+        cached = catalog_cache.get_or_compute("page", self.get_page_params(), compute, self.get_cache_timeout())
+        paginator, page, object_list, is_paginated = self.build_page(queryset, page_size, cached)
+        self.set_availability(object_list, dict(self.get_stock_queryset(object_list)))
+        return paginator, page, object_list, is_paginated
+
+    def get_page_params(self):
+        return dict(self.get_filters(), page=self.request.GET.get("page") or "1")
+
+    def get_cache_timeout(self):
+        return catalog_cache.STOCK_TIMEOUT if self.get_filters()["in_stock"] else catalog_cache.TIMEOUT
+
+    def get_stock_queryset(self, products):
+        """Свободные остатки товаров страницы одним запросом по ключу — мимо кэша, всегда свежие"""
+        return ProductStock.objects.filter(pk__in=[product.pk for product in products]).values_list("pk", "available")
+
+    @staticmethod
+    def set_availability(products, stock):
+        for product in products:
+            product.available_quantity = stock.get(product.pk)
+
+    def build_page(self, queryset, page_size, cached):
+        """(paginator, page, object_list, is_paginated) из закэшированной страницы"""
+        paginator = self.get_paginator(
+            queryset, page_size,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        paginator.count = cached["count"]
+        page = Page(cached["products"], cached["number"], paginator)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_price_facets(self, filters, buckets):
+        """Корзины гистограммы цен со ссылками, выставляющими диапазон (остальные фильтры сохраняются)"""
+        base = {k: filters[k] for k in ("q", "category") if filters[k] not in (None, "")}
+        if filters["in_stock"]:
+            base["in_stock"] = 1
+        result = []
+        for bucket in buckets:
+            params = dict(base, min_price=bucket["min"])
+            if bucket["max"] is not None:
+                # max_price включительный, корзина — нет
+                params["max_price"] = bucket["max"] - Decimal("0.01")
+            result.append(dict(bucket, query=urlencode(params)))
+        return result
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["categories"] = Category.objects.all()
-        context["selected_category"] = self.request.GET.get("category", "")
-        context["min_price"] = self.request.GET.get("min_price", "")
-        context["max_price"] = self.request.GET.get("max_price", "")
+        categories = catalog_cache.get_or_compute(
+            "categories", None, lambda: list(Category.objects.all())
+        )
+        filters = self.get_filters()
+        facets = catalog_cache.get_or_compute("facets", filters, lambda: compute_facets(filters),
+                                              self.get_cache_timeout())
+        context.update(self.get_catalog_context(filters, categories, facets))
         return context
 
+    def get_catalog_context(self, filters, categories, facets):
+        """Категории, фасеты и значения фильтров для шаблона (общее с AsyncProductListView)"""
+        return {
+            "categories": categories,
+            "facets_total": facets["total"],
+            "category_facets": [
+                {"category": cat, "count": facets["categories"].get(cat.id, 0)}
+                for cat in categories
+            ],
+            "price_facets": self.get_price_facets(filters, facets["prices"]),
+            "q": filters["q"],
+            "selected_category": self.request.GET.get("category", ""),
+            "min_price": self.request.GET.get("min_price", ""),
+            "max_price": self.request.GET.get("max_price", ""),
+            "in_stock": filters["in_stock"],
+        }
+
+
+@staff_member_required
+def catalog_cache_stats(request):
+    return JsonResponse(catalog_cache.stats())
+
+
+@staff_member_required
+def db_pool_stats(request):
+    return JsonResponse(dbpool.stats())
+
 
 # --------- Корзина ---------
 class AddToCartView(LoginRequiredMixin, View):
@@ -109,60 +379,36 @@ class AddToCartView(LoginRequiredMixin, View):
     def _handle(self, request, *args, **kwargs):
         product_id = kwargs['product_id']
         product = get_object_or_404(Product, id=product_id)
-
-        cart = request.session.get('cart', {})
-        pid = str(product.id)
-        if pid in cart:
-            cart[pid]['quantity'] += 1
-            cart[pid]['line_total'] = float(cart[pid]['price']) * cart[pid]['quantity']
-        else:
-            cart[pid] = {
-                'name': product.name,
-                'price': float(product.base_price),
-                'quantity': 1,
-                'line_total': float(product.base_price),
-            }
-        request.session['cart'] = cart
-        request.session.modified = True
+        get_cart_store(request).add(product)
         return redirect('cart')
 
 
 @method_decorator(login_required(login_url='login'), name='dispatch')
 class CartView(View):
     def get(self, request):
-        cart = request.session.get('cart', {})
-        for pid, item in cart.items():
-            if 'line_total' not in item:
-                item['line_total'] = float(item['price']) * item['quantity']
-        total = sum(item['line_total'] for item in cart.values())
-        return render(request, 'cart.html', {'cart': cart, 'total': total})
+        cart = get_cart_store(request).lines()
+        return render(request, 'cart.html', {'cart': cart, 'total': cart_total(cart)})
 
 
 @login_required(login_url='login')
 def clear_cart(request):
     if request.method == "POST":
-        request.session['cart'] = {}
-        request.session.modified = True
+        get_cart_store(request).clear()
     return redirect('cart')
 
 
 @login_required(login_url='login')
 def update_cart(request):
-    cart = request.session.get('cart', {})
     if request.method == 'POST':
-        for pid, item in list(cart.items()):
-            field_name = f'quantity_{pid}'
-            if field_name in request.POST:
-                try:
-                    quantity = int(request.POST[field_name])
-                    if quantity > 0:
-                        item['quantity'] = quantity
-                        item['line_total'] = float(item['price']) * quantity
-                    else:
-                        del cart[pid]
-                except ValueError:
-                    pass
-        request.session['cart'] = cart
+        store = get_cart_store(request)
+        for field_name, value in request.POST.items():
+            if not field_name.startswith('quantity_'):
+                continue
+            pid = field_name[len('quantity_'):]
+            try:
+                store.set_quantity(int(pid), int(value))
+            except ValueError:
+                pass
     return redirect('cart')
 
 
@@ -175,8 +421,8 @@ class CheckoutView(LoginRequiredMixin, View):
         return (s or "").strip().lower()
 
     def get(self, request):
-        cart = request.session.get("cart", {})
-        total = sum(item["price"] * item["quantity"] for item in cart.values())
+        cart = get_cart_store(request).lines()
+        total = cart_total(cart)
         method_choices = getattr(Payment, "METHOD_CHOICES", (
             ("card", "Card"),
             ("transfer", "Transfer"),
@@ -191,7 +437,8 @@ class CheckoutView(LoginRequiredMixin, View):
         })
 
     def post(self, request):
-        cart = request.session.get("cart", {})
+        store = get_cart_store(request)
+        cart = store.lines()
         if not cart:
             messages.error(request, "Корзина пуста.")
             return redirect("catalog")
@@ -215,7 +462,7 @@ class CheckoutView(LoginRequiredMixin, View):
                 ("mir", "MIR"),
                 ("cash", "Cash"),
             ))
-            total = sum(item["price"] * item["quantity"] for item in cart.values())
+            total = cart_total(cart)
             return render(request, self.template_name, {
                 "cart": cart,
                 "total": total,
@@ -224,67 +471,24 @@ class CheckoutView(LoginRequiredMixin, View):
             })
 
         try:
-            with transaction.atomic():
-                customer = request.user.customer
-
-                existing = Address.objects.filter(
-                    customer=customer,
-                    line1__iexact=line1,
-                    city__iexact=city,
-                    country__iexact=country,
-                ).first()
-
-                if existing:
-                    address = existing
-                else:
-                    address = Address.objects.create(
-                        customer=customer,
-                        line1=line1,
-                        city=city,
-                        country=country,
-                        is_default=False,
-                    )
-
-                # создаём заказ
-                order = Order.objects.create(
-                    customer=customer,
-                    shipping_address=address,
-                    status="draft",
-                    subtotal=0, tax=0, shipping_cost=0, total=0
-                )
-
-                subtotal = 0
-                for pid, item in cart.items():
-                    line_total = item["price"] * item["quantity"]
-                    subtotal += line_total
-                    OrderItem.objects.create(
-                        order=order,
-                        product_id=int(pid),
-                        unit_price=item["price"],
-                        quantity=item["quantity"],
-                        discount=0,
-                        line_total=line_total
-                    )
-
-                order.subtotal = subtotal
-                order.total = subtotal
-                order.status = "paid"
-                order.save()
-
-                # платёж по выбранному способу
-                Payment.objects.create(
-                    order=order,
-                    method=payment_method,
-                    amount=subtotal,
-                )
+            # адрес, заказ, строки и платёж — одним вызовом (ElShop/checkout.py)
+            place_order(request.user.customer, cart, line1, city, country, payment_method)
 
-                # очистка корзины
-                request.session["cart"] = {}
-                request.session.modified = True
+            # очистка корзины
+            store.clear()
 
             messages.success(request, "✅ Заказ успешно оформлен.")
             return redirect("checkout_success")
 
+        except CheckoutError as e:
+            if e.code == CheckoutError.PRICE_CHANGED:
+                changed = store.reprice()
+                messages.error(request, "Заказ не оформлен: цены изменились ("
+                               + ", ".join(changed) + "). Корзина пересчитана по текущим ценам, "
+                               "проверьте её и оформите заказ снова.")
+            else:
+                messages.error(request, f"Заказ не оформлен: {e}. Проверьте корзину.")
+            return redirect("cart")
         except IntegrityError:
             messages.error(request, "Ошибка при сохранении заказа. Изменения отменены.")
             return redirect("cart")
@@ -302,10 +506,28 @@ class CheckoutSuccessView(View):
 
 # --------- Товар ---------
 class ProductDetailView(DetailView):
+    replica_reads = True
     model = Product
     template_name = 'product_detail.html'
     context_object_name = 'product'
 
+    def get_validator(self, request):
+        """ETag страницы: товар, шаблоны и то, что в ней от пользователя (тема, CSRF-токен)"""
+        user = request.user
+        try:
+            theme = user.settings.theme if user.is_authenticated else ""
+        except ObjectDoesNotExist:
+            theme = ""
+        variant = [
+            conditional.template_version("base.html", self.template_name),
+            user.pk, theme, request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        ]
+        return conditional.row_validator(self.get_queryset(), {"pk": self.kwargs[self.pk_url_kwarg]}, variant)
+
+    def get(self, request, *args, **kwargs):
+        return conditional.respond(request, self.get_validator(request),
+                                   partial(super().get, request, *args, **kwargs), private=True)
+
 
 # --------- Регистрация ---------
 class RegisterForm(forms.ModelForm):
@@ -370,27 +592,62 @@ def register(request):
 # --------- История заказов ---------
 @method_decorator(login_required(login_url='login'), name='dispatch')
 class OrderHistoryView(View):
+    replica_reads = True
+    paginate_by = 20
+
     def get(self, request):
         try:
             customer = request.user.customer
         except AttributeError:
             customer = None
-
-        orders = Order.objects.filter(customer=customer) if customer else []
-        return render(request, 'order_history.html', {'orders': orders})
+        if customer is None:
+            return render(request, 'order_history.html', {'orders': []})
+
+        # Число строк и товаров — коррелированными подзапросами: считаются только
+        # для заказов текущей страницы, а не для всей истории покупателя
+        items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+        orders = (
+            Order.objects.filter(customer=customer)
+            .annotate(
+                items_count=Subquery(items.annotate(n=Count("*")).values("n")),
+                items_quantity=Subquery(items.annotate(n=Sum("quantity")).values("n")),
+            )
+            .order_by("-created_at", "-id")
+        )
+        cursor = decode_cursor(request.GET.get("after"))
+        if cursor:
+            created_at, pk = cursor
+            orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        orders = list(orders[:self.paginate_by + 1])
+        next_cursor = None
+        if len(orders) > self.paginate_by:
+            orders = orders[:self.paginate_by]
+            next_cursor = encode_cursor(orders[-1].created_at, orders[-1].pk)
+        return render(request, 'order_history.html', {
+            'orders': orders,
+            'next_cursor': next_cursor,
+            'is_first_page': cursor is None,
+        })
 
 
 @method_decorator(login_required(login_url='login'), name='dispatch')
 class OrderDetailView(View):
+    replica_reads = True
+
     def get(self, request, order_id):
         try:
             customer = request.user.customer
         except AttributeError:
             return redirect('catalog')
 
-        order = get_object_or_404(Order, id=order_id, customer=customer)
-        items = order.items.all()
-        return render(request, 'order_detail.html', {'order': order, 'items': items})
+        # Заказ с адресом, строки с товарами и платёж — три запроса при любом размере заказа
+        order = get_object_or_404(
+            Order.objects.select_related("shipping_address"), id=order_id, customer=customer
+        )
+        items = list(order.items.select_related("product").order_by("id"))
+        payment = order.payments.order_by("id").first()
+        return render(request, 'order_detail.html', {'order': order, 'items': items, 'payment': payment})
 
 
 # --------- Формы профиля ---------
@@ -487,6 +744,7 @@ def admin_or_manager(user):
 
 @login_required(login_url='login')
 @user_passes_test(admin_or_manager, login_url='catalog')
+@replica_reads
 def analytics_view(request):
     today = timezone.now().date()
     last_week = today - timedelta(days=6)
@@ -494,59 +752,19 @@ def analytics_view(request):
     start_date = request.GET.get('start_date') or last_week.isoformat()
     end_date = request.GET.get('end_date') or today.isoformat()
 
+    # Все три графика читаются из предагрегированных таблиц (rollups.py)
     # --- Продажи по категориям (шт.) ---
-    category_qs = (
-        OrderItem.objects
-        .filter(order__status__in=['paid', 'shipped', 'completed'])
-        .values('product__categories__name')
-        .annotate(
-            total_sold=Coalesce(
-                Sum('quantity', output_field=IntegerField()),
-                Value(0, output_field=IntegerField()),
-                output_field=IntegerField(),
-            )
-        )
-        .order_by('-total_sold')
-    )
+    category_qs = rollups.category_sales()
     category_labels = [(r['product__categories__name'] or 'Без категории') for r in category_qs]
     category_data = [int(r['total_sold'] or 0) for r in category_qs]
 
     # --- Доход по дням в периоде (Decimal) ---
-    daily_qs = (
-        Order.objects
-        .filter(
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date,
-            status__in=['paid', 'shipped', 'completed'],
-        )
-        .annotate(day=TruncDate('created_at'))
-        .values('day')
-        .annotate(
-            total=Coalesce(
-                Sum('total', output_field=DecimalField(max_digits=12, decimal_places=2)),
-                Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2)),
-                output_field=DecimalField(max_digits=12, decimal_places=2),
-            )
-        )
-        .order_by('day')
-    )
+    daily_qs = rollups.daily_revenue(start_date, end_date)
     revenue_labels = [r['day'].strftime('%Y-%m-%d') for r in daily_qs]
     revenue_data = [float(r['total'] or 0) for r in daily_qs]
 
     # --- Топ-5 товаров (шт.) ---
-    top_qs = (
-        OrderItem.objects
-        .filter(order__status__in=['paid', 'shipped', 'completed'])
-        .values('product__name')
-        .annotate(
-            total_sold=Coalesce(
-                Sum('quantity', output_field=IntegerField()),
-                Value(0, output_field=IntegerField()),
-                output_field=IntegerField(),
-            )
-        )
-        .order_by('-total_sold')[:5]
-    )
+    top_qs = rollups.top_products(5)
     top_labels = [r['product__name'] for r in top_qs]
     top_data = [int(r['total_sold'] or 0) for r in top_qs]
 
@@ -565,40 +783,73 @@ def analytics_view(request):
     }
     return render(request, 'analytics.html', context)
 
+ANALYTICS_EXPORT_HEADER = [
+    "Дата заказа", "ID заказа", "Статус", "Покупатель",
+    "Сумма заказа", "Товар", "Количество", "Цена за единицу", "Сумма по товару"
+]
+ANALYTICS_EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи в память."""
+
+    def write(self, value):
+        return value
+
+
+def iter_analytics_csv(rows, chunk_size=ANALYTICS_EXPORT_CHUNK_SIZE):
+    """Генератор строк отчёта в cp1251, отдаёт данные пачками по chunk_size строк."""
+    writer = csv.writer(Echo(), delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    yield writer.writerow(ANALYTICS_EXPORT_HEADER).encode('cp1251', 'replace')
+
+    chunk = []
+    for (created_at, order_id, status, customer_id, first_name, last_name,
+         order_total, product_name, quantity, unit_price, line_total) in rows:
+        chunk.append(writer.writerow([
+            created_at.strftime("%Y-%m-%d %H:%M"),
+            order_id,
+            status,
+            f"{first_name} {last_name}" if customer_id else "Аноним",
+            float(order_total),
+            product_name,
+            quantity,
+            float(unit_price),
+            float(line_total)
+        ]))
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk).encode('cp1251', 'replace')
+            chunk = []
+
+    if chunk:
+        yield ''.join(chunk).encode('cp1251', 'replace')
+
+
 @staff_member_required
+@replica_reads
 def export_analytics_csv(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
 
-    orders = Order.objects.all()
+    # Все связи разрешаются одним JOIN, строки читаются серверным курсором пачками
+    items = OrderItem.objects.all()
     if start_date:
-        orders = orders.filter(created_at__date__gte=start_date)
+        items = items.filter(order__created_at__date__gte=start_date)
     if end_date:
-        orders = orders.filter(created_at__date__lte=end_date)
+        items = items.filter(order__created_at__date__lte=end_date)
+
+    rows = (
+        items
+        .order_by('order_id', 'id')
+        .values_list(
+            'order__created_at', 'order_id', 'order__status', 'order__customer_id',
+            'order__customer__first_name', 'order__customer__last_name', 'order__total',
+            'product__name', 'quantity', 'unit_price', 'line_total',
+        )
+        .iterator(chunk_size=ANALYTICS_EXPORT_CHUNK_SIZE)
+    )
 
-    response = HttpResponse(content_type='text/csv; charset=cp1251')
+    response = StreamingHttpResponse(iter_analytics_csv(rows), content_type='text/csv; charset=cp1251')
     response['Content-Disposition'] = 'attachment; filename="analytics_report.csv"'
-
-    writer = csv.writer(response, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow([
-        "Дата заказа", "ID заказа", "Статус", "Покупатель",
-        "Сумма заказа", "Товар", "Количество", "Цена за единицу", "Сумма по товару"
-    ])
-
-    for order in orders:
-        for item in order.items.all():
-            writer.writerow([
-                order.created_at.strftime("%Y-%m-%d %H:%M"),
-                order.id,
-                order.status,
-                f"{order.customer.first_name} {order.customer.last_name}" if order.customer else "Аноним",
-                float(order.total),
-                item.product.name,
-                item.quantity,
-                float(item.unit_price),
-                float(item.line_total)
-            ])
-
     return response
 
 
@@ -607,6 +858,7 @@ def is_admin_or_manager(user):
 
 
 @user_passes_test(is_admin_or_manager)
+@replica_reads
 def export_products_csv(request):
     response = HttpResponse(content_type='text/csv; charset=cp1251')
     response['Content-Disposition'] = 'attachment; filename="products_export.csv"'
@@ -630,56 +882,27 @@ def export_products_csv(request):
 @user_passes_test(is_admin_or_manager)
 def import_products_csv(request):
     if request.method == 'POST' and request.FILES.get('csv_file'):
-        csv_file = request.FILES['csv_file']
-        decoded_file = csv_file.read().decode('cp1251').splitlines()
-        reader = csv.DictReader(decoded_file, delimiter=';')
+        lines = iter_decoded_lines(request.FILES['csv_file'], 'cp1251')
 
-        imported = 0
         try:
             with transaction.atomic():
-                for row in reader:
-                    name = (row.get('Название') or '').strip()
-                    if not name:
-                        continue
-
-                    description = (row.get('Описание') or '').strip()
-                    price_str = (row.get('Цена') or '0').strip().replace(',', '.')
-                    try:
-                        base_price = float(price_str)
-                    except ValueError:
-                        raise ValueError(f"Неверный формат цены: {price_str}")
-
-                    sku = row.get('ID') or f"SKU_{name[:5].upper()}_{imported+1}"
-
-                    product, created = Product.objects.get_or_create(sku=sku, defaults={
-                        'name': name,
-                        'description': description,
-                        'base_price': base_price,
-                    })
-
-                    if not created:
-                        product.name = name
-                        product.description = description
-                        product.base_price = base_price
-                        product.save()
-
-                    cat_names = (row.get('Категории') or '').split(',')
-                    product.categories.clear()
-                    for cname in cat_names:
-                        cname = cname.strip()
-                        if cname:
-                            cat, _ = Category.objects.get_or_create(name=cname)
-                            product.categories.add(cat)
-
-                    imported += 1
-
-            messages.success(request, f'✅ Импортировано {imported} товаров.')
-            return redirect('catalog')
-
+                result = ProductImporter().run(lines)
+                if result.errors:
+                    transaction.set_rollback(True)
         except Exception as e:
             messages.error(request, f'❌ Ошибка при импорте. Изменения отменены: {e}')
             return redirect('catalog')
 
+        if result.errors:
+            details = '; '.join(f'строка {line}: {msg}' for line, msg in result.errors[:5])
+            messages.error(request, f'❌ Ошибка при импорте. Изменения отменены: {details}')
+        else:
+            messages.success(
+                request,
+                f'✅ Импортировано {result.imported} товаров ({result.rows_per_sec:.0f} строк/с).'
+            )
+        return redirect('catalog')
+
     messages.error(request, '❌ Файл не выбран или имеет неверный формат.')
     return redirect('catalog')
 
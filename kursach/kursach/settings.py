@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
 
+from ElShop import dbpool
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,11 +46,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ElShop.sql_telemetry.SqlTelemetryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # До AuditUserMiddleware: execute_wrapper снаружи и видит запросы ещё без set_config
+    'ElShop.db_router.ReplicaRoutingMiddleware',
+    'ElShop.audit.AuditUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,6 +93,63 @@ DATABASES = {
     }
 }
 
+# Соединения с БД (ElShop/dbpool.py): "off" — новое на каждый запрос, "persistent" — постоянные
+# с проверкой, "pool" — пул psycopg 3 (min_size..max_size), "pgbouncer" — за PgBouncer (pool_mode = transaction)
+ELSHOP_DB_POOL = {
+    'mode': os.environ.get('ELSHOP_DB_POOL_MODE', 'persistent'),
+    'min_size': 2,
+    'max_size': 20,
+    'timeout': 10,
+    'max_lifetime': 600,
+}
+DATABASES['default'] = dbpool.configure(DATABASES['default'], **ELSHOP_DB_POOL)
+
+# Реплики для чтения (ElShop/db_router.py): ELSHOP_DB_REPLICA_HOSTS=host[:port],... — по алиасу replicaN
+# на каждый хост. Локально можно указать тот же сервер: ELSHOP_DB_REPLICA_HOSTS=127.0.0.1
+ELSHOP_DB_REPLICAS = []
+for number, address in enumerate(filter(None, os.environ.get('ELSHOP_DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], HOST=host, PORT=port or DATABASES['default']['PORT'], TEST={'MIRROR': 'default'},
+    )
+    ELSHOP_DB_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['ElShop.db_router.ReplicaRouter']
+# Сколько секунд после записи клиент читает только с основной базы (реплика успевает догнать)
+ELSHOP_REPLICA_PIN_SECONDS = 10
+
+# Cache (кэш каталога и корзины, см. ElShop/catalog_cache.py)
+# Версия каталога должна быть общей для всех воркеров, иначе после записи остальные процессы
+# отдают старые страницы до истечения TIMEOUT. Поэтому вне DEBUG по умолчанию — кэш в БД
+# (таблица создаётся командой createcachetable), ELSHOP_REDIS_URL=redis://... — Redis (пакет redis).
+# LocMemCache свой у каждого процесса — только для разработки с одним процессом.
+if os.environ.get('ELSHOP_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['ELSHOP_REDIS_URL'],
+        }
+    }
+elif not DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'elshop_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'elshop',
+        }
+    }
+
+# Django REST Framework
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'ElShop.pagination.KeysetPagination',
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -132,4 +196,17 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 LOGIN_REDIRECT_URL = 'catalog'
 LOGOUT_REDIRECT_URL = 'catalog'
-LOGIN_URL = 'login'
\ No newline at end of file
+LOGIN_URL = 'login'
+# Оформление заказа: "db" — одной хранимой функцией ElShop_sp_checkout, "orm" — прежний путь
+ELSHOP_CHECKOUT_MODE = 'db'
+# Сколько черновик заказа удерживает товар (ElShop/inventory.py, команда expire_reservations)
+ELSHOP_RESERVATION_TTL = timedelta(minutes=30)
+# Хранилище корзины (ElShop/carts.py): "db" — таблица elshop_cart_line, "cache" — общий кэш, "session" — прежний вариант
+ELSHOP_CART_STORE = 'db'
+# Телеметрия SQL по отпечаткам запросов (ElShop/sql_telemetry.py, команда sql_telemetry_top)
+ELSHOP_SQL_TELEMETRY = False
+ELSHOP_SQL_TELEMETRY_SLOW_MS = 100
+ELSHOP_SQL_TELEMETRY_FLUSH_SECONDS = 60
+ELSHOP_SQL_TELEMETRY_FILE = BASE_DIR / 'sql_telemetry.jsonl'
+# Асинхронные view чтения каталога и API (ElShop/async_views.py) — включать при запуске через ASGI
+ELSHOP_ASYNC_VIEWS = False
@@ -19,7 +19,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from ElShop.views import CustomerViewSet, ProductViewSet, OrderViewSet, OrderItemViewSet, PaymentViewSet, ProductListView, AddToCartView, CartView, CheckoutView, CheckoutSuccessView, ProductDetailView, register, clear_cart, update_cart, OrderHistoryView, OrderDetailView, ProfileView, analytics_view, export_analytics_csv, import_products_csv, export_products_csv, toggle_theme
+from ElShop.views import CustomerViewSet, ProductViewSet, OrderViewSet, OrderItemViewSet, PaymentViewSet, ProductListView, AddToCartView, CartView, CheckoutView, CheckoutSuccessView, ProductDetailView, register, clear_cart, update_cart, OrderHistoryView, OrderDetailView, ProfileView, analytics_view, export_analytics_csv, import_products_csv, export_products_csv, toggle_theme, catalog_cache_stats, db_pool_stats
 from django.contrib.auth import views as auth_views
 
 router = DefaultRouter()
@@ -51,7 +51,14 @@ urlpatterns = [
     path('export-products/', export_products_csv, name='export_products'),
     path('import-products/', import_products_csv, name='import_products'),
     path("toggle-theme/", toggle_theme, name="toggle_theme"),
+    path("catalog/cache-stats/", catalog_cache_stats, name="catalog_cache_stats"),
+    path("db/pool-stats/", db_pool_stats, name="db_pool_stats"),
 ]
 
+# Чтение каталога и API — асинхронные view поверх тех же адресов (при запуске через ASGI)
+if settings.ELSHOP_ASYNC_VIEWS:
+    from ElShop.async_views import urlpatterns as async_urlpatterns
+    urlpatterns = async_urlpatterns + urlpatterns
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
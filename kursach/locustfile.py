@@ -1,33 +1,292 @@
-from locust import HttpUser, task, between
+"""
+Нагрузочные сценарии ElShop.
+
+Персоны (вес — доля пользователей):
+- BrowserUser (6) — гость: каталог с фильтрами, поиском и страницами, карточки товаров;
+- BuyerUser (3) — регистрируется и проходит корзина → оформление → история заказов;
+- ManagerUser (1) — аналитика, выгрузки CSV, импорт товаров;
+- ApiUser (2) — интегратор: курсорные страницы /api/products/, поиск, ?fields=, заказы.
+
+Товары и категории берутся из работающего магазина (нужны товары с остатками,
+например из генератора тестовых данных). Менеджер входит под учётной записью
+LOCUST_MANAGER_USERNAME / LOCUST_MANAGER_PASSWORD (staff или группа Manager).
+
+Профиль нагрузки — LOCUST_SHAPE=steady|ramp|spike|soak (без переменной — -u/-r
+из командной строки). По завершении в LOCUST_SLO_REPORT (slo_report.json)
+пишутся p50/p95/p99 по каждому запросу и сравнение с SLO; при нарушении SLO
+процесс завершается с кодом 1.
+
+    locust -f locustfile.py --host http://127.0.0.1:8000 --headless -u 50 -r 5 -t 10m
+    LOCUST_SHAPE=spike locust -f locustfile.py --host http://127.0.0.1:8000 --headless
+"""
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from locust import HttpUser, LoadTestShape, between, events, task
+from locust.runners import WorkerRunner
+
+MANAGER_USERNAME = os.environ.get("LOCUST_MANAGER_USERNAME", "manager")
+MANAGER_PASSWORD = os.environ.get("LOCUST_MANAGER_PASSWORD", "12345")
+SLO_REPORT = os.environ.get("LOCUST_SLO_REPORT", "slo_report.json")
+RELEASE = os.environ.get("LOCUST_RELEASE", "")
+
+# SLO по имени запроса (name=...), мс
+SLOS = {
+    "catalog": {"p95": 300, "p99": 800},
+    "catalog [filters]": {"p95": 400, "p99": 1000},
+    "catalog [search]": {"p95": 400, "p99": 1000},
+    "product [id]": {"p95": 200, "p99": 500},
+    "add_to_cart": {"p95": 200, "p99": 500},
+    "cart": {"p95": 200, "p99": 500},
+    "checkout [form]": {"p95": 250, "p99": 600},
+    "checkout [submit]": {"p95": 500, "p99": 1200},
+    "orders": {"p95": 300, "p99": 800},
+    "orders [id]": {"p95": 200, "p99": 500},
+    "analytics": {"p95": 800, "p99": 2000},
+    "analytics export": {"p95": 2000, "p99": 5000},
+    "products export": {"p95": 2000, "p99": 5000},
+    "products import": {"p95": 2000, "p99": 5000},
+    "api products": {"p95": 250, "p99": 600},
+    "api products [cursor]": {"p95": 250, "p99": 600},
+    "api products [search]": {"p95": 300, "p99": 800},
+    "api products [id]": {"p95": 150, "p99": 400},
+    "api orders": {"p95": 400, "p99": 1000},
+}
+DEFAULT_SLO = {"p95": 1000, "p99": 3000}
+
+# Профили нагрузки: (конец этапа, с; пользователей; скорость запуска в с)
+SHAPES = {
+    "steady": [(60, 20, 5), (600, 50, 5)],
+    "ramp": [(120, 25, 1), (240, 50, 1), (360, 100, 2), (480, 150, 2), (600, 200, 2)],
+    "spike": [(120, 30, 5), (180, 300, 50), (300, 30, 50), (420, 30, 5)],
+    "soak": [(300, 60, 2), (3 * 3600, 60, 2)],
+}
+
+_catalog = {"products": [], "categories": []}
+_OPTION_RE = re.compile(r'<option value="(\d+)"')
+_ORDER_RE = re.compile(r'/orders/(\d+)/')
+
+
+def load_catalog(client):
+    """Настоящие id товаров и категорий; загружаются один раз на процесс"""
+    if _catalog["products"]:
+        return _catalog
+    response = client.get("/api/products/?fields=id&page_size=500", name="api products")
+    if response.ok:
+        _catalog["products"] = [p["id"] for p in response.json()["results"]]
+    response = client.get("/", name="catalog")
+    if response.ok:
+        _catalog["categories"] = sorted(set(_OPTION_RE.findall(response.text)))
+    return _catalog
+
 
 class ElShopUser(HttpUser):
+    abstract = True
     wait_time = between(1, 3)
 
     def on_start(self):
-        """Авторизация при запуске"""
-        self.client.post("/login/", {"username": "testuser", "password": "12345"})
+        self.catalog = load_catalog(self.client)
+
+    def random_product(self):
+        return random.choice(self.catalog["products"]) if self.catalog["products"] else 1
+
+    def csrf_post(self, url, data=None, name=None, **kwargs):
+        """POST с CSRF-токеном из cookie, как это делает браузер"""
+        if "csrftoken" not in self.client.cookies:
+            self.client.get("/login/", name="login [form]")
+        data = dict(data or {}, csrfmiddlewaretoken=self.client.cookies.get("csrftoken", ""))
+        headers = {"X-CSRFToken": data["csrfmiddlewaretoken"], "Referer": self.host}
+        return self.client.post(url, data=data, name=name, headers=headers, **kwargs)
+
+    def login(self, username, password):
+        response = self.csrf_post("/login/", {"username": username, "password": password},
+                                  name="login", allow_redirects=False)
+        return response.status_code == 302
+
+
+class BrowserUser(ElShopUser):
+    """Гость: смотрит каталог, фильтрует, ищет, открывает карточки"""
+    weight = 6
+
+    @task(4)
+    def catalog(self):
+        self.client.get(f"/?page={random.randint(1, 5)}", name="catalog")
+
+    @task(3)
+    def catalog_filters(self):
+        params = {"min_price": random.choice([0, 1000, 5000]), "max_price": random.choice([10000, 60000, 200000])}
+        if self.catalog["categories"]:
+            params["category"] = random.choice(self.catalog["categories"])
+        self.client.get("/", params=params, name="catalog [filters]")
+
+    @task(2)
+    def catalog_search(self):
+        self.client.get("/", params={"q": random.choice(["телевизор", "смартфон", "samsung", "ноутбук"])},
+                        name="catalog [search]")
+
+    @task(4)
+    def product(self):
+        self.client.get(f"/product/{self.random_product()}/", name="product [id]")
+
+
+class BuyerUser(ElShopUser):
+    """Покупатель: своя учётная запись, корзина, оформление, история заказов"""
+    weight = 3
+    wait_time = between(2, 5)
+
+    def on_start(self):
+        super().on_start()
+        username = f"load_{uuid.uuid4().hex[:12]}"
+        password = "Load-12345"
+        self.csrf_post("/register/", {
+            "username": username, "email": f"{username}@example.com",
+            "password": password, "confirm_password": password,
+        }, name="register")
+
+    @task(1)
+    def purchase(self):
+        for _ in range(random.randint(1, 3)):
+            product_id = self.random_product()
+            self.client.get(f"/product/{product_id}/", name="product [id]")
+            self.csrf_post(f"/add-to-cart/{product_id}/", name="add_to_cart")
+        self.client.get("/cart/", name="cart")
+        self.client.get("/checkout/", name="checkout [form]")
+
+        with self.csrf_post("/checkout/", {
+            "line1": "ул. Нагрузочная, 1", "city": "Москва", "country": "Россия",
+            "payment_method": random.choice(["card", "mir", "transfer"]),
+        }, name="checkout [submit]", allow_redirects=False, catch_response=True) as response:
+            if response.headers.get("Location", "").rstrip("/").endswith("/checkout/success"):
+                response.success()
+            else:
+                # Остатка нет или цена изменилась — корзину очищаем, чтобы не копить её
+                response.failure(f"заказ не оформлен: {response.status_code} → {response.headers.get('Location')}")
+                self.csrf_post("/cart/clear/", name="cart [clear]")
 
     @task(2)
-    def view_catalog(self):
-        """Просмотр каталога"""
-        self.client.get("/api/products/")
+    def orders(self):
+        response = self.client.get("/orders/", name="orders")
+        order_ids = _ORDER_RE.findall(response.text) if response.ok else []
+        if order_ids:
+            self.client.get(f"/orders/{random.choice(order_ids)}/", name="orders [id]")
+
+    @task(3)
+    def browse(self):
+        self.client.get("/", name="catalog")
+
+
+class ManagerUser(ElShopUser):
+    """Менеджер: аналитика, выгрузки и импорт"""
+    weight = 1
+    wait_time = between(5, 15)
+
+    def on_start(self):
+        super().on_start()
+        if not self.login(MANAGER_USERNAME, MANAGER_PASSWORD):
+            raise RuntimeError(f"Не удалось войти как менеджер {MANAGER_USERNAME}")
+
+    @task(4)
+    def analytics(self):
+        self.client.get("/analytics/", name="analytics")
 
     @task(1)
-    def view_product(self):
-        """Просмотр конкретного товара"""
-        self.client.get("/api/products/1/")
+    def analytics_export(self):
+        self.client.get("/analytics/export/", name="analytics export")
 
     @task(1)
-    def create_order(self):
-        """Создание заказа"""
-        payload = {
-            "subtotal": 100,
-            "total": 100,
-            "status": "draft",
-        }
-        self.client.post("/api/orders/", json=payload)
+    def export_import_products(self):
+        # Выгружаем каталог и загружаем обратно первые строки — импорт идемпотентен (upsert по sku)
+        response = self.client.get("/export-products/", name="products export")
+        if not response.ok:
+            return
+        lines = response.content.split(b"\r\n")[:21]
+        self.csrf_post("/import-products/", name="products import", allow_redirects=False,
+                       files={"csv_file": ("products.csv", b"\r\n".join(lines), "text/csv")})
+
+
+class ApiUser(ElShopUser):
+    """Интегратор: выкачивает каталог по курсору, ищет, читает заказы"""
+    weight = 2
+
+    @task(3)
+    def products_pages(self):
+        response = self.client.get("/api/products/?fields=id,sku,name,base_price&page_size=100",
+                                   name="api products")
+        for _ in range(random.randint(1, 4)):
+            next_url = response.json().get("next") if response.ok else None
+            if not next_url:
+                break
+            response = self.client.get(next_url, name="api products [cursor]")
+
+    @task(2)
+    def products_search(self):
+        self.client.get("/api/products/", params={"q": random.choice(["samsung", "телевизор", "phone"])},
+                        name="api products [search]")
+
+    @task(3)
+    def product(self):
+        self.client.get(f"/api/products/{self.random_product()}/", name="api products [id]")
 
     @task(1)
-    def view_orders(self):
-        """Просмотр заказов"""
-        self.client.get("/api/orders/")
+    def orders(self):
+        self.client.get("/api/orders/?page_size=50", name="api orders")
+
+
+if os.environ.get("LOCUST_SHAPE"):
+    class ElShopLoadShape(LoadTestShape):
+        """Ступенчатый профиль нагрузки из SHAPES[LOCUST_SHAPE]"""
+        stages = SHAPES[os.environ["LOCUST_SHAPE"]]
+
+        def tick(self):
+            run_time = self.get_run_time()
+            for end, users, spawn_rate in self.stages:
+                if run_time < end:
+                    return users, spawn_rate
+            return None
+
+
+def build_slo_report(stats):
+    endpoints = []
+    for (name, method), entry in sorted(stats.entries.items()):
+        if not entry.num_requests:
+            continue
+        slo = SLOS.get(name, DEFAULT_SLO)
+        observed = {f"p{int(p * 100)}": entry.get_response_time_percentile(p) for p in (0.5, 0.95, 0.99)}
+        violations = [key for key, limit in slo.items() if observed[key] > limit]
+        endpoints.append({
+            "name": name,
+            "method": method,
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "rps": round(entry.total_rps, 2),
+            **observed,
+            "slo": slo,
+            "ok": not violations,
+            "violations": violations,
+        })
+    return {
+        "release": RELEASE,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "ok": all(e["ok"] for e in endpoints),
+        "endpoints": endpoints,
+    }
+
+
+@events.quitting.add_listener
+def write_slo_report(environment, **kwargs):
+    # В распределённом режиме отчёт пишет мастер — у него сводная статистика
+    if isinstance(environment.runner, WorkerRunner):
+        return
+    report = build_slo_report(environment.stats)
+    with open(SLO_REPORT, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for endpoint in report["endpoints"]:
+        if not endpoint["ok"]:
+            print(f"SLO нарушен: {endpoint['method']} {endpoint['name']} — "
+                  + ", ".join(f"{k}={endpoint[k]} > {endpoint['slo'][k]} мс" for k in endpoint["violations"]))
+    if not report["ok"]:
+        environment.process_exit_code = 1
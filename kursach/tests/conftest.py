@@ -0,0 +1,35 @@
+import importlib
+import pytest
+from django.db import connection
+
+# Тесты идут с --nomigrations: хранимые функции из RunSQL-миграций создаём отдельно
+SQL_MIGRATIONS = [
+    "0013_sp_checkout",
+    "0014_stock_reservation",
+    "0015_partitioned_audit_log",
+    "0016_product_search",
+    "0020_updated_at",
+    "0021_product_stock",
+    "0022_confirm_reservations",
+    "0023_audit_partitions_from_default",
+    "0024_product_tsquery_stable",
+    "0025_deferred_stock_totals",
+]
+
+# Миграции, которые переносят данные и не повторяются: пропускаются, если уже
+# применены к сохранённой (--reuse-db) тестовой базе
+APPLIED_CHECKS = {
+    "0015_partitioned_audit_log": "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'elshop_audit_log'::regclass",
+}
+
+
+@pytest.fixture(scope="session")
+def django_db_setup(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        with connection.cursor() as cursor:
+            for name in SQL_MIGRATIONS:
+                if name in APPLIED_CHECKS:
+                    cursor.execute(APPLIED_CHECKS[name])
+                    if cursor.fetchone():
+                        continue
+                cursor.execute(importlib.import_module(f"ElShop.migrations.{name}").SQL)
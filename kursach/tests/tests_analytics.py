@@ -0,0 +1,112 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from ElShop.models import Product, Customer, Order, OrderItem
+
+
+def _make_order(customer, product, quantity=1):
+    order = Order.objects.create(customer=customer, status="paid", subtotal=0, total=product.base_price * quantity)
+    OrderItem.objects.create(
+        order=order, product=product, unit_price=product.base_price,
+        quantity=quantity, discount=0, line_total=product.base_price * quantity,
+    )
+    return order
+
+
+def _export(client):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(reverse("export_analytics_csv"))
+        body = b"".join(response.streaming_content).decode("cp1251")
+    return response, body, len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_export_analytics_csv_streams_without_n_plus_one(client):
+    """Экспорт аналитики: потоковая выдача и постоянное число запросов"""
+    admin = User.objects.create_user(username="boss", password="12345", is_staff=True)
+    client.force_login(admin)
+    customer = Customer.objects.create(user=admin, email="boss@x.com", first_name="Иван", last_name="Тестов")
+    product = Product.objects.create(sku="EX1", name="Телевизор", base_price=1000)
+
+    _make_order(customer, product)
+    response, body, queries_one = _export(client)
+    assert response.streaming
+    assert response["Content-Type"] == "text/csv; charset=cp1251"
+    lines = body.splitlines()
+    assert lines[0].startswith("Дата заказа;ID заказа;")
+    assert "Иван Тестов" in lines[1] and "Телевизор" in lines[1]
+
+    for _ in range(5):
+        _make_order(customer, product, quantity=2)
+    _, body, queries_many = _export(client)
+    assert len(body.splitlines()) == 7
+    assert queries_many == queries_one
+
+
+def _live_analytics():
+    """Исходные запросы analytics_view по OrderItem/Order — эталон для агрегатов"""
+    from django.db.models import Sum
+    from django.db.models.functions import TruncDate
+    counted = ["paid", "shipped", "completed"]
+    items = OrderItem.objects.filter(order__status__in=counted)
+    categories = {
+        r["product__categories__name"]: r["s"]
+        for r in items.values("product__categories__name").annotate(s=Sum("quantity"))
+    }
+    daily = {
+        r["day"]: r["s"]
+        for r in Order.objects.filter(status__in=counted)
+        .annotate(day=TruncDate("created_at")).values("day").annotate(s=Sum("total"))
+    }
+    top = {r["product__name"]: r["s"] for r in items.values("product__name").annotate(s=Sum("quantity"))}
+    return categories, daily, top
+
+
+def _rollup_analytics():
+    from ElShop import rollups
+    categories = {r["product__categories__name"]: r["total_sold"] for r in rollups.category_sales()}
+    daily = {r["day"]: r["total"] for r in rollups.daily_revenue("2000-01-01", "2100-01-01")}
+    top = {r["product__name"]: r["total_sold"] for r in rollups.top_products(100)}
+    return categories, daily, top
+
+
+@pytest.mark.django_db
+def test_sales_rollup_matches_live_aggregation(client):
+    """Агрегаты продаж: совпадают с прямыми запросами при оплате, правке, отмене и удалении"""
+    from ElShop.models import Category
+    from ElShop.rollups import rebuild_rollups
+    user = User.objects.create_user(username="boss", password="12345", is_staff=True)
+    customer = Customer.objects.create(user=user, email="boss@x.com", first_name="Иван", last_name="Тестов")
+    tv = Product.objects.create(sku="TV", name="Телевизор", base_price=1000)
+    phone = Product.objects.create(sku="PH", name="Смартфон", base_price=300)
+    tv.categories.add(Category.objects.create(name="Телевизоры"), Category.objects.create(name="Техника"))
+
+    paid = _make_order(customer, tv, quantity=2)
+    OrderItem.objects.create(order=paid, product=phone, unit_price=300, quantity=1, discount=0, line_total=300)
+
+    draft = Order.objects.create(customer=customer, status="draft")
+    OrderItem.objects.create(order=draft, product=phone, unit_price=300, quantity=3, discount=0, line_total=900)
+    draft.status = "paid"
+    draft.total = 900
+    draft.save()
+
+    cancelled = _make_order(customer, tv, quantity=5)
+    cancelled.status = "cancelled"
+    cancelled.save()
+
+    line = draft.items.get()
+    line.quantity, line.line_total = 4, 1200
+    line.save()
+    _make_order(customer, phone).delete()
+
+    assert _rollup_analytics() == _live_analytics()
+
+    rebuild_rollups()
+    assert _rollup_analytics() == _live_analytics()
+
+    client.force_login(user)
+    response = client.get(reverse("analytics"))
+    assert response.context["top_labels"] == ["Смартфон", "Телевизор"]
+    assert response.context["top_data"] == [5, 2]
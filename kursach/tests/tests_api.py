@@ -31,8 +31,43 @@ class TestAPI:
         url = reverse('product-list')
         response = self.client.get(url)
         assert response.status_code == 200
-        assert len(response.data) >= 1
-        assert response.data[0]["name"] == "Samsung Smart TV"
+        assert len(response.data["results"]) >= 1
+        assert response.data["results"][0]["name"] == "Samsung Smart TV"
+
+    def test_products_cursor_pagination(self):
+        """API: курсорная пагинация по id, без пропусков и повторов"""
+        for i in range(4):
+            Product.objects.create(sku=f"SKU-P{i}", name=f"Товар {i}", base_price=100 + i)
+        url = reverse('product-list')
+        seen = []
+        response = self.client.get(url, {"page_size": 2})
+        while True:
+            assert response.status_code == 200
+            seen += [p["id"] for p in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        assert seen == sorted(Product.objects.values_list("id", flat=True), reverse=True)
+
+    def test_products_sparse_fields(self):
+        """API: параметр fields ограничивает набор полей в ответе"""
+        url = reverse('product-list')
+        response = self.client.get(url, {"fields": "id,sku,base_price"})
+        assert response.status_code == 200
+        assert set(response.data["results"][0]) == {"id", "sku", "base_price"}
+
+    def test_products_search(self):
+        """API: поиск ?q= по названию и описанию, на русском и английском, по релевантности"""
+        Product.objects.create(sku="TV-2", name="Телевизор LG", base_price=40000)
+        Product.objects.create(sku="PH-1", name="Смартфон", base_price=30000, description="Без телевизора")
+
+        response = self.client.get(reverse('product-list'), {"q": "телевизоры"})
+        assert response.status_code == 200
+        assert [p["sku"] for p in response.data["results"]] == ["TV-2", "SKU123", "PH-1"]
+
+        Product.objects.create(sku="HP-1", name="Wireless headphones", base_price=5000)
+        response = self.client.get(reverse('product-list'), {"q": "headphone"})
+        assert [p["sku"] for p in response.data["results"]] == ["HP-1"]
 
     def test_create_order(self):
         """API: создание заказа"""
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient, Client
+from ElShop.async_views import urlpatterns as async_urlpatterns
+from ElShop.models import Category, Customer, Order, OrderItem, Product
+from kursach.urls import urlpatterns as sync_urlpatterns
+
+# URLconf этого модуля: асинхронные view поверх обычных (как при ELSHOP_ASYNC_VIEWS = True)
+urlpatterns = async_urlpatterns + sync_urlpatterns
+
+
+@pytest.fixture
+def shop(django_user_model):
+    category = Category.objects.create(name="Телевизоры")
+    products = []
+    for i in range(5):
+        product = Product.objects.create(sku=f"A-{i}", name=f"Телевизор Samsung {i}", base_price=1000 + i)
+        product.categories.add(category)
+        products.append(product)
+    user = django_user_model.objects.create_user(username="async", password="12345")
+    customer = Customer.objects.create(user=user, email="a@x.com", first_name="A", last_name="B")
+    order = Order.objects.create(customer=customer, status="paid")
+    OrderItem.objects.create(order=order, product=products[0], unit_price=1000, quantity=2, line_total=2000)
+    return {"product": products[0], "order": order}
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+@pytest.mark.parametrize("url", [
+    "/api/products/?page_size=2",
+    "/api/products/?q=samsung&page_size=2",
+    "/api/products/?fields=id,name,categories",
+    "/api/products/{product}/",
+    "/api/products/0/",
+    "/api/products/abc/",
+    "/api/orders/",
+    "/api/orders/{order}/",
+])
+def test_async_api_matches_sync(shop, url):
+    """Асинхронные list/retrieve API отдают тот же ответ, что и DRF viewset"""
+    url = url.format(product=shop["product"].pk, order=shop["order"].pk)
+    sync = Client().get(url)
+    response = async_to_sync(AsyncClient().get)(url)
+    assert response.status_code == sync.status_code
+    assert response.content == sync.content
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_catalog_and_detail_pages(shop):
+    """Каталог и карточка товара через async ORM: те же товары, фасеты и 404"""
+    client = AsyncClient()
+    cache.clear()
+    page = async_to_sync(client.get)("/?q=samsung")
+    cached = async_to_sync(client.get)("/?q=samsung")
+    sync = Client().get("/?q=samsung")
+    for response in (page, cached):
+        assert response.status_code == 200
+        assert list(response.context["products"]) == list(sync.context["products"])
+        assert response.context["facets_total"] == sync.context["facets_total"] == 5
+    assert async_to_sync(client.get)("/?page=99").status_code == 404
+
+    detail = async_to_sync(client.get)(f"/product/{shop['product'].pk}/")
+    assert detail.status_code == 200 and detail.context["product"] == shop["product"]
+    assert async_to_sync(client.get)("/product/0/").status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_endpoint_delegates_writes_to_drf(shop):
+    """POST на адрес с асинхронным чтением обрабатывает синхронный viewset"""
+    response = async_to_sync(AsyncClient().post)(
+        "/api/products/", json.dumps({"sku": "NEW-1", "name": "Новый", "base_price": "10.00"}),
+        content_type="application/json",
+    )
+    assert response.status_code == 201
+    assert Product.objects.filter(sku="NEW-1").exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+@pytest.mark.parametrize("url", ["/api/products/?page_size=2", "/api/products/{product}/", "/api/orders/{order}/"])
+def test_async_api_conditional_get(shop, url):
+    """Асинхронные list/retrieve отдают тот же ETag и отвечают 304"""
+    url = url.format(product=shop["product"].pk, order=shop["order"].pk)
+    etag = Client().get(url)["ETag"]
+    client = AsyncClient()
+    assert async_to_sync(client.get)(url)["ETag"] == etag
+    response = async_to_sync(client.get)(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response["ETag"] == etag
@@ -0,0 +1,81 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from ElShop.management.commands.prune_audit_log import shift_months
+from ElShop.models import AuditLog, Product
+
+
+def _partition_of(log_id):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT tableoid::regclass::text FROM elshop_audit_log WHERE id = %s", [log_id])
+        row = cursor.fetchone()
+    return row and row[0]
+
+
+def _log(day):
+    # changed_at с auto_now_add — дату в прошлом или будущем ставим отдельным UPDATE
+    log, = AuditLog.objects.bulk_create([AuditLog(table_name="test", operation="INSERT")])
+    AuditLog.objects.filter(pk=log.pk).update(changed_at=datetime(day.year, day.month, 15, tzinfo=timezone.utc))
+    log.refresh_from_db()
+    return log
+
+
+def _ensure(start, end):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT ElShop_sp_audit_ensure_partitions(%s, %s)", [start, end])
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_audit_triggers_log_rows_and_diffs():
+    """Аудит: вставка — строка целиком, изменение — только изменённые столбцы, пустое изменение не пишется"""
+    product = Product.objects.create(sku="AU-1", name="Товар", base_price=10)
+    Product.objects.filter(pk=product.pk).update(base_price=12)
+    Product.objects.filter(pk=product.pk).update(name="Товар")  # без изменений
+    Product.objects.filter(pk=product.pk).delete()
+
+    rows = list(AuditLog.objects.filter(table_name="elshop_product").order_by("id")
+                .values_list("operation", "row_data"))
+    assert [operation for operation, _ in rows] == ["INSERT", "UPDATE", "DELETE"]
+    assert rows[0][1]["sku"] == "AU-1" and rows[2][1]["sku"] == "AU-1"
+    assert rows[1][1]["id"] == product.pk and rows[1][1]["base_price"] == 12
+    assert "name" not in rows[1][1] and "sku" not in rows[1][1]
+
+
+@pytest.mark.django_db
+def test_ensure_partitions_moves_rows_out_of_default():
+    """Месяц, строки которого уже в DEFAULT, получает партицию вместе со своими строками; старые удаляются"""
+    january, february = date(2001, 1, 1), date(2001, 2, 1)
+    log = _log(january)
+    assert _partition_of(log.pk) == "elshop_audit_log_default"
+
+    assert _ensure(january, february) == 2
+    assert _partition_of(log.pk) == "elshop_audit_log_y2001m01"
+    assert _ensure(january, february) == 0
+    assert _partition_of(_log(february).pk) == "elshop_audit_log_y2001m02"
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM ElShop_sp_audit_drop_partitions(%s)", [date(2001, 2, 1)])
+        assert [row[0] for row in cursor.fetchall()] == ["elshop_audit_log_y2001m01"]
+    assert not AuditLog.objects.filter(pk=log.pk).exists()
+
+
+@pytest.mark.django_db
+def test_prune_audit_log_command(capsys):
+    """prune_audit_log: создаёт партиции вперёд (и для строк, попавших в DEFAULT), удаляет старше срока"""
+    this_month = date.today().replace(day=1)
+    ahead = _log(shift_months(this_month, 5))
+    old_month = shift_months(this_month, -14)
+    _ensure(old_month, old_month)
+    old = _log(old_month)
+
+    call_command("prune_audit_log", "--keep-months", "12", "--months-ahead", "6")
+    output = capsys.readouterr().out
+    assert f"удалена elshop_audit_log_y{old_month:%Y}m{old_month:%m}" in output
+    assert not AuditLog.objects.filter(pk=old.pk).exists()
+    assert _partition_of(ahead.pk) == f"elshop_audit_log_y{ahead.changed_at:%Y}m{ahead.changed_at:%m}"
+
+    call_command("prune_audit_log", "--months-ahead", "6", "--dry-run")
+    assert "Создано партиций: 0" in capsys.readouterr().out
@@ -0,0 +1,75 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ElShop.batch import ProductBatch
+from ElShop.models import Category, Product
+
+
+@pytest.mark.django_db
+def test_batch_upsert_returns_per_item_results():
+    """POST batch/: создание и изменение по sku, неизменённые строки не пишутся, ошибки — по строкам"""
+    tv = Category.objects.create(name="Телевизоры")
+    old = Category.objects.create(name="Старое")
+    changed = Product.objects.create(sku="B-1", name="Телевизор", base_price=100)
+    changed.categories.add(old)
+    same = Product.objects.create(sku="B-2", name="Смартфон", base_price=50)
+    same_updated_at = Product.objects.values_list("updated_at", flat=True).get(pk=same.pk)
+
+    response = APIClient().post(reverse("product-batch"), [
+        {"sku": "B-1", "base_price": "120.50", "categories": [tv.pk]},
+        {"sku": "B-2", "name": "Смартфон", "base_price": "50.00"},
+        {"sku": "B-3", "name": "Наушники", "base_price": "10", "description": None, "categories": [tv.pk]},
+        {"sku": "B-4", "base_price": "-1"},
+        {"sku": "B-5", "name": "Без цены"},
+        {"sku": "B-6", "name": "Колонка", "base_price": "5", "categories": [0]},
+        {"sku": "B-1", "name": "Повтор"},
+        {"sku": "B-7", "name": "Товар", "base_price": "1", "image": "x.png"},
+        "не объект",
+    ], format="json")
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == [
+        "updated", "unchanged", "created", "error", "error", "error", "error", "error", "error",
+    ]
+    assert (data["created"], data["updated"], data["unchanged"], data["error"]) == (1, 1, 1, 6)
+    assert data["results"][3]["errors"] == {"base_price": ["Цена не может быть отрицательной"]}
+    assert "base_price" in data["results"][4]["errors"] and "categories" in data["results"][5]["errors"]
+    assert "image" in data["results"][7]["errors"]
+
+    changed.refresh_from_db()
+    assert changed.base_price == Decimal("120.50") and changed.name == "Телевизор"
+    assert list(changed.categories.all()) == [tv]
+    created = Product.objects.get(sku="B-3")
+    assert data["results"][2]["id"] == created.pk and list(created.categories.all()) == [tv]
+    assert Product.objects.values_list("updated_at", flat=True).get(pk=same.pk) == same_updated_at
+    assert not Product.objects.filter(sku__in=["B-4", "B-5", "B-6", "B-7"]).exists()
+
+
+@pytest.mark.django_db
+def test_batch_ndjson_patch_in_chunks():
+    """PATCH batch/ NDJSON: только существующие товары, битая строка — ошибка строки; запросы — на пачку"""
+    products = Product.objects.bulk_create([Product(sku=f"N-{i}", name=f"Товар {i}", base_price=10) for i in range(6)])
+    lines = [json.dumps({"sku": p.sku, "base_price": "11"}) for p in products]
+    lines += ["{oops", '{"sku": "N-X", "active": false}']
+    response = APIClient().generic("PATCH", reverse("product-batch"), "\n".join(lines).encode(),
+                                   content_type="application/x-ndjson")
+    assert response.status_code == 200
+    statuses = [r["status"] for r in response.json()["results"]]
+    assert statuses == ["updated"] * 6 + ["error", "error"]
+    assert set(Product.objects.values_list("base_price", flat=True)) == {Decimal("11.00")}
+    assert not Product.objects.filter(sku="N-X").exists()
+
+    def queries(count, chunk_size):
+        rows = [{"sku": p.sku, "name": f"Товар {count}-{chunk_size}"} for p in products[:count]]
+        with CaptureQueriesContext(connection) as ctx:
+            result = ProductBatch(chunk_size=chunk_size).run(rows)
+        assert result.counts["updated"] == count
+        return len(ctx.captured_queries)
+
+    assert queries(2, 100) == queries(6, 100)
+    assert queries(6, 2) == 3 * queries(2, 100)  # пачка — своя транзакция и те же запросы
@@ -1,7 +1,7 @@
 import pytest
 from django.urls import reverse
 from django.contrib.auth.models import User
-from ElShop.models import Product, Customer, Order
+from ElShop.models import Product, Customer, Order, CartLine
 
 
 @pytest.mark.django_db
@@ -17,12 +17,244 @@ def test_add_to_cart_and_checkout(client):
     assert response.status_code == 302
 
     # Проверка содержимого корзины
-    cart = client.session["cart"]
-    assert str(product.id) in cart
-    assert cart[str(product.id)]["quantity"] == 1
+    assert CartLine.objects.get(user=user, product=product).quantity == 1
 
     # Оформление заказа
     checkout_url = reverse("checkout")
     response = client.post(checkout_url)
     assert response.status_code == 302  # редирект на success
-    assert Order.objects.filter(customer=customer).exists()
\ No newline at end of file
+    assert Order.objects.filter(customer=customer).exists()
+
+def _stock(*products, quantity=10):
+    from ElShop.models import Warehouse, Inventory
+    warehouse, _ = Warehouse.objects.get_or_create(name="Основной склад")
+    for product in products:
+        Inventory.objects.create(product=product, warehouse=warehouse, quantity=quantity)
+
+
+@pytest.mark.django_db
+def test_checkout_via_db_function(client):
+    from ElShop.models import OrderItem, Payment, SalesRollup
+    user = User.objects.create_user(username="demo", password="12345")
+    client.login(username="demo", password="12345")
+    customer = Customer.objects.create(user=user, email="demo@x.com", first_name="Demo", last_name="User")
+    tv = Product.objects.create(sku="T1", name="Телевизор", base_price=5000)
+    phone = Product.objects.create(sku="T2", name="Телефон", base_price="199.90")
+    _stock(tv, phone)
+
+    client.post(reverse("add_to_cart", args=[tv.id]))
+    client.post(reverse("add_to_cart", args=[phone.id]))
+    client.post(reverse("add_to_cart", args=[phone.id]))
+    response = client.post(reverse("checkout"), {
+        "line1": "ул. Пушкина, 10", "city": "Москва", "country": "Россия", "payment_method": "mir",
+    })
+    assert response.status_code == 302
+    assert response.url == reverse("checkout_success")
+
+    order = Order.objects.get(customer=customer)
+    assert order.status == "paid"
+    assert str(order.total) == "5399.80"
+    assert {(i.product_id, i.quantity) for i in OrderItem.objects.filter(order=order)} == {(tv.id, 1), (phone.id, 2)}
+    assert Payment.objects.get(order=order).method == "mir"
+    assert SalesRollup.objects.get(product=phone).quantity == 2
+    assert not CartLine.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db
+def test_checkout_rejects_changed_prices(client):
+    user = User.objects.create_user(username="demo", password="12345")
+    client.login(username="demo", password="12345")
+    Customer.objects.create(user=user, email="demo@x.com", first_name="Demo", last_name="User")
+    product = Product.objects.create(sku="T1", name="Тест товар", base_price=5000)
+    _stock(product)
+
+    client.post(reverse("add_to_cart", args=[product.id]))
+    product.base_price = 5500
+    product.save()
+    response = client.post(reverse("checkout"), {"line1": "ул. Пушкина, 10", "city": "Москва", "country": "Россия"})
+
+    assert response.url == reverse("cart")
+    assert not Order.objects.exists()
+    # Строка осталась, но уже по новой цене — повторное оформление проходит
+    assert CartLine.objects.get(user=user, product=product).unit_price == 5500
+    assert "Тест товар" in str(list(client.get(reverse("cart")).context["messages"])[0])
+
+    response = client.post(reverse("checkout"), {"line1": "ул. Пушкина, 10", "city": "Москва", "country": "Россия"})
+    assert response.url == reverse("checkout_success")
+    assert str(Order.objects.get().total) == "5500.00"
+
+
+@pytest.mark.django_db
+def test_checkout_reserves_stock_and_releases_on_cancel(client):
+    from ElShop.models import Warehouse, Inventory, StockReservation
+    user = User.objects.create_user(username="demo", password="12345")
+    client.login(username="demo", password="12345")
+    customer = Customer.objects.create(user=user, email="demo@x.com", first_name="Demo", last_name="User")
+    product = Product.objects.create(sku="T1", name="Тест товар", base_price=5000)
+    first = Inventory.objects.create(product=product, warehouse=Warehouse.objects.create(name="Склад 1"), quantity=1)
+    second = Inventory.objects.create(product=product, warehouse=Warehouse.objects.create(name="Склад 2"), quantity=1)
+    address = {"line1": "ул. Пушкина, 10", "city": "Москва", "country": "Россия"}
+
+    # 2 шт. не помещаются ни на один склад — резерв делится между складами
+    client.post(reverse("add_to_cart", args=[product.id]))
+    client.post(reverse("add_to_cart", args=[product.id]))
+    client.post(reverse("checkout"), address)
+    order = Order.objects.get(customer=customer)
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.reserved, second.reserved) == (1, 1)
+
+    # Остатка больше нет — заказ не оформляется
+    client.post(reverse("add_to_cart", args=[product.id]))
+    response = client.post(reverse("checkout"), address)
+    assert response.url == reverse("cart")
+    assert Order.objects.count() == 1
+
+    order.status = "cancelled"
+    order.save()
+    assert set(Inventory.objects.values_list("reserved", flat=True)) == {0}
+    assert set(StockReservation.objects.values_list("status", flat=True)) == {"released"}
+
+
+@pytest.mark.django_db
+def test_draft_order_holds_stock_until_expiry_or_payment(capsys):
+    """Черновик заказа удерживает товар на срок; просроченный резерв снимается, оплата резервирует бессрочно"""
+    from datetime import timedelta
+    from django.core.management import call_command
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from ElShop.models import Warehouse, Inventory, StockReservation
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(username="api", password="12345"))
+    product = Product.objects.create(sku="H1", name="Товар", base_price=10)
+    stock = Inventory.objects.create(product=product, warehouse=Warehouse.objects.create(name="Склад"), quantity=3)
+
+    def draft(quantity):
+        return client.post(reverse("order-list"), {
+            "status": "draft", "subtotal": "0", "tax": "0", "shipping_cost": "0", "total": "0",
+            "items": [{"product": product.pk, "unit_price": "10", "quantity": quantity, "line_total": "0"}],
+        }, format="json")
+
+    def reserved():
+        stock.refresh_from_db()
+        return stock.reserved
+
+    stale, fresh = draft(2).data["id"], draft(1).data["id"]
+    assert reserved() == 3
+    assert draft(1).status_code == 400  # свободного остатка нет
+    held = StockReservation.objects.get(order_id=stale)
+    assert held.status == "active" and held.expires_at > timezone.now()
+
+    # Срок вышел — резерв снимается командой, товар снова свободен
+    StockReservation.objects.filter(pk=held.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+    call_command("expire_reservations")
+    assert "Снято просроченных резервов: 1" in capsys.readouterr().out
+    assert reserved() == 1 and StockReservation.objects.get(pk=held.pk).status == "released"
+
+    # Оплата вовремя — тот же резерв без срока; после истечения — резерв заново
+    for order_id in (fresh, stale):
+        assert client.patch(reverse("order-detail", args=[order_id]), {"status": "paid"}, format="json").status_code == 200
+        active = StockReservation.objects.get(order_id=order_id, status="active")
+        assert active.expires_at is None
+    assert reserved() == 3
+    call_command("expire_reservations")
+    assert "Снято просроченных резервов: 0" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("store", ["db", "cache"])
+def test_cart_store_line_operations(client, settings, store):
+    """Корзина: добавление, изменение и удаление строк в хранилищах db и cache, деньги — Decimal"""
+    from decimal import Decimal
+    from django.core.cache import cache
+    from django.test import RequestFactory
+    from ElShop.carts import get_cart_store
+    cache.clear()
+    settings.ELSHOP_CART_STORE = store
+    user = User.objects.create_user(username="demo", password="12345")
+    client.login(username="demo", password="12345")
+    tv = Product.objects.create(sku="T1", name="Телевизор", base_price="4999.99")
+    phone = Product.objects.create(sku="T2", name="Телефон", base_price="0.10")
+
+    for product in (tv, phone, phone, phone):
+        client.post(reverse("add_to_cart", args=[product.id]))
+    cart = client.get(reverse("cart")).context["cart"]
+    assert list(cart) == [str(tv.id), str(phone.id)]
+    assert cart[str(phone.id)]["quantity"] == 3
+    assert cart[str(phone.id)]["line_total"] == Decimal("0.30")
+
+    client.post(reverse("update_cart"), {f"quantity_{tv.id}": "2", f"quantity_{phone.id}": "0"})
+    response = client.get(reverse("cart"))
+    assert {pid: item["quantity"] for pid, item in response.context["cart"].items()} == {str(tv.id): 2}
+    assert response.context["total"] == Decimal("9999.98")
+
+    # Пересчёт по текущим ценам (после отказа оформления из-за цен)
+    Product.objects.filter(pk=tv.pk).update(base_price="4500.00")
+    request = RequestFactory().get("/")
+    request.user = user
+    assert get_cart_store(request).reprice() == ["Телевизор"]
+    assert get_cart_store(request).reprice() == []
+    assert client.get(reverse("cart")).context["total"] == Decimal("9000.00")
+
+    # Удалённый и снова добавленный товар встаёт в конец; слоты кэша не копятся
+    client.post(reverse("add_to_cart", args=[phone.id]))
+    for _ in range(3):
+        client.post(reverse("update_cart"), {f"quantity_{tv.id}": "0"})
+        client.post(reverse("add_to_cart", args=[tv.id]))
+    assert list(client.get(reverse("cart")).context["cart"]) == [str(phone.id), str(tv.id)]
+    if store == "cache":  # просмотр начинается со слота первой живой строки
+        assert cache.get(f"cart:{user.pk}:head") == cache.get(f"cart:{user.pk}:pos:{phone.id}")
+
+    client.post(reverse("clear_cart"))
+    assert client.get(reverse("cart")).context["cart"] == {}
+
+
+
+def _before(monkeypatch, method, action):
+    """Перед первым cache.<method> в ElShop.carts выполняет action — «параллельный» запрос"""
+    from ElShop import carts
+    real = carts.cache
+
+    class Interleaved:
+        def __getattr__(self, name):
+            return getattr(real, name)
+
+    def hooked(*args, **kwargs):
+        monkeypatch.setattr(carts, "cache", real)
+        action()
+        return getattr(real, method)(*args, **kwargs)
+
+    interleaved = Interleaved()
+    setattr(interleaved, method, hooked)
+    monkeypatch.setattr(carts, "cache", interleaved)
+
+
+@pytest.mark.django_db
+def test_cache_cart_concurrent_add_with_remove_and_clear(monkeypatch):
+    """Корзина в кэше: добавление посреди удаления или очистки не теряет строку"""
+    from django.core.cache import cache
+    from django.test import RequestFactory
+    from ElShop.carts import CacheCartStore
+    cache.clear()
+    request = RequestFactory().get("/")
+    request.user = User.objects.create_user(username="race", password="12345")
+    store = CacheCartStore(request)
+    a, b, c, d, e = [Product.objects.create(sku=f"R{i}", name=f"Товар {i}", base_price=10) for i in range(5)]
+    store.add(a)
+    store.add(b)
+
+    _before(monkeypatch, "delete_many", lambda: store.add(c))
+    store.remove(a.id)
+    assert list(store.lines()) == [str(b.id), str(c.id)]
+
+    # add занял слот, но ещё не записал его, когда пришла очистка
+    key = f"cart:{request.user.pk}"
+    cache.add(f"{key}:line:{d.id}", {"name": d.name, "price": "10"})
+    slot = cache.incr(f"{key}:slots")
+    _before(monkeypatch, "delete_many", lambda: store.add(e))
+    store.clear()
+    cache.set(f"{key}:pos:{d.id}", slot)
+    cache.set(f"{key}:slot:{slot}", str(d.id))
+    cache.set(f"{key}:qty:{d.id}", 1)
+    assert list(store.lines()) == [str(d.id), str(e.id)]
+    cache.clear()
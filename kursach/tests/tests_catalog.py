@@ -0,0 +1,102 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ElShop.models import Product, Category
+from ElShop import catalog_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def _get_catalog(client, **params):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(reverse("catalog"), params)
+    return response, len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_catalog_is_cached_per_filter_state(client):
+    """Каталог: повторный запрос с теми же фильтрами обслуживается из кэша"""
+    tv = Category.objects.create(name="Телевизоры")
+    product = Product.objects.create(sku="TV-1", name="Телевизор", base_price=1000)
+    product.categories.add(tv)
+    Product.objects.create(sku="PH-1", name="Смартфон", base_price=300)
+
+    response, cold = _get_catalog(client, category=tv.id, min_price="500")
+    assert [p.sku for p in response.context["products"]] == ["TV-1"]
+
+    response, warm = _get_catalog(client, category=tv.id, min_price="500.00")
+    assert [p.sku for p in response.context["products"]] == ["TV-1"]
+    assert warm == 1 < cold  # из БД — только свежие остатки товаров страницы
+    assert catalog_cache.stats()["hits"] == 3  # страница, список категорий и фасеты
+
+
+@pytest.mark.django_db
+def test_catalog_cache_invalidated_on_product_change(client):
+    """Каталог: изменение товара увеличивает версию и сбрасывает кэш"""
+    product = Product.objects.create(sku="TV-1", name="Телевизор", base_price=1000)
+    _get_catalog(client)
+    version = catalog_cache.get_version()
+
+    product.name = "Новый телевизор"
+    product.save()
+    assert catalog_cache.get_version() > version
+
+    response, _ = _get_catalog(client)
+    assert response.context["products"][0].name == "Новый телевизор"
+
+
+@pytest.mark.django_db
+def test_catalog_search_combines_with_filters(client):
+    """Каталог: поиск q сочетается с фильтрами по категории и цене"""
+    tv = Category.objects.create(name="Телевизоры")
+    cheap = Product.objects.create(sku="TV-1", name="Телевизор Samsung", base_price=1000)
+    expensive = Product.objects.create(sku="TV-2", name="Телевизор LG", base_price=5000)
+    cheap.categories.add(tv)
+    expensive.categories.add(tv)
+    Product.objects.create(sku="PH-1", name="Смартфон Samsung", base_price=800)
+
+    response, _ = _get_catalog(client, q="samsung")
+    assert {p.sku for p in response.context["products"]} == {"TV-1", "PH-1"}
+
+    response, _ = _get_catalog(client, q="телевизоры", category=tv.id, max_price="2000")
+    assert [p.sku for p in response.context["products"]] == ["TV-1"]
+    assert response.context["q"] == "телевизоры"
+
+
+@pytest.mark.django_db
+def test_catalog_facets(client):
+    """Каталог: счётчики категорий и гистограмма цен одним запросом"""
+    tv = Category.objects.create(name="Телевизоры")
+    phones = Category.objects.create(name="Смартфоны")
+    Category.objects.create(name="Пустая")
+    for sku, price, category in (("TV-1", 40000, tv), ("TV-2", 70000, tv), ("PH-1", 500, phones)):
+        Product.objects.create(sku=sku, name=sku, base_price=price).categories.add(category)
+    Product.objects.create(sku="OLD", name="OLD", base_price=100, active=False)
+
+    response, _ = _get_catalog(client)
+    counts = {f["category"].name: f["count"] for f in response.context["category_facets"]}
+    assert counts == {"Телевизоры": 2, "Смартфоны": 1, "Пустая": 0}
+    assert response.context["facets_total"] == 3
+    prices = [b["count"] for b in response.context["price_facets"]]
+    assert prices == [1, 0, 0, 0, 1, 1, 0]
+
+    # Категория не сужает свои счётчики, а диапазон цен — гистограмму
+    response, _ = _get_catalog(client, category=tv.id, min_price="60000")
+    counts = {f["category"].name: f["count"] for f in response.context["category_facets"]}
+    assert counts == {"Телевизоры": 1, "Смартфоны": 0, "Пустая": 0}
+    assert [b["count"] for b in response.context["price_facets"]] == [0, 0, 0, 0, 1, 1, 0]
+    assert response.context["price_facets"][4]["query"] == f"category={tv.id}&min_price=30000&max_price=59999.99"
+
+    # С фасетами каталог стоит не больше одного дополнительного запроса
+    cache.clear()
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(reverse("catalog"))
+    facet_queries = [q for q in ctx.captured_queries if "width_bucket" in q["sql"]]
+    assert response.status_code == 200 and len(facet_queries) == 1
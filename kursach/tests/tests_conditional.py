@@ -0,0 +1,109 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ElShop.importers import ProductImporter
+from ElShop.models import Category, Order, OrderItem, Product, Supplier, ProductSupplier
+
+
+def _updated(model, pk):
+    return model.objects.values_list("updated_at", flat=True).get(pk=pk)
+
+
+@pytest.mark.django_db
+def test_updated_at_maintained_on_every_write_path():
+    """updated_at ставит БД: save, update(), связи, строки заказа; пустые изменения его не трогают"""
+    product = Product.objects.create(sku="U-1", name="Товар", base_price=10)
+    created = _updated(Product, product.pk)
+    assert product.updated_at == created  # значение по умолчанию вернулось из INSERT
+
+    product.save()
+    Product.objects.filter(pk=product.pk).update(active=True)
+    assert _updated(Product, product.pk) == created
+
+    steps = [
+        lambda: Product.objects.filter(pk=product.pk).update(base_price=11),
+        lambda: product.categories.add(Category.objects.create(name="Кат")),
+        lambda: ProductSupplier.objects.create(product=product, supplier=Supplier.objects.create(name="Пост")),
+        lambda: product.categories.clear(),
+        lambda: ProductImporter(chunk_size=10).run(iter(["ID;Название;Цена", "U-1;Новое имя;12"])),
+    ]
+    last = created
+    for step in steps:
+        step()
+        current = _updated(Product, product.pk)
+        assert current > last
+        last = current
+
+    order = Order.objects.create(status="draft")
+    before = _updated(Order, order.pk)
+    OrderItem.objects.create(order=order, product=product, unit_price=12, quantity=1, line_total=12)
+    assert _updated(Order, order.pk) > before
+
+
+@pytest.mark.django_db
+def test_api_conditional_get():
+    """API: 304 по If-None-Match/If-Modified-Since одним запросом валидатора, новый ETag после изменений"""
+    client = APIClient()
+    products = [Product.objects.create(sku=f"C-{i}", name=f"Товар {i}", base_price=10 + i) for i in range(3)]
+    detail = reverse("product-detail", args=[products[0].pk])
+    listing = reverse("product-list") + "?page_size=2"
+
+    for url in (detail, listing):
+        response = client.get(url)
+        etag = response["ETag"]
+        assert response.status_code == 200 and response["Cache-Control"] == "no-cache"
+        with CaptureQueriesContext(connection) as queries:
+            cached = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert cached.status_code == 304 and cached.content == b"" and cached["ETag"] == etag
+        assert len(queries) == 1
+        assert client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code == 304
+        assert client.get(url + ("&" if "?" in url else "?") + "fields=id,name", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    etag = client.get(listing)["ETag"]
+    products[2].categories.add(Category.objects.create(name="Новая"))
+    changed = client.get(listing, HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200 and changed["ETag"] != etag
+
+    # Удаление строки со страницы меняет список, даже если остальные строки не менялись
+    etag = changed["ETag"]
+    products[1].delete()
+    assert client.get(listing, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    assert client.get(reverse("product-detail", args=[0])).status_code == 404
+
+
+@pytest.mark.django_db
+def test_order_api_etag_follows_items():
+    """ETag заказа меняется при изменении его строк"""
+    client = APIClient()
+    product = Product.objects.create(sku="O-1", name="Товар", base_price=10)
+    order = Order.objects.create(status="paid")
+    item = OrderItem.objects.create(order=order, product=product, unit_price=10, quantity=1, line_total=10)
+    url = reverse("order-detail", args=[order.pk])
+
+    etag = client.get(url)["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    OrderItem.objects.filter(pk=item.pk).update(quantity=2, line_total=20)
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response.json()["items"][0]["quantity"] == 2
+
+
+@pytest.mark.django_db
+def test_product_page_etag_is_per_user(client, django_user_model):
+    """Страница товара: 304 для того же пользователя, смена темы или пользователя — новая страница"""
+    product = Product.objects.create(sku="H-1", name="Телевизор", base_price=1000)
+    django_user_model.objects.create_user(username="etag", password="12345")
+    client.login(username="etag", password="12345")
+    url = reverse("product_detail", args=[product.pk])
+
+    client.get(url)  # выдаёт CSRF-cookie, она входит в ETag
+    response = client.get(url)
+    assert response["Cache-Control"] == "no-cache, private"
+    assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+    client.post(reverse("toggle_theme"))
+    assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
+
+    client.logout()
+    assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
@@ -0,0 +1,49 @@
+import pytest
+from django.db import transaction
+from django.db.models import F, Sum
+from ElShop.datagen import DataGenerator, Scale
+from ElShop.models import Product, Order, OrderItem, Inventory, StockReservation, DailyRevenueRollup, Category
+
+SCALE = Scale(categories=100, suppliers=5, warehouses=3, products=60, customers=20, orders=80, lines_per_order=3)
+
+
+def generate(seed):
+    """Генерирует данные, снимает «отпечаток» и откатывает транзакцию"""
+    with transaction.atomic():
+        counts = DataGenerator(SCALE, seed=seed, batch_size=25).run()
+        snapshot = (
+            list(Product.objects.order_by("id").values_list("sku", "name", "base_price")),
+            list(OrderItem.objects.order_by("id").values_list("order_id", "product_id", "quantity", "line_total")),
+        )
+        transaction.set_rollback(True)
+    return counts, snapshot
+
+
+@pytest.mark.django_db
+def test_generate_data_is_deterministic():
+    """Генератор: одно зерно — одинаковые данные, другое зерно — другие"""
+    counts, first = generate(seed=1)
+    assert counts["elshop_product"] == 60 and counts["elshop_order"] == 80
+    assert generate(seed=1)[1] == first
+    assert generate(seed=2)[1] != first
+
+
+@pytest.mark.django_db
+def test_generated_data_is_consistent():
+    """Генератор: суммы заказов, резервы, агрегаты и дерево категорий согласованы"""
+    DataGenerator(SCALE, seed=3, batch_size=25).run()
+
+    assert not OrderItem.objects.exclude(line_total=F("unit_price") * F("quantity") - F("discount")).exists()
+    for order in Order.objects.annotate(lines=Sum("items__line_total")):
+        assert order.subtotal == order.total == order.lines
+    reserved = StockReservation.objects.filter(status="active").aggregate(n=Sum("quantity"))["n"] or 0
+    assert Inventory.objects.aggregate(n=Sum("reserved"))["n"] == reserved
+    assert not Inventory.objects.filter(reserved__gt=F("quantity")).exists()
+    paid = Order.objects.filter(status__in=["paid", "shipped", "completed"])
+    assert DailyRevenueRollup.objects.aggregate(n=Sum("orders"))["n"] == paid.count()
+    assert Category.objects.filter(parent__isnull=True).count() == 10
+    assert Category.objects.filter(parent__parent__isnull=False).exists()
+
+    # Последовательности выставлены — обычная вставка не конфликтует с явными id
+    last_id = Product.objects.order_by("-pk").values_list("pk", flat=True)[0]
+    assert Product.objects.create(sku="AFTER-GEN", name="Товар", base_price=1).pk > last_id
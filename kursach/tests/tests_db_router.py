@@ -0,0 +1,105 @@
+import pytest
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ElShop.db_router import PIN_COOKIE
+from ElShop.models import Category, Customer, Inventory, Order, Product, Warehouse
+
+# Реплика — второй алиас на ту же тестовую базу, как при ELSHOP_DB_REPLICA_HOSTS=127.0.0.1
+REPLICA = "replica_test"
+
+
+@pytest.fixture(scope="module")
+def replica(django_db_setup, django_db_blocker):
+    connections.settings[REPLICA] = dict(
+        connections["default"].settings_dict, TEST=dict(connections["default"].settings_dict["TEST"], MIRROR="default"),
+    )
+    try:
+        with override_settings(ELSHOP_DB_REPLICAS=[REPLICA]):
+            yield REPLICA
+    finally:
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+
+@pytest.fixture
+def shop(replica, django_user_model):
+    user = django_user_model.objects.create_user(username="replica", password="12345")
+    Customer.objects.create(user=user, email="r@x.com", first_name="R", last_name="R")
+    category = Category.objects.create(name="Ноутбуки")
+    warehouse = Warehouse.objects.create(name="Основной")
+    product = Product.objects.create(sku="R-1", name="Ноутбук", base_price=1000)
+    product.categories.add(category)
+    Inventory.objects.create(product=product, warehouse=warehouse, quantity=10)
+    client = Client()
+    client.login(username="replica", password="12345")
+    return {"client": client, "product": product}
+
+
+def _reads(alias, request):
+    with CaptureQueriesContext(connections[alias]) as queries:
+        response = request()
+    return response, [q["sql"] for q in queries.captured_queries]
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", REPLICA])
+def test_reads_go_to_replica_until_user_writes(shop):
+    """Каталог и заказы читаются с реплики; после оформления заказа — с основной базы"""
+    client = shop["client"]
+    response, replica_sql = _reads(REPLICA, lambda: client.get(reverse("product_detail", args=[shop["product"].pk])))
+    assert response.status_code == 200 and replica_sql
+    assert all("django_session" not in sql and "auth_user" not in sql for sql in replica_sql)
+
+    response, replica_sql = _reads(REPLICA, lambda: client.get("/api/orders/"))
+    assert response.status_code == 200 and replica_sql
+
+    # Запись не читает с реплики и закрепляет клиента за основной базой
+    client.post(reverse("add_to_cart", args=[shop["product"].pk]))
+    response, replica_sql = _reads(REPLICA, lambda: client.post(reverse("checkout"), {
+        "line1": "ул. Пушкина, 10", "city": "Москва", "country": "Россия", "payment_method": "card",
+    }))
+    assert response.url == reverse("checkout_success") and replica_sql == []
+    assert response.cookies[PIN_COOKIE]["max-age"] == 10
+    assert Order.objects.count() == 1
+
+    response, replica_sql = _reads(REPLICA, lambda: client.get(reverse("order_history")))
+    assert response.status_code == 200 and replica_sql == []
+    assert len(response.context["orders"]) == 1
+
+    # Окно закрепления прошло (cookie истекла) — снова реплика
+    del client.cookies[PIN_COOKIE]
+    response, replica_sql = _reads(REPLICA, lambda: client.get(reverse("order_history")))
+    assert response.status_code == 200 and replica_sql
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", REPLICA])
+def test_profile_update_pins_to_primary(shop):
+    """Сохранение профиля закрепляет клиента за основной базой"""
+    client = shop["client"]
+    response = client.post(reverse("profile"), {
+        "update_customer": "1", "first_name": "Новое", "last_name": "Имя", "phone": "", "email": "n@x.com",
+    })
+    assert response.status_code == 302
+    assert PIN_COOKIE in response.cookies
+
+    response, replica_sql = _reads(REPLICA, lambda: client.get(reverse("catalog")))
+    assert response.status_code == 200 and replica_sql == []
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", REPLICA])
+def test_catalog_cache_is_filled_from_primary(shop):
+    """Каталог: то, что ложится в кэш, читается с основной базы; с реплики — только свежие остатки"""
+    from django.core.cache import cache
+    cache.clear()
+    client = Client()
+    response, replica_sql = _reads(REPLICA, lambda: client.get(reverse("catalog")))
+    assert response.status_code == 200
+    assert [p.sku for p in response.context["products"]] == ["R-1"]
+    assert len(replica_sql) == 1 and "elshop_product_stock" in replica_sql[0]
+
+    # Повторный запрос — страница из кэша, в базы идёт только запрос остатков
+    response, primary_sql = _reads("default", lambda: client.get(reverse("catalog")))
+    assert not any("FROM \"elshop_product\"" in sql for sql in primary_sql)
+    cache.clear()
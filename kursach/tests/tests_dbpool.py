@@ -0,0 +1,122 @@
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.test import Client
+from ElShop import dbpool
+from ElShop.audit import audit_user_wrapper, current_request
+
+DATABASE = {"ENGINE": "django.db.backends.postgresql", "NAME": "shop", "OPTIONS": {"sslmode": "disable"}}
+
+AUDIT_TRIGGER = """
+CREATE TABLE test_audit_user (changed_by text);
+CREATE FUNCTION test_fn_audit_user() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO test_audit_user VALUES (current_setting('app.current_user', true));
+    RETURN NULL;
+END $$;
+CREATE TRIGGER test_trg_audit_user AFTER INSERT OR UPDATE ON elshop_user_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION test_fn_audit_user();
+"""
+
+
+def test_configure_modes():
+    """Режимы соединений дописывают свои параметры и не трогают исходный словарь"""
+    off = dbpool.configure(DATABASE, mode="off")
+    assert off["ENGINE"] == "ElShop.db_backend"
+    assert off["CONN_MAX_AGE"] == 0 and off["CONN_HEALTH_CHECKS"] is True
+
+    persistent = dbpool.configure(DATABASE, mode="persistent", max_lifetime=120)
+    assert persistent["CONN_MAX_AGE"] == 120 and "pool" not in persistent["OPTIONS"]
+
+    bouncer = dbpool.configure(DATABASE, mode="pgbouncer")
+    assert bouncer["DISABLE_SERVER_SIDE_CURSORS"] is True
+    assert DATABASE["ENGINE"] == "django.db.backends.postgresql"
+    assert DATABASE["OPTIONS"] == {"sslmode": "disable"}
+
+    with pytest.raises(ImproperlyConfigured):
+        dbpool.configure(DATABASE, mode="bouncer")
+    with pytest.raises(ImproperlyConfigured):
+        dbpool.configure(DATABASE, min_size=5, max_size=2)
+
+
+def test_configure_pool(monkeypatch):
+    """Режим pool передаёт размеры и таймауты пулу psycopg или требует psycopg[pool]"""
+    monkeypatch.setattr(dbpool.importlib.util, "find_spec", lambda name: None)
+    with pytest.raises(ImproperlyConfigured):
+        dbpool.configure(DATABASE, mode="pool")
+
+    monkeypatch.setattr(dbpool.importlib.util, "find_spec", lambda name: object())
+    database = dbpool.configure(DATABASE, mode="pool", min_size=4, max_size=8, timeout=3)
+    assert database["CONN_MAX_AGE"] == 0
+    assert database["OPTIONS"]["pool"]["min_size"] == 4
+    assert database["OPTIONS"]["pool"]["max_size"] == 8
+    assert database["OPTIONS"]["pool"]["timeout"] == 3
+
+
+@pytest.mark.django_db
+def test_connect_is_measured():
+    """Новое соединение попадает в метрики и в /db/pool-stats/"""
+    dbpool.metrics.reset()
+    # Отдельное соединение: основное держит транзакцию теста
+    extra = connections.create_connection("default")
+    try:
+        extra.ensure_connection()
+    finally:
+        extra.close()
+    snapshot = dbpool.metrics.snapshot()
+    assert snapshot["acquired"] == 1 and snapshot["errors"] == 0
+    assert snapshot["wait_ms_max"] > 0
+
+    stats = dbpool.stats()
+    assert stats["mode"] == "persistent"
+    assert stats["connections"]["acquired"] == 1
+
+
+def test_audit_wrapper_escapes_user():
+    """Имя пользователя — литерал; с параметрами % в нём экранируется"""
+    calls = []
+
+    class User:
+        is_authenticated = True
+
+        def get_username(self):
+            return "o'100%"
+
+    class Request:
+        user = User()
+
+    token = current_request.set(Request())
+    try:
+        execute = lambda sql, params, many, context: calls.append(sql)
+        audit_user_wrapper(execute, "UPDATE t SET a = %s", [1], False, {})
+        audit_user_wrapper(execute, "DELETE FROM t", None, False, {})
+        audit_user_wrapper(execute, "SELECT 1", None, False, {})
+    finally:
+        current_request.reset(token)
+
+    assert calls[0] == "SELECT set_config('app.current_user', 'o''100%%', true); UPDATE t SET a = %s"
+    assert calls[1] == "SELECT set_config('app.current_user', 'o''100%', true); DELETE FROM t"
+    assert calls[2] == "SELECT 1"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_audit_user_is_transaction_local(django_user_model):
+    """Триггер видит пользователя запроса, а на соединении после запроса ничего не остаётся"""
+    django_user_model.objects.create_user(username="auditor", password="12345")
+    with connection.cursor() as cursor:
+        cursor.execute(AUDIT_TRIGGER)
+    try:
+        client = Client()
+        client.login(username="auditor", password="12345")
+        assert client.post("/toggle-theme/").status_code == 200
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT changed_by FROM test_audit_user")
+            assert {row[0] for row in cursor.fetchall()} == {"auditor"}
+            cursor.execute("SELECT current_setting('app.current_user', true)")
+            assert cursor.fetchone()[0] in (None, "")
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE test_audit_user CASCADE")
+            cursor.execute("DROP TRIGGER test_trg_audit_user ON elshop_user_settings")
+            cursor.execute("DROP FUNCTION test_fn_audit_user()")
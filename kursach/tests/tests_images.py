@@ -0,0 +1,98 @@
+import io
+
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from PIL import Image
+from ElShop import images
+from ElShop.models import Product
+
+
+@pytest.fixture(autouse=True)
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def _upload(name, size=(1600, 1200), mode="RGB", color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def _product(sku, image, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = Product.objects.create(sku=sku, name=f"Товар {sku}", base_price=100, image=image)
+    product.refresh_from_db()
+    return product
+
+
+@pytest.mark.django_db
+def test_renditions_built_on_upload(django_capture_on_commit_callbacks):
+    """После загрузки строятся копии с хэшем содержимого в имени; то же содержимое — те же файлы"""
+    product = _product("IMG-1", _upload("tv.png"), django_capture_on_commit_callbacks)
+    meta = product.image_renditions
+    assert meta["source"] == product.image.name
+    assert {name: (r["width"], r["height"]) for name, r in meta["renditions"].items()} == {
+        "thumb": (160, 120), "card": (400, 300), "detail": (1000, 750),
+    }
+    for entry in meta["renditions"].values():
+        assert entry["jpg"].endswith(".jpg") and entry["webp"].endswith(".webp")
+        assert meta["hash"] in entry["webp"]
+        assert default_storage.exists(entry["jpg"]) and default_storage.exists(entry["webp"])
+    with default_storage.open(meta["renditions"]["card"]["webp"]) as f:
+        assert Image.open(f).format == "WEBP"
+
+    twin = _product("IMG-2", _upload("copy.png"), django_capture_on_commit_callbacks)
+    assert twin.image_renditions["renditions"] == meta["renditions"]
+
+    # Другое изображение — новые имена; без изображения — метаданные сняты
+    with django_capture_on_commit_callbacks(execute=True):
+        product.image = _upload("tv.png", color=(0, 0, 255))
+        product.save()
+    product.refresh_from_db()
+    assert product.image_renditions["hash"] != meta["hash"]
+    with django_capture_on_commit_callbacks(execute=True):
+        product.image = None
+        product.save()
+    product.refresh_from_db()
+    assert product.image_renditions is None
+
+
+@pytest.mark.django_db
+def test_small_transparent_and_broken_images(django_capture_on_commit_callbacks):
+    """Маленькие не увеличиваются, прозрачные остаются PNG, битый файл не ломает сохранение"""
+    small = _product("IMG-S", _upload("logo.png", size=(300, 100), mode="RGBA", color=(0, 0, 0, 0)),
+                     django_capture_on_commit_callbacks)
+    renditions = small.image_renditions["renditions"]
+    assert (renditions["card"]["width"], renditions["detail"]["width"]) == (300, 300)
+    assert renditions["card"]["png"].endswith(".png") and "jpg" not in renditions["card"]
+    assert images.srcset(small, "webp").count("w,") == 1  # 160w и 300w
+
+    broken = _product("IMG-B", SimpleUploadedFile("broken.jpg", b"not an image"), django_capture_on_commit_callbacks)
+    assert broken.image_renditions["renditions"] == {} and "error" in broken.image_renditions
+    assert images.rendition(broken, "card") is None
+    assert not images.pending_products(Product.objects.all()).exists()
+
+
+@pytest.mark.django_db
+def test_pending_products_and_template_tag(django_capture_on_commit_callbacks):
+    """Без копий — исходный файл в <img> и товар в очереди команды; с копиями — <picture> со srcset"""
+    product = _product("IMG-T", _upload("tv.png"), django_capture_on_commit_callbacks)
+    Product.objects.filter(pk=product.pk).update(image_renditions=None)
+    product.refresh_from_db()
+    template = Template('{% load elshop_images %}{% product_image product "card" "card-img-top" %}')
+
+    html = template.render(Context({"product": product}))
+    assert html.startswith("<img") and product.image.url in html
+    assert list(images.pending_products(Product.objects.all()).values_list("pk", flat=True)) == [product.pk]
+
+    assert images.update_product_renditions(product.pk) == "built"
+    product.refresh_from_db()
+    html = template.render(Context({"product": product}))
+    card = product.image_renditions["renditions"]["card"]
+    assert html.startswith("<picture>") and 'type="image/webp"' in html
+    assert f'src="{default_storage.url(card["jpg"])}"' in html
+    assert 'width="400" height="300"' in html and " 1000w" in html
+    assert not images.pending_products(Product.objects.all()).exists()
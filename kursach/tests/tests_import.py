@@ -0,0 +1,77 @@
+import pytest
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.contrib.auth.models import User
+from ElShop.models import Product, Category
+from ElShop.importers import ProductImporter
+
+
+def _csv(*rows):
+    lines = ["ID;Название;Описание;Цена;Категории"] + [";".join(r) for r in rows]
+    return ("\r\n".join(lines) + "\r\n").encode("cp1251")
+
+
+@pytest.mark.django_db
+def test_import_products_csv_upserts_by_sku(client):
+    """Импорт CSV: вставка и обновление по sku, категории переписываются"""
+    admin = User.objects.create_user(username="boss", password="12345", is_staff=True)
+    client.force_login(admin)
+    old_cat = Category.objects.create(name="Старое")
+    existing = Product.objects.create(sku="TV-1", name="Старый ТВ", base_price=10)
+    existing.categories.add(old_cat)
+
+    upload = SimpleUploadedFile("p.csv", _csv(
+        ("TV-1", "Новый ТВ", "4K", "59999,90", "Телевизоры, Техника"),
+        ("PH-1", "Смартфон", "", "100", "Смартфоны"),
+        ("", "", "", "", ""),
+    ))
+    response = client.post(reverse("import_products"), {"csv_file": upload})
+    assert response.status_code == 302
+
+    existing.refresh_from_db()
+    assert existing.name == "Новый ТВ"
+    assert existing.base_price == Decimal("59999.90")
+    assert set(existing.categories.values_list("name", flat=True)) == {"Телевизоры", "Техника"}
+    assert Product.objects.get(sku="PH-1").categories.get().name == "Смартфоны"
+
+
+@pytest.mark.django_db
+def test_import_products_csv_rolls_back_on_row_errors(client):
+    """Импорт CSV: ошибка в строке отменяет весь импорт через веб-интерфейс"""
+    admin = User.objects.create_user(username="boss", password="12345", is_staff=True)
+    client.force_login(admin)
+    upload = SimpleUploadedFile("p.csv", _csv(
+        ("A-1", "Товар", "", "10", ""),
+        ("A-2", "Товар 2", "", "abc", ""),
+    ))
+    client.post(reverse("import_products"), {"csv_file": upload})
+    assert not Product.objects.exists()
+
+
+@pytest.mark.django_db
+def test_product_importer_reports_errors_and_keeps_good_rows():
+    """Пакетный импорт: некорректные строки пропускаются и попадают в отчёт"""
+    lines = _csv(
+        ("A-1", "Товар", "", "10", "К1"),
+        ("A-2", "Товар 2", "", "-5", "К1"),
+        ("A-3", "Товар 3", "", "7", "К2"),
+        ("A-4", "Товар 4", "", "NaN", "К1"),
+        ("A-5", "Товар 5", "", "Infinity", "К1"),
+        ("A-6", "Товар 6", "", "1e20", "К1"),
+        ("A-7", "Товар 7", "", "9999999999.999", "К1"),
+        ("A-1", "Товар 1 новый", "", "11", "К1"),  # повтор sku в пачке: считается один раз
+    ).decode("cp1251").splitlines()
+    result = ProductImporter(chunk_size=10).run(lines)
+
+    assert (result.imported, result.duplicates) == (2, 1)
+    assert result.errors == [
+        (3, "Цена не может быть отрицательной"),
+        (5, "Неверный формат цены: NaN"),
+        (6, "Неверный формат цены: Infinity"),
+        (7, "Слишком большая цена: 1e20"),
+        (8, "Слишком большая цена: 9999999999.999"),  # после округления 13 знаков
+    ]
+    assert set(Product.objects.values_list("sku", flat=True)) == {"A-1", "A-3"}
+    assert Product.objects.get(sku="A-1").name == "Товар 1 новый"
+    assert Category.objects.count() == 2
@@ -0,0 +1,124 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ElShop.models import Customer, Product, Order, OrderItem, Payment
+
+
+@pytest.fixture
+def customer(client):
+    user = User.objects.create_user(username="demo", password="12345")
+    client.login(username="demo", password="12345")
+    return Customer.objects.create(user=user, email="demo@x.com", first_name="Demo", last_name="User")
+
+
+def _order(customer, products, quantity=1):
+    order = Order.objects.create(customer=customer, status="paid")
+    for product in products:
+        OrderItem.objects.create(order=order, product=product, unit_price=product.base_price,
+                                 quantity=quantity, line_total=product.base_price * quantity)
+    return order
+
+
+@pytest.mark.django_db
+def test_order_history_keyset_pages_with_item_counts(client, customer, monkeypatch):
+    """История заказов: страницы по курсору без пропусков и повторов, число товаров — в том же запросе"""
+    from ElShop.views import OrderHistoryView
+    monkeypatch.setattr(OrderHistoryView, "paginate_by", 2)
+    products = [Product.objects.create(sku=f"T{i}", name=f"Товар {i}", base_price=100) for i in range(3)]
+    orders = [_order(customer, products[:i + 1], quantity=2) for i in range(5)]
+
+    seen, url = [], reverse("order_history")
+    while url:
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        page = response.context["orders"]
+        order_queries = [q for q in ctx.captured_queries if 'FROM "elshop_order"' in q["sql"]]
+        assert len(order_queries) == 1
+        seen += [(o.id, o.items_count, o.items_quantity) for o in page]
+        cursor = response.context["next_cursor"]
+        url = f"{reverse('order_history')}?after={cursor}" if cursor else None
+
+    expected = [(o.id, min(i + 1, 3), 2 * min(i + 1, 3)) for i, o in enumerate(orders)]
+    assert seen == expected[::-1]
+
+
+@pytest.mark.django_db
+def test_order_detail_constant_queries(client, customer):
+    """Заказ: число запросов не зависит от количества строк"""
+    def queries_for(lines):
+        products = [Product.objects.create(sku=f"L{lines}-{i}", name=f"Товар {i}", base_price=10) for i in range(lines)]
+        order = _order(customer, products)
+        Payment.objects.create(order=order, amount=10 * lines, method="card")
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse("order_detail", args=[order.id]))
+        assert response.status_code == 200
+        return len(ctx.captured_queries)
+
+    assert queries_for(1) == queries_for(10)
+
+
+def _sales():
+    from ElShop.models import SalesRollup
+    return set(SalesRollup.objects.exclude(lines=0).values_list("product_id", "lines", "quantity", "revenue"))
+
+
+def _line(product, quantity, **extra):
+    return {"product": product.pk, "unit_price": str(product.base_price), "quantity": quantity,
+            "line_total": str(product.base_price * quantity), **extra}
+
+
+@pytest.mark.django_db
+def test_api_order_items_written_in_constant_queries(customer):
+    """API: заказ с 3 и с 30 строками создаётся одним и тем же числом запросов, агрегаты продаж верны"""
+    from rest_framework.test import APIClient
+    from ElShop.rollups import rebuild_rollups
+    api = APIClient()
+    api.force_authenticate(customer.user)
+    products = [Product.objects.create(sku=f"B{i}", name=f"Товар {i}", base_price=10 + i) for i in range(30)]
+
+    def create(count):
+        data = {"customer": customer.pk, "status": "paid", "total": "1.00",
+                "items": [_line(product, 2) for product in products[:count]]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = api.post(reverse("order-list"), data, format="json")
+        assert response.status_code == 201, response.data
+        assert len(response.data["items"]) == count
+        return len(ctx.captured_queries)
+
+    assert create(3) == create(30)
+    sales = _sales()
+    rebuild_rollups()
+    assert sales == _sales()
+
+
+@pytest.mark.django_db
+def test_api_order_update_diffs_items(customer):
+    """API: при обновлении строки с id сохраняются, изменённые правятся, лишние удаляются, новые добавляются"""
+    from rest_framework.test import APIClient
+    from ElShop.rollups import rebuild_rollups
+    api = APIClient()
+    api.force_authenticate(customer.user)
+    products = [Product.objects.create(sku=f"D{i}", name=f"Товар {i}", base_price=100) for i in range(4)]
+    order = _order(customer, products[:3])
+    kept, changed, removed = order.items.order_by("id")
+    url = reverse("order-detail", args=[order.pk])
+
+    response = api.patch(url, {"items": [
+        _line(products[0], 1, id=kept.pk),
+        _line(products[1], 5, id=changed.pk),
+        _line(products[3], 2),
+    ]}, format="json")
+    assert response.status_code == 200, response.data
+    rows = list(order.items.order_by("id").values_list("id", "product_id", "quantity"))
+    assert rows[:2] == [(kept.pk, products[0].pk, 1), (changed.pk, products[1].pk, 5)]
+    assert rows[2][1:] == (products[3].pk, 2) and not OrderItem.objects.filter(pk=removed.pk).exists()
+    sales = _sales()
+    rebuild_rollups()
+    assert sales == _sales()
+
+    # Чужая строка — 400, заказ не меняется
+    response = api.patch(url, {"items": [_line(products[0], 1, id=0)]}, format="json")
+    assert response.status_code == 400
+    assert list(order.items.order_by("id").values_list("id", "product_id", "quantity")) == rows
@@ -0,0 +1,148 @@
+"""
+Бюджет SQL-запросов на каждый маршрут kursach/urls.py и роутера API.
+
+Каждый маршрут запрашивается на двух объёмах данных (SMALL и LARGE строк
+в списках, корзине, заказах). Тест падает, если число запросов превышает
+объявленный в ROUTES бюджет или растёт вместе с числом выводимых строк (N+1).
+Число запросов и время БД пишутся в отчёт pytest (record_property, --junitxml).
+Маршруты админки не проверяются — это код Django.
+"""
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from ElShop.models import (
+    Category, Customer, Supplier, ProductSupplier, Product, Warehouse, Inventory,
+    Address, Order, OrderItem, Payment, CartLine,
+)
+
+SMALL, LARGE = 3, 12
+
+# Бюджет на запрос: "queries" — максимум запросов; "method"/"data"/"content_type" — как запрашивать;
+# "args" — аргументы маршрута из засеянных данных. Товары и заказы включают запрос
+# валидатора ETag (conditional.py), который при совпадении заменяет весь ответ
+ROUTES = {
+    "api-root": {"queries": 2},
+    "customer-list": {"queries": 3},
+    "customer-detail": {"queries": 3, "args": lambda s: [s.customer.pk]},
+    "product-list": {"queries": 6},
+    "product-detail": {"queries": 6, "args": lambda s: [s.product.pk]},
+    "order-list": {"queries": 5},
+    "order-detail": {"queries": 5, "args": lambda s: [s.order.pk]},
+    "orderitem-list": {"queries": 3},
+    "orderitem-detail": {"queries": 3, "args": lambda s: [s.item.pk]},
+    "payment-list": {"queries": 3},
+    "payment-detail": {"queries": 3, "args": lambda s: [s.payment.pk]},
+    "catalog": {"queries": 9},
+    "cart": {"queries": 4},
+    "checkout": {"queries": 4},
+    "checkout_success": {"queries": 3},
+    "add_to_cart": {"queries": 4, "method": "post", "args": lambda s: [s.product.pk]},
+    "product_detail": {"queries": 5, "args": lambda s: [s.product.pk]},
+    "login": {"queries": 3},
+    "logout": {"queries": 4, "method": "post"},
+    "register": {"queries": 3},
+    "update_cart": {"queries": 3, "method": "post", "data": lambda s: {f"quantity_{s.product.pk}": "2"}},
+    "clear_cart": {"queries": 3, "method": "post"},
+    "order_history": {"queries": 5},
+    "order_detail": {"queries": 7, "args": lambda s: [s.order.pk]},
+    "profile": {"queries": 9},  # первый заход создаёт CustomerProfile
+    "analytics": {"queries": 5},
+    "export_analytics_csv": {"queries": 3},
+    "export_products": {"queries": 4},
+    "import_products": {"queries": 2, "method": "post"},
+    "product-batch": {"queries": 7, "method": "post", "content_type": "application/json", "data": lambda s: [
+        {"sku": s.product.sku, "base_price": "1.00"}, {"sku": "BUDGET-NEW", "name": "Новый", "base_price": "2.00"},
+    ]},
+    "toggle_theme": {"queries": 4, "method": "post"},
+    "catalog_cache_stats": {"queries": 2},
+    "db_pool_stats": {"queries": 2},
+}
+
+# Запас на всё время БД одного запроса; грубая защита от «тяжёлых» запросов
+MAX_DB_SECONDS = 0.5
+
+
+def iter_route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace != "admin":
+                yield from iter_route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def seed(user, rows):
+    """Магазин, где у каждого списка и каждого заказа по rows строк"""
+    customer = Customer.objects.create(user=user, email="budget@x.com", first_name="Бюджет", last_name="Тестов")
+    address = Address.objects.create(customer=customer, line1="ул. Пушкина, 10", city="Москва", country="Россия")
+    categories = [Category.objects.create(name=f"Категория {i}") for i in range(rows)]
+    supplier = Supplier.objects.create(name="Поставщик")
+    warehouse = Warehouse.objects.create(name="Склад")
+    products = []
+    for i in range(rows):
+        product = Product.objects.create(sku=f"B-{i}", name=f"Товар {i}", base_price=100 + i)
+        product.categories.add(*categories[:2])
+        ProductSupplier.objects.create(product=product, supplier=supplier, price=50)
+        Inventory.objects.create(product=product, warehouse=warehouse, quantity=100)
+        CartLine.objects.create(user=user, product=product, unit_price=product.base_price, quantity=1)
+        products.append(product)
+
+    orders, items, payments = [], [], []
+    for _ in range(rows):
+        order = Order.objects.create(customer=customer, shipping_address=address, status="paid")
+        for product in products:
+            items.append(OrderItem.objects.create(order=order, product=product, unit_price=product.base_price,
+                                                  quantity=1, line_total=product.base_price))
+        payments.append(Payment.objects.create(order=order, amount=100, method="card"))
+        orders.append(order)
+    return SimpleNamespace(customer=customer, product=products[-1], order=orders[-1],
+                           item=items[-1], payment=payments[-1])
+
+
+def measure(client, name, rows):
+    """(число запросов, время БД) одного запроса к маршруту на данных из rows строк"""
+    spec = ROUTES[name]
+    with transaction.atomic():
+        user = User.objects.create_superuser(username="budget", password="12345", email="budget@x.com")
+        data = seed(user, rows)
+        client.force_login(user)
+        cache.clear()
+
+        url = reverse(name, args=spec.get("args", lambda s: [])(data))
+        send = getattr(client, spec.get("method", "get"))
+        payload = spec.get("data", lambda s: {})(data)
+        extra = {"content_type": spec["content_type"]} if "content_type" in spec else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = send(url, payload, **extra)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        assert response.status_code < 400, f"{name}: {response.status_code}"
+
+        transaction.set_rollback(True)
+    client.logout()
+    queries = ctx.captured_queries
+    return len(queries), sum(float(q["time"]) for q in queries)
+
+
+def test_every_route_has_budget():
+    """Каждый маршрут сайта и API объявлен в ROUTES"""
+    assert set(iter_route_names(get_resolver().url_patterns)) == set(ROUTES)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", sorted(ROUTES))
+def test_route_query_budget(client, name, record_property):
+    """Маршрут укладывается в бюджет запросов, и число запросов не растёт с числом строк"""
+    small, _ = measure(client, name, SMALL)
+    large, db_seconds = measure(client, name, LARGE)
+    record_property("queries", large)
+    record_property("db_ms", round(db_seconds * 1000, 2))
+
+    assert large == small, f"{name}: {small} запросов на {SMALL} строках, {large} — на {LARGE}"
+    assert large <= ROUTES[name]["queries"], f"{name}: {large} запросов при бюджете {ROUTES[name]['queries']}"
+    assert db_seconds <= MAX_DB_SECONDS
@@ -0,0 +1,71 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from ElShop.models import Category, Customer, Order, OrderItem, Payment, Product, ProductSupplier, Supplier
+from ElShop.serializers import ProductSerializer, ValuesReadPlan
+from ElShop.views import ValuesListViewSetMixin
+
+
+@pytest.fixture
+def shop(django_user_model):
+    categories = [Category.objects.create(name=f"Кат {i}") for i in range(3)]
+    suppliers = [Supplier.objects.create(name=f"Пост {i}") for i in range(2)]
+    products = []
+    for i in range(4):
+        product = Product.objects.create(sku=f"F-{i}", name=f"Товар «{i}»", base_price=f"{10 + i}.5",
+                                         description=None if i % 2 else "Описание")
+        product.categories.add(*reversed(categories[:i]))  # порядок добавления не по id
+        products.append(product)
+    for supplier in reversed(suppliers):
+        ProductSupplier.objects.create(product=products[1], supplier=supplier)
+    Product.objects.filter(pk=products[0].pk).update(image="products/tv.png")
+
+    user = django_user_model.objects.create_user(username="fast", password="12345")
+    customer = Customer.objects.create(user=user, email="f@x.com", first_name="F", last_name="L")
+    order = Order.objects.create(customer=customer, status="paid", total="30.00")
+    Order.objects.create(status="draft")  # без покупателя и строк
+    for product in reversed(products[:3]):
+        OrderItem.objects.create(order=order, product=product, unit_price=product.base_price, quantity=2,
+                                 line_total=product.base_price * 2)
+    Payment.objects.create(order=order, amount="30.00", method="card")
+    return products
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", [
+    "/api/products/",
+    "/api/products/?page_size=2",
+    "/api/products/?fields=id,categories,image",
+    "/api/products/?q=товар&page_size=3",
+    "/api/orders/",
+    "/api/orders/?fields=items,total",
+    "/api/customers/",
+    "/api/order-items/",
+    "/api/payments/",
+])
+def test_values_list_matches_serializer(shop, url, monkeypatch):
+    """Список через values() отдаёт тот же JSON байт в байт, что и ModelSerializer"""
+    client = APIClient()
+    fast = client.get(url)
+    monkeypatch.setattr(ValuesListViewSetMixin, "get_list_plan", lambda self: None)
+    regular = client.get(url)
+    assert fast.status_code == regular.status_code == 200
+    assert fast.content == regular.content
+
+
+@pytest.mark.django_db
+def test_values_plan_queries_and_fallback(shop):
+    """Запросов — строки плюс по одному на связь; неподдерживаемое поле — обычный сериализатор"""
+    plan = ValuesReadPlan.for_serializer(ProductSerializer())
+    with CaptureQueriesContext(connection) as queries:
+        data = plan.serialize(plan.queryset(Product.objects.order_by("id")))
+    assert len(queries) == 3
+    assert len(data[3]["categories"]) == 3 and data[3]["categories"] == sorted(data[3]["categories"])
+    assert data[0]["image"] == "/media/products/tv.png" and data[1]["image"] is None
+
+    class WithMethod(ProductSerializer):
+        title = serializers.CharField(source="name.upper")
+
+    assert ValuesReadPlan.for_serializer(WithMethod()) is None
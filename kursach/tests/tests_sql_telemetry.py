@@ -0,0 +1,39 @@
+import json
+import pytest
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from ElShop.models import Product
+from ElShop.sql_telemetry import fingerprint
+
+
+def test_fingerprint_normalizes_literals_and_lists():
+    """Телеметрия SQL: запросы одной формы дают один отпечаток"""
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'") == \
+        fingerprint("SELECT *  FROM t WHERE id IN (7) AND name = 'it''s'")
+    assert fingerprint('INSERT INTO t VALUES (%s, %s), (%s, %s)') == "INSERT INTO t VALUES (...)"
+
+
+@pytest.mark.django_db
+def test_sql_telemetry_attributes_queries_to_views(settings, tmp_path, capsys):
+    """Телеметрия SQL: запросы записываются по view, команда печатает самые дорогие"""
+    path = tmp_path / "telemetry.jsonl"
+    settings.ELSHOP_SQL_TELEMETRY = True
+    settings.ELSHOP_SQL_TELEMETRY_FILE = path
+    settings.ELSHOP_SQL_TELEMETRY_FLUSH_SECONDS = 0
+    settings.ELSHOP_SQL_TELEMETRY_SLOW_MS = 0
+    Product.objects.create(sku="TV-1", name="Телевизор", base_price=1000)
+
+    client = Client()
+    client.get(reverse("catalog"))
+    client.get(reverse("product-list"))
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    views = {r["view"] for r in records}
+    assert {"ProductListView", "ProductViewSet.list"} <= views
+    assert all(r["count"] and r["samples"] for r in records)
+    assert any("tests/tests_sql_telemetry.py" in frame for r in records for s in r["slow"] for frame in s["stack"])
+
+    call_command("sql_telemetry_top", "--file", str(path), "--view", "ProductListView")
+    out = capsys.readouterr().out
+    assert "ProductListView" in out and "ProductViewSet.list" not in out
@@ -0,0 +1,155 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ElShop import inventory
+from ElShop.models import Inventory, Product, ProductStock, Warehouse
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def _stock(product):
+    inventory.apply_stock_deltas()  # иначе суммы применятся только при COMMIT
+    return ProductStock.objects.values_list("quantity", "reserved", "available").get(pk=product.pk)
+
+
+def _updated(model, product):
+    return model.objects.values_list("updated_at", flat=True).get(pk=product.pk)
+
+
+@pytest.mark.django_db
+def test_stock_totals_follow_inventory():
+    """Суммы остатков ведут триггеры: вставка, изменение, удаление; время остатка — только при смене свободного"""
+    product = Product.objects.create(sku="S-1", name="Товар", base_price=10)
+    other = Product.objects.create(sku="S-2", name="Другой", base_price=10)
+    north, south = Warehouse.objects.create(name="Север"), Warehouse.objects.create(name="Юг")
+    assert _stock(product) == (0, 0, 0)  # строка создаётся вместе с товаром
+
+    product_updated, before = _updated(Product, product), _updated(ProductStock, product)
+    Inventory.objects.bulk_create([
+        Inventory(product=product, warehouse=north, quantity=5),
+        Inventory(product=product, warehouse=south, quantity=7, reserved=2),
+        Inventory(product=other, warehouse=north, quantity=1),
+    ])
+    assert _stock(product) == (12, 2, 10) and _stock(other) == (1, 0, 1)
+    assert _updated(ProductStock, product) > before
+
+    # Резерв из свободного остатка: available уменьшается, ETag товара меняется
+    touched = _updated(ProductStock, product)
+    Inventory.objects.filter(product=product, warehouse=north).update(reserved=3)
+    assert _stock(product) == (12, 5, 7) and _updated(ProductStock, product) > touched
+
+    # Списание резерва: quantity и reserved уменьшаются вместе, свободный остаток тот же
+    touched = _updated(ProductStock, product)
+    Inventory.objects.filter(product=product, warehouse=north).update(quantity=2, reserved=0)
+    assert _stock(product) == (9, 2, 7) and _updated(ProductStock, product) == touched
+
+    Inventory.objects.filter(warehouse=south).delete()
+    assert _stock(product) == (2, 0, 2) and _stock(other) == (1, 0, 1)
+    assert _updated(Product, product) == product_updated  # строку товара склады не трогают
+
+    # Пересчёт с нуля сходится с тем, что вели триггеры
+    ProductStock.objects.update(quantity=0, reserved=0)
+    assert inventory.rebuild_stock_totals() == 2
+    assert _stock(product) == (2, 0, 2) and _stock(other) == (1, 0, 1)
+
+
+def _queued():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM elshop_product_stock_delta WHERE xact_id = pg_current_xact_id()")
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_stock_deltas_applied_at_commit():
+    """Приращения копятся в очереди транзакции и применяются один раз; откат точки сохранения не теряет их"""
+    product = Product.objects.create(sku="S-3", name="Товар", base_price=10)
+    warehouse = Warehouse.objects.create(name="Склад")
+    stock = Inventory.objects.create(product=product, warehouse=warehouse, quantity=5)
+    Inventory.objects.filter(pk=stock.pk).update(reserved=1)
+    assert ProductStock.objects.get(pk=product.pk).quantity == 0 and _queued() == 2
+    assert _stock(product) == (5, 1, 4) and _queued() == 0
+
+    # Точка сохранения с первой (помеченной) строкой очереди откатилась — следующая её заменяет
+    with pytest.raises(RuntimeError), transaction.atomic():
+        Inventory.objects.filter(pk=stock.pk).update(reserved=2)
+        raise RuntimeError
+    Inventory.objects.filter(pk=stock.pk).update(reserved=3)
+    assert _stock(product) == (5, 3, 2) and _queued() == 0
+
+
+@pytest.mark.django_db
+def test_api_available_quantity_and_in_stock_filter():
+    """API: available_quantity без лишних запросов, ?in_stock=1 — только товары со свободным остатком"""
+    client = APIClient()
+    warehouse = Warehouse.objects.create(name="Склад")
+    products = [Product.objects.create(sku=f"A-{i}", name=f"Товар {i}", base_price=10) for i in range(3)]
+    Inventory.objects.create(product=products[0], warehouse=warehouse, quantity=4, reserved=1)
+    Inventory.objects.create(product=products[1], warehouse=warehouse, quantity=2, reserved=2)
+    inventory.apply_stock_deltas()
+
+    rows = client.get(reverse("product-list")).json()["results"]
+    assert [row["available_quantity"] for row in rows] == [0, 0, 3]  # список — от новых к старым
+    detail = client.get(reverse("product-detail", args=[products[0].pk]) + "?fields=id,available_quantity")
+    assert detail.json() == {"id": products[0].pk, "available_quantity": 3}
+
+    with CaptureQueriesContext(connection) as queries:
+        rows = client.get(reverse("product-list") + "?in_stock=1").json()["results"]
+    assert [row["sku"] for row in rows] == ["A-0"]
+    assert not any("SUM(" in q["sql"].upper() for q in queries.captured_queries)
+
+    # Без строки остатков поле — null, как у обычного сериализатора
+    ProductStock.objects.filter(pk=products[2].pk).delete()
+    assert client.get(reverse("product-detail", args=[products[2].pk])).json()["available_quantity"] is None
+    assert client.get(reverse("product-list")).json()["results"][0]["available_quantity"] is None
+
+
+@pytest.mark.django_db
+def test_catalog_in_stock_filter_and_fresh_availability(client):
+    """Каталог: фильтр «только в наличии» с фасетами, остаток на карточке свежий при закэшированной странице"""
+    warehouse = Warehouse.objects.create(name="Склад")
+    tv = Product.objects.create(sku="TV-1", name="Телевизор", base_price=1000)
+    Product.objects.create(sku="TV-2", name="Телевизор 2", base_price=2000)
+    stock = Inventory.objects.create(product=tv, warehouse=warehouse, quantity=3)
+    inventory.apply_stock_deltas()
+
+    response = client.get(reverse("catalog"), {"in_stock": "1"})
+    assert [p.sku for p in response.context["products"]] == ["TV-1"]
+    assert response.context["facets_total"] == 1 and response.context["in_stock"]
+    assert all("in_stock=1" in bucket["query"] for bucket in response.context["price_facets"])
+    assert "В наличии: 3 шт." in response.content.decode()
+
+    response = client.get(reverse("catalog"))
+    assert [p.available_quantity for p in response.context["products"]] == [3, 0]
+
+    # Страница берётся из кэша, а остаток — из БД
+    Inventory.objects.filter(pk=stock.pk).update(reserved=3)
+    inventory.apply_stock_deltas()
+    response = client.get(reverse("catalog"))
+    assert [p.available_quantity for p in response.context["products"]] == [0, 0]
+    assert "Нет в наличии" in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_api_etag_follows_available_stock():
+    """ETag товара в API меняется вместе со свободным остатком, хотя строка товара не меняется"""
+    client = APIClient()
+    product = Product.objects.create(sku="E-1", name="Товар", base_price=10)
+    stock = Inventory.objects.create(product=product, warehouse=Warehouse.objects.create(name="Склад"), quantity=3)
+    inventory.apply_stock_deltas()
+    urls = [reverse("product-detail", args=[product.pk]), reverse("product-list")]
+    responses = [client.get(url) for url in urls]
+
+    Inventory.objects.filter(pk=stock.pk).update(reserved=1)
+    inventory.apply_stock_deltas()
+    for url, response in zip(urls, responses):
+        changed = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert changed.status_code == 200 and changed["ETag"] != response["ETag"]
+    assert changed.json()["results"][0]["available_quantity"] == 2